@@ -0,0 +1,270 @@
+"""
+Batch question-answering: jalankan banyak pertanyaan dari file JSONL lewat graph agent, tanpa input() interaktif.
+Dipakai untuk evaluasi malam dan pre-answering massal, yang dipentingkan throughput, bukan interaktivitas.
+
+Input: JSONL, satu pertanyaan per baris dengan field "question" (atau "query"); id diambil dari "id" / "qid" /
+"request_id" (default nomor baris). Baris tanpa pertanyaan dilewati.
+
+Alur:
+- Deduplikasi: pertanyaan identik (setelah normalisasi huruf / spasi) hanya dijalankan sekali; setiap id tetap
+  mendapat baris output sendiri (duplikat ditandai `duplicate_of`).
+- Retrieval dikelompokkan: per BATCH_RETRIEVAL_SIZE pertanyaan unik, embedding dihitung dalam satu batch dan
+  hybrid search dikirim dalam satu multi_search (TypesenseRetriever.search_batch). Hasilnya dititipkan lewat
+  custom_rag.prime_retrieval, dan graph speculative memakainya untuk retrieval pertama tiap pertanyaan.
+  Batch berikutnya disiapkan sambil batch sekarang dijawab.
+- Maksimal BATCH_CONCURRENCY eksekusi graph bersamaan.
+- Output JSONL ditulis per pertanyaan begitu selesai: answer, timing (total + per node), dan trace span
+  (nama, offset, durasi, atribut). Baris dengan error juga ditulis (field "error").
+- Resume: id yang sudah punya baris sukses di BATCH_OUTPUT dilewati, jadi run yang terputus cukup diulang
+  dengan perintah yang sama. Id yang sebelumnya error dicoba lagi.
+
+Env: BATCH_INPUT (default requests.jsonl), BATCH_OUTPUT (default answers.jsonl), BATCH_CONCURRENCY (default 4),
+BATCH_RETRIEVAL_SIZE (default 16, maks. limit multi_search Typesense), BATCH_STUBS=1 (graph stub stubs.py, offline).
+Contoh: python batch_qa.py pertanyaan.jsonl jawaban.jsonl
+        BATCH_CONCURRENCY=16 python batch_qa.py
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Set
+
+from langchain_core.messages import HumanMessage
+
+import custom_rag
+import profiling
+import tracing
+
+
+BATCH_INPUT = os.getenv("BATCH_INPUT", "requests.jsonl")
+BATCH_OUTPUT = os.getenv("BATCH_OUTPUT", "answers.jsonl")
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_RETRIEVAL_SIZE = int(os.getenv("BATCH_RETRIEVAL_SIZE", "16"))
+BATCH_STUBS = os.getenv("BATCH_STUBS", "0") == "1"
+
+
+def load_rows(path: str) -> List[Dict[str, str]]:
+    """Baris input yang punya pertanyaan: [{"id", "question"}] sesuai urutan file."""
+    rows: List[Dict[str, str]] = []
+    skipped = 0
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            obj = json.loads(line)
+            question = obj.get("question") or obj.get("query")
+            if not isinstance(question, str) or not question.strip():
+                skipped += 1
+                continue
+            rid = obj.get("id") or obj.get("qid") or obj.get("request_id") or f"line-{lineno}"
+            rows.append({"id": str(rid), "question": question})
+    if skipped:
+        print(f"[batch] {skipped} baris tanpa field question / query dilewati")
+    return rows
+
+
+def load_done(path: str) -> Set[str]:
+    """Id yang sudah dijawab tanpa error di output sebelumnya (untuk resume)."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Baris terakhir yang terpotong saat proses dihentikan
+            if "error" in row:
+                done.discard(row.get("id"))
+            else:
+                done.add(row.get("id"))
+    return done
+
+
+def _jsonable(content: Any) -> Any:
+    return json.loads(json.dumps(content, ensure_ascii=False, default=str))
+
+
+class _TraceCollector:
+    """Listener tracing: kumpulkan span per trace_id yang sedang dijalankan batch."""
+
+    def __init__(self) -> None:
+        self.spans: Dict[str, List[tracing.Span]] = {}
+
+    def __call__(self, sp: tracing.Span) -> None:
+        bucket = self.spans.get(sp.trace_id)
+        if bucket is not None:
+            bucket.append(sp)  # list.append atomic
+
+    def start(self, trace_id: str) -> None:
+        self.spans[trace_id] = []
+
+    def pop(self, root: tracing.Span) -> Dict[str, Any]:
+        spans = self.spans.pop(root.trace_id, [])
+        nodes: Dict[str, float] = defaultdict(float)
+        trace = []
+        for sp in sorted(spans, key=lambda s: s.start):
+            if sp.name.startswith("node."):
+                nodes[sp.name[5:]] += sp.duration * 1000
+            trace.append({
+                "name": sp.name,
+                "offset_ms": round((sp.start - root.start) * 1000, 2),
+                "duration_ms": round(sp.duration * 1000, 2),
+                "attrs": _jsonable(sp.attrs),
+                **({"error": sp.error} if sp.error else {}),
+            })
+        return {"nodes_ms": {k: round(v, 2) for k, v in nodes.items()}, "trace": trace}
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        graph: Any,
+        retriever: Any,
+        output: str = BATCH_OUTPUT,
+        concurrency: int = BATCH_CONCURRENCY,
+        retrieval_size: int = BATCH_RETRIEVAL_SIZE,
+    ) -> None:
+        self.graph = graph
+        self.retriever = retriever
+        self.output = output
+        self.concurrency = concurrency
+        self.retrieval_size = max(1, retrieval_size)
+        self._collector = _TraceCollector()
+        self._primes: Dict[int, asyncio.Future] = {}
+        self._out: Any = None
+        self.stats = {"answered": 0, "failed": 0, "primed": 0, "prime_failed": 0}
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self._out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._out.flush()  # Per baris, supaya resume tidak kehilangan jawaban yang sudah selesai
+
+    def _prime(self, keys: List[str], batch: int) -> asyncio.Future | None:
+        """Task batch embedding + multi_search untuk batch ke-`batch` (dibuat sekali)."""
+        start = batch * self.retrieval_size
+        if start >= len(keys):
+            return None
+        if batch not in self._primes:
+            self._primes[batch] = asyncio.ensure_future(self._prime_batch(keys[start:start + self.retrieval_size]))
+        return self._primes[batch]
+
+    async def _prime_batch(self, questions: List[str]) -> None:
+        try:
+            results = await asyncio.to_thread(self.retriever.search_batch, questions, "hybrid")
+        except Exception as e:
+            self.stats["prime_failed"] += len(questions)
+            tracing.log("batch", f"retrieval batch gagal, graph memakai search biasa: {type(e).__name__}: {e}", "warning")
+            return
+        for question, result in zip(questions, results):
+            if "error" in result:
+                self.stats["prime_failed"] += 1
+                continue
+            custom_rag.prime_retrieval(question, result)
+            self.stats["primed"] += 1
+
+    async def _answer(self, qid: str, question: str) -> Dict[str, Any]:
+        state = {"messages": [HumanMessage(content=question)], "retry_count": 0}
+        with tracing.span("graph", batch=True, qid=qid) as root:
+            if isinstance(root, tracing.Span):
+                self._collector.start(root.trace_id)
+            with profiling.profile_request(qid, question):
+                result = await self.graph.ainvoke(state)
+        out: Dict[str, Any] = {"answer": _jsonable(getattr(result["messages"][-1], "content", ""))}
+        if isinstance(root, tracing.Span):
+            traced = self._collector.pop(root)
+            out["timings"] = {"total_ms": round(root.duration * 1000, 2), "nodes_ms": traced["nodes_ms"]}
+            out["trace"] = traced["trace"]
+        return out
+
+    async def run(self, rows: List[Dict[str, str]]) -> Dict[str, Any]:
+        groups: Dict[str, List[Dict[str, str]]] = {}
+        for row in rows:
+            groups.setdefault(custom_rag._normalize_query(row["question"]), []).append(row)
+        keys = list(groups)
+        questions = [groups[k][0]["question"] for k in keys]
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(i: int) -> None:
+            async with sem:
+                batch = i // self.retrieval_size
+                self._prime(questions, batch + 1)  # Batch berikutnya disiapkan sambil batch ini jalan
+                await self._prime(questions, batch)
+                start = time.perf_counter()
+                primary, *dupes = groups[keys[i]]
+                try:
+                    out = await self._answer(primary["id"], primary["question"])
+                    self.stats["answered"] += 1
+                except Exception as e:
+                    out = {"error": f"{type(e).__name__}: {e}"[:500],
+                           "timings": {"total_ms": round((time.perf_counter() - start) * 1000, 2)}}
+                    self.stats["failed"] += 1
+                self._write({"id": primary["id"], "question": primary["question"], **out})
+                for row in dupes:
+                    shared = {k: v for k, v in out.items() if k != "trace"}
+                    self._write({"id": row["id"], "question": row["question"], "duplicate_of": primary["id"], **shared})
+
+        tracing.add_listener(self._collector)
+        _terminate_partial_line(self.output)
+        start = time.perf_counter()
+        try:
+            with open(self.output, "a", encoding="utf-8") as self._out:
+                await asyncio.gather(*(one(i) for i in range(len(keys))))
+        finally:
+            tracing.remove_listener(self._collector)
+            self._out = None
+        elapsed = time.perf_counter() - start
+        return {
+            "rows": len(rows),
+            "unique_questions": len(keys),
+            **self.stats,
+            "seconds": round(elapsed, 3),
+            "questions_per_second": round(len(keys) / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+def _terminate_partial_line(path: str) -> None:
+    """Kalau run sebelumnya terputus di tengah baris, tutup baris itu supaya baris baru tidak tersambung."""
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def build_graph() -> Any:
+    """Graph async speculative (memakai hasil prime_retrieval); BATCH_STUBS=1 = stub offline."""
+    if BATCH_STUBS:
+        from stubs import install_stubs
+        return install_stubs(use_async=True, speculative=True)
+    return custom_rag.build_graph(speculative=True, use_async=True)
+
+
+async def _amain(input_path: str, output_path: str) -> Dict[str, Any]:
+    rows = load_rows(input_path)
+    done = load_done(output_path)
+    todo = [r for r in rows if r["id"] not in done]
+    if done:
+        print(f"[batch] resume: {len(rows) - len(todo)} id sudah dijawab di {output_path}")
+    graph = build_graph()  # Setelah install_stubs (kalau BATCH_STUBS), _ts_retriever sudah diganti
+    runner = BatchRunner(graph, custom_rag._ts_retriever, output=output_path)
+    report = await runner.run(todo)
+    report["resumed"] = len(rows) - len(todo)
+    return report
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] %(message)s")
+    input_path = sys.argv[1] if len(sys.argv) > 1 else BATCH_INPUT
+    output_path = sys.argv[2] if len(sys.argv) > 2 else BATCH_OUTPUT
+    report = asyncio.run(_amain(input_path, output_path))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
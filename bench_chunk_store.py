@@ -0,0 +1,87 @@
+"""
+Benchmark load corpus: chunks.jsonl (parse seluruh file) vs chunk_store (mmap, akses per baris).
+
+Kalau BENCH_CHUNKS_JSONL tidak di-set, corpus sintetis BENCH_N chunk (dengan vektor BENCH_DIM dimensi)
+dibuat di folder temp. Yang diukur: waktu siap pakai (load/open), random access BENCH_READS baris,
+dan akses vektor. Output dalam format JSON.
+
+Contoh: python bench_chunk_store.py
+        BENCH_CHUNKS_JSONL=chunks.jsonl BENCH_STORE=chunks.store python bench_chunk_store.py
+"""
+import json
+import os
+import random
+import tempfile
+import time
+
+from chunk_store import ChunkStore, embed_store, iter_jsonl, write_store
+
+
+def _synthetic(n: int):
+    for i in range(n):
+        yield {
+            "id": f"doctor:doc-{i:07d}",
+            "content": f"Dokter: dr. Contoh {i}. Spesialisasi: Anak. Praktek di: Siloam Hospitals {i % 40}",
+            "source": "doctors",
+            "hospital_names": [f"Siloam Hospitals {i % 40}"],
+        }
+
+
+def _fake_embed(dim: int):
+    rng = random.Random(0)
+    base = [rng.random() for _ in range(dim)]
+    return lambda text: [x * (len(text) % 7 + 1) for x in base]
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, round(time.perf_counter() - start, 4)
+
+
+def main() -> None:
+    n_reads = int(os.getenv("BENCH_READS", "1000"))
+    src = os.getenv("BENCH_CHUNKS_JSONL")
+    store_path = os.getenv("BENCH_STORE")
+    tmpdir = None
+    if not src:
+        tmpdir = tempfile.TemporaryDirectory()
+        src = os.path.join(tmpdir.name, "chunks.jsonl")
+        store_path = os.path.join(tmpdir.name, "chunks.store")
+        with open(src, "w", encoding="utf-8") as f:
+            for c in _synthetic(int(os.getenv("BENCH_N", "100000"))):
+                f.write(json.dumps(c, ensure_ascii=False) + "\n")
+    if not store_path or not os.path.exists(os.path.join(store_path, "manifest.json")):
+        store_path = store_path or os.path.join(tempfile.mkdtemp(), "chunks.store")
+        write_store(iter_jsonl(src), store_path)
+    with ChunkStore(store_path) as existing:
+        has_vectors = existing.has_vectors()
+    if not has_vectors:
+        embed_store(store_path, _fake_embed(int(os.getenv("BENCH_DIM", "768"))), "bench", progress_every=0)
+
+    rows, jsonl_load = _timed(lambda: list(iter_jsonl(src)))
+    store, store_open = _timed(lambda: ChunkStore(store_path))
+    idx = [random.randrange(len(store)) for _ in range(n_reads)]
+    _, jsonl_reads = _timed(lambda: [rows[i]["content"] for i in idx])
+    _, store_reads = _timed(lambda: [store.document(i) for i in idx])
+    _, store_vectors = _timed(lambda: [sum(store.vector(i)) for i in idx])
+
+    report = {
+        "chunks": len(store),
+        "dim": store.dim,
+        "jsonl": {"file_mb": round(os.path.getsize(src) / 1e6, 1), "load_s": jsonl_load, "random_reads_s": jsonl_reads},
+        "chunk_store": {
+            "open_s": store_open,
+            "random_reads_s": store_reads,
+            "random_vector_reads_s": store_vectors,
+            "reads": n_reads,
+        },
+    }
+    store.close()
+    print(json.dumps(report, indent=2))
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
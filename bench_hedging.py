@@ -0,0 +1,141 @@
+"""
+Uji TypesenseCluster (typesense_cluster.py) terhadap beberapa server Typesense pengganti lokal.
+
+Setiap server pengganti adalah HTTP server kecil di thread yang menjawab /health, /collections/<c>/documents/search
+dan /multi_search dengan latency buatan: `base_ms`, plus ekor lambat `slow_ms` dengan peluang `slow_rate`,
+dan error 503 dengan peluang `error_rate`. Skenario default (BENCH_NODES, JSON) meniru satu replika yang
+kadang lambat; benchmark dijalankan dengan hedging mati lalu hidup, dan melaporkan latency p50 / p95 / p99,
+jumlah error yang sampai ke caller, dan status per node (health, latency, hedge yang menang).
+
+Contoh: python bench_hedging.py
+        BENCH_REQUESTS=2000 BENCH_NODES='[{"base_ms": 5, "slow_ms": 500, "slow_rate": 0.1}, {"base_ms": 8}]' python bench_hedging.py
+"""
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from typesense_cluster import TypesenseCluster
+
+
+BENCH_REQUESTS = int(os.getenv("BENCH_REQUESTS", "500"))
+BENCH_CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "4"))
+BENCH_NODES = json.loads(os.getenv("BENCH_NODES", json.dumps([
+    {"base_ms": 5, "slow_ms": 300, "slow_rate": 0.05},
+    {"base_ms": 6, "slow_ms": 300, "slow_rate": 0.05},
+    {"base_ms": 8, "error_rate": 0.02},
+])))
+_API_KEY = "bench"
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Handler server pengganti; konfigurasi latency ada di `self.server.profile`."""
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.path.startswith("/health"):
+            return self._reply(200, {"ok": True})
+        profile = self.server.profile
+        rng: random.Random = self.server.rng
+        if rng.random() < profile.get("error_rate", 0.0):
+            return self._reply(503, {"message": "Not Ready or Lagging"})
+        delay = profile.get("base_ms", 5.0)
+        if rng.random() < profile.get("slow_rate", 0.0):
+            delay = profile.get("slow_ms", 300.0)
+        time.sleep(delay / 1000)
+        result = {"found": 1, "hits": [{"document": {"id": "1", "content": "stand-in"}}],
+                  "search_time_ms": int(delay), "node": self.server.server_port}
+        if self.path.startswith("/multi_search"):
+            return self._reply(200, {"results": [result]})
+        if "/documents/search" in self.path:
+            return self._reply(200, result)
+        return self._reply(404, {"message": "Not Found"})
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+def start_stand_ins(profiles: List[Dict[str, Any]], seed: int = 0) -> List[ThreadingHTTPServer]:
+    servers = []
+    for i, profile in enumerate(profiles):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+        server.daemon_threads = True
+        server.profile = profile
+        server.rng = random.Random(seed + i)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def run(cluster: TypesenseCluster, requests: int = BENCH_REQUESTS, concurrency: int = BENCH_CONCURRENCY) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker() -> None:
+        nonlocal errors
+        for _ in counter:  # Iterator dibagi antar thread; next() di CPython aman dipakai bersama
+            start = time.perf_counter()
+            try:
+                cluster.search("chunks", {"q": "siloam", "query_by": "content"})
+            except Exception:
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {
+        "hedge": cluster.hedge,
+        "ok": len(latencies),
+        "errors": errors,
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "nodes": cluster.status(),
+    }
+
+
+def main() -> None:
+    servers = start_stand_ins(BENCH_NODES)
+    nodes = [{"host": "127.0.0.1", "port": str(s.server_port), "protocol": "http"} for s in servers]
+    try:
+        report = [
+            run(TypesenseCluster(nodes, api_key=_API_KEY, timeout=2, hedge=hedge))
+            for hedge in (False, True)
+        ]
+    finally:
+        for s in servers:
+            s.shutdown()
+    print(json.dumps({"profiles": BENCH_NODES, "runs": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
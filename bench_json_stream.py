@@ -0,0 +1,93 @@
+"""
+Benchmark parsing doctors.json: json.load (seluruh file) vs iter_json_array (inkremental).
+
+Kalau BENCH_DOCTOR_FILE tidak di-set, file sintetis dengan BENCH_N record dibuat di folder temp
+(struktur sama dengan export dokter: {"data": [...]}). Output: throughput (record/s, MB/s) dan
+memori puncak (tracemalloc) untuk tiap cara, dalam format JSON.
+
+Contoh: python bench_json_stream.py
+        BENCH_DOCTOR_FILE=doctors.json python bench_json_stream.py
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from json_stream import iter_json_array
+
+
+def _write_synthetic(path: str, n: int) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"status": "ok", "data": [')
+        for i in range(n):
+            doc = {
+                "doctor_id": f"doc-{i:07d}",
+                "name": f"dr. Dokter Contoh {i}, Sp.A",
+                "gender_name": "Perempuan" if i % 2 else "Laki-laki",
+                "specialization_name": "Anak",
+                "sub_specialization_name": "Neonatologi" if i % 5 == 0 else None,
+                "consultation_price": 250000 + i % 7 * 10000,
+                "is_emergency_enable": i % 3 == 0,
+                "hospital_ids": [
+                    {"hospital_id": f"h-{(i + j) % 40}", "hospital_name": f"Siloam Hospitals {(i + j) % 40}", "alias": f"SH{(i + j) % 40}"}
+                    for j in range(1 + i % 3)
+                ],
+            }
+            if i:
+                f.write(",")
+            f.write(json.dumps(doc, ensure_ascii=False))
+        f.write("]}")
+
+
+def _json_load(path: str) -> int:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return sum(1 for _ in data.get("data", []))
+
+
+def _streaming(path: str) -> int:
+    return sum(1 for _ in iter_json_array(path, key="data"))
+
+
+def _measure(fn, path: str) -> dict:
+    start = time.perf_counter()
+    n = fn(path)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()  # Ukur memori di run terpisah (tracemalloc memperlambat)
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size_mb = os.path.getsize(path) / 1e6
+    return {
+        "records": n,
+        "seconds": round(elapsed, 3),
+        "records_per_sec": round(n / elapsed),
+        "mb_per_sec": round(size_mb / elapsed, 1),
+        "peak_mem_mb": round(peak / 1e6, 1),
+    }
+
+
+def main() -> None:
+    path = os.getenv("BENCH_DOCTOR_FILE")
+    tmpdir = None
+    if not path:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, "doctors.json")
+        _write_synthetic(path, int(os.getenv("BENCH_N", "100000")))
+
+    report = {
+        "file": path,
+        "file_mb": round(os.path.getsize(path) / 1e6, 1),
+        "json_load": _measure(_json_load, path),
+        "iter_json_array": _measure(_streaming, path),
+    }
+    print(json.dumps(report, indent=2))
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
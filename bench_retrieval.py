@@ -0,0 +1,244 @@
+"""
+Benchmark retrieval offline: kualitas (recall@k, MRR) dan latency (p50/p95/p99) per SearchMode dan k.
+
+Query set berlabel dan ber-versi: retrieval_queries.v<N>.jsonl (BENCH_QUERIES). Label tidak menyimpan
+id chunk (yang bergantung pada isi data), tapi kriteria yang di-resolve ke id saat benchmark jalan:
+    {"qid": ..., "query": ..., "relevant": {"source": "doctors",
+                                             "fields": {"specialization_name": "Anak"},  # substring di metadata
+                                             "content": ["Perempuan"]},                  # substring di content
+     "relevant_ids": [...]}                                                              # opsional, id eksplisit
+Relevansi dihitung di level induk (sub-chunk dihitung sebagai induknya, `parent_id`).
+
+- recall@k = |relevan di top-k| / min(|relevan|, k)   (dibatasi k karena satu query bisa punya ratusan dokter relevan)
+- MRR      = rata-rata 1 / peringkat hit relevan pertama (0 kalau tidak ada di top-k)
+- latency  = p50 / p95 / p99 per (mode, k) dari BENCH_REPEAT kali eksekusi tiap query
+
+Backend (BENCH_BACKEND):
+- typesense : TypesenseRetriever ke collection CHUNKS_COLLECTION (container lokal, lihat docker-compose.yml)
+- local     : LocalRetriever di atas chunk_store (in-process, tanpa jaringan). Embedding query / corpus
+              memakai BENCH_EMBED=hash (deterministik, offline) atau ollama (EMBEDDING_MODEL).
+Corpus untuk resolve label: CHUNKS_STORE kalau ada, kalau tidak CHUNKS_JSONL.
+
+Output JSON (stdout + BENCH_OUTPUT). Kalau BENCH_BASELINE menunjuk ke output run sebelumnya, metrik
+dibandingkan dan proses exit 1 kalau recall/MRR turun > BENCH_TOL_QUALITY atau p95 naik > BENCH_TOL_LATENCY (rasio).
+
+Contoh: BENCH_BACKEND=local BENCH_EMBED=hash python bench_retrieval.py
+        BENCH_BASELINE=bench_retrieval.json python bench_retrieval.py
+"""
+import functools
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Set
+
+from chunk_store import ChunkStore, LocalRetriever, embed_store, iter_jsonl, write_store
+from embedding import hash_embed
+
+
+BENCH_QUERIES = os.getenv("BENCH_QUERIES", "retrieval_queries.v1.jsonl")
+BENCH_BACKEND = os.getenv("BENCH_BACKEND", "local")
+BENCH_EMBED = os.getenv("BENCH_EMBED", "hash")
+BENCH_MODES = [m for m in os.getenv("BENCH_MODES", "text,vector,hybrid").split(",") if m]
+BENCH_KS = [int(k) for k in os.getenv("BENCH_KS", "1,5,10").split(",") if k]
+BENCH_REPEAT = int(os.getenv("BENCH_REPEAT", "3"))
+BENCH_OUTPUT = os.getenv("BENCH_OUTPUT", "bench_retrieval.json")
+BENCH_BASELINE = os.getenv("BENCH_BASELINE")
+BENCH_TOL_QUALITY = float(os.getenv("BENCH_TOL_QUALITY", "0.02"))  # Penurunan absolut recall / MRR
+BENCH_TOL_LATENCY = float(os.getenv("BENCH_TOL_LATENCY", "0.25"))  # Kenaikan relatif p95
+_HASH_DIM = 256
+
+
+def _embedder() -> tuple[Callable[[str], List[float]], str]:
+    if BENCH_EMBED == "hash":
+        return functools.partial(hash_embed, dim=_HASH_DIM), f"hash-{_HASH_DIM}"
+    from retriever import EMBEDDING_MODEL, _embed
+    return _embed, EMBEDDING_MODEL
+
+
+def _iter_corpus() -> Iterator[Dict[str, Any]]:
+    """Chunk corpus sebagai dict {id, content, metadata(dict)}."""
+    store_path = os.getenv("CHUNKS_STORE", "chunks.store")
+    if os.path.exists(os.path.join(store_path, "manifest.json")):
+        with ChunkStore(store_path) as store:
+            for i in range(len(store)):
+                yield {"id": store.id(i), "content": store.content(i), "metadata": json.loads(store.metadata(i))}
+        return
+    for raw in iter_jsonl(os.getenv("CHUNKS_JSONL", "chunks.jsonl")):
+        meta = {k: v for k, v in raw.items() if k not in {"id", "content", "text"}}
+        yield {"id": str(raw.get("id")), "content": raw.get("content") or raw.get("text") or "", "metadata": meta}
+
+
+def _parent_id(chunk_id: str, metadata: Any) -> str:
+    if isinstance(metadata, dict) and metadata.get("parent_id"):
+        return str(metadata["parent_id"])
+    return str(chunk_id)
+
+
+def _contains(value: Any, needle: str) -> bool:
+    needle = needle.casefold()
+    if isinstance(value, (list, tuple)):
+        return any(needle in str(v).casefold() for v in value)
+    return needle in str(value or "").casefold()
+
+
+def _matches(chunk: Mapping[str, Any], rule: Mapping[str, Any]) -> bool:
+    meta = chunk["metadata"]
+    if rule.get("source") and meta.get("source") != rule["source"]:
+        return False
+    for field, needle in (rule.get("fields") or {}).items():
+        if not _contains(meta.get(field), needle):
+            return False
+    return all(_contains(chunk["content"], n) for n in rule.get("content") or [])
+
+
+def load_queries(path: str = BENCH_QUERIES) -> List[Dict[str, Any]]:
+    """Baca query set lalu resolve label kriteria ke id induk chunk yang relevan."""
+    queries = list(iter_jsonl(path))
+    relevant: Dict[str, Set[str]] = {q["qid"]: set(q.get("relevant_ids") or []) for q in queries}
+    rules = [(q["qid"], q["relevant"]) for q in queries if q.get("relevant")]
+    for chunk in _iter_corpus():
+        for qid, rule in rules:
+            if _matches(chunk, rule):
+                relevant[qid].add(_parent_id(chunk["id"], chunk["metadata"]))
+    for q in queries:
+        q["relevant_ids"] = relevant[q["qid"]]
+    return queries
+
+
+def _retriever(k: int):
+    if BENCH_BACKEND == "typesense":
+        from retriever import TypesenseRetriever
+        return TypesenseRetriever(os.getenv("CHUNKS_COLLECTION", "chunks"), k=k)
+    if BENCH_BACKEND != "local":
+        raise ValueError(f"Backend tidak dikenal: {BENCH_BACKEND}")
+    store_path = os.getenv("CHUNKS_STORE", "chunks.store")
+    if not os.path.exists(os.path.join(store_path, "manifest.json")):
+        write_store(iter_jsonl(os.getenv("CHUNKS_JSONL", "chunks.jsonl")), store_path)
+    embed, model = _embedder()
+    if "vector" in BENCH_MODES or "hybrid" in BENCH_MODES:
+        embed_store(store_path, embed, model, progress_every=0)  # No-op kalau vektor untuk model ini sudah ada
+    return LocalRetriever(store_path, k=k, embed=embed)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Persentil dengan interpolasi linear (sama dengan numpy default)."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    pos = (len(values) - 1) * p / 100
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def _ranked_parents(result: Dict[str, Any]) -> List[str]:
+    """Id induk hit berurutan, sibling sub-chunk yang sama hanya dihitung sekali."""
+    out: List[str] = []
+    for hit in result.get("hits", []):
+        doc = hit.get("document", {})
+        meta = doc.get("metadata")
+        if isinstance(meta, str):
+            try:
+                meta = json.loads(meta)
+            except json.JSONDecodeError:
+                meta = None
+        pid = _parent_id(doc.get("id"), meta)
+        if pid not in out:
+            out.append(pid)
+    return out
+
+
+def run_case(retriever: Any, queries: List[Dict[str, Any]], mode: str, k: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    recalls: List[float] = []
+    rrs: List[float] = []
+    per_query: Dict[str, Dict[str, float]] = {}
+    for q in queries:
+        relevant = q["relevant_ids"]
+        result: Dict[str, Any] = {}
+        for _ in range(BENCH_REPEAT):
+            start = time.perf_counter()
+            result = retriever.search(q["query"], mode=mode, k=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if not relevant:
+            continue  # Label tidak ketemu di corpus: hanya ikut latency
+        ranked = _ranked_parents(result)[:k]
+        hits = [i for i, pid in enumerate(ranked) if pid in relevant]
+        recall = len(hits) / min(len(relevant), k)
+        rr = 1.0 / (hits[0] + 1) if hits else 0.0
+        recalls.append(recall)
+        rrs.append(rr)
+        per_query[q["qid"]] = {"recall": round(recall, 4), "rr": round(rr, 4)}
+    return {
+        "mode": mode,
+        "k": k,
+        "queries_labelled": len(recalls),
+        f"recall@{k}": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        "mrr": round(sum(rrs) / len(rrs), 4) if rrs else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+        },
+        "per_query": per_query,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Daftar regresi (kosong kalau aman) antara `report` dan `baseline`."""
+    regressions: List[str] = []
+    old = {(c["mode"], c["k"]): c for c in baseline.get("cases", [])}
+    for case in report["cases"]:
+        prev = old.get((case["mode"], case["k"]))
+        if prev is None:
+            continue
+        label = f"{case['mode']}@{case['k']}"
+        for metric in (f"recall@{case['k']}", "mrr"):
+            if case.get(metric) is not None and prev.get(metric) is not None:
+                if prev[metric] - case[metric] > BENCH_TOL_QUALITY:
+                    regressions.append(f"{label} {metric}: {prev[metric]} -> {case[metric]}")
+        p95_old, p95_new = prev["latency_ms"]["p95"], case["latency_ms"]["p95"]
+        if p95_old > 0 and (p95_new - p95_old) / p95_old > BENCH_TOL_LATENCY:
+            regressions.append(f"{label} p95: {p95_old}ms -> {p95_new}ms")
+    return regressions
+
+
+def main() -> int:
+    queries = load_queries()
+    with open(BENCH_QUERIES, "rb") as f:
+        query_set_hash = hashlib.sha1(f.read()).hexdigest()[:12]
+    report: Dict[str, Any] = {
+        "query_set": os.path.basename(BENCH_QUERIES),
+        "query_set_sha1": query_set_hash,
+        "backend": BENCH_BACKEND,
+        "embed": BENCH_EMBED if BENCH_BACKEND == "local" else "typesense",
+        "repeat": BENCH_REPEAT,
+        "timestamp": int(time.time()),
+        "unlabelled_queries": [q["qid"] for q in queries if not q["relevant_ids"]],
+        "cases": [],
+    }
+    for k in BENCH_KS:
+        retriever = _retriever(k)
+        for mode in BENCH_MODES:
+            report["cases"].append(run_case(retriever, queries, mode, k))
+
+    exit_code = 0
+    if BENCH_BASELINE:
+        with open(BENCH_BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("query_set_sha1") != query_set_hash:
+            print(f"Peringatan: query set berbeda dengan baseline ({baseline.get('query_set')})", file=sys.stderr)
+        report["regressions"] = compare(report, baseline)
+        exit_code = 1 if report["regressions"] else 0
+
+    with open(BENCH_OUTPUT, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    summary = {**report, "cases": [{k: v for k, v in c.items() if k != "per_query"} for c in report["cases"]]}
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Benchmark router model (model_router.py): latency grade / rewrite dan kesepakatan grading model kecil vs model besar.
+
+Untuk setiap query di BENCH_QUERIES, context diambil sekali lewat retriever custom_rag (hybrid, sama seperti tool
+retrieve_chunks). Lalu untuk model besar (BENCH_BIG_MODEL, default AGENT_MODEL_NAME) dan model kecil
+(BENCH_SMALL_MODEL, default RAG_MODEL_GRADE):
+- grade   : GRADE_PROMPT + structured output GradeDocuments, latency p50 / p95 dan jumlah output tidak valid,
+- rewrite : REWRITE_PROMPT, latency p50 / p95,
+- routed  : chain grade dari ModelRouter (model kecil + fallback ke model besar), latency efektif dan jumlah fallback.
+Kesepakatan = persentase query dengan grade model kecil (lewat router) == grade model besar.
+Cache respons LLM dimatikan di benchmark supaya latency yang diukur adalah call model sungguhan.
+
+Contoh: BENCH_SMALL_MODEL=qwen2.5:3b-instruct python bench_router.py
+"""
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+from langchain.chat_models import init_chat_model
+
+import custom_rag
+import tracing
+from bench_retrieval import percentile
+from model_router import RAG_MODEL_PROVIDER, ModelRouter
+from retriever import collapse_siblings, simplify_hits
+
+
+BENCH_QUERIES = os.getenv("BENCH_QUERIES", "retrieval_queries.v1.jsonl")
+BENCH_BIG_MODEL = os.getenv("BENCH_BIG_MODEL", custom_rag.AGENT_MODEL_NAME)
+BENCH_SMALL_MODEL = os.getenv("BENCH_SMALL_MODEL", os.getenv("RAG_MODEL_GRADE", "qwen2.5:3b-instruct"))
+BENCH_REPEAT = int(os.getenv("BENCH_REPEAT", "1"))
+BENCH_OUTPUT = os.getenv("BENCH_OUTPUT", "bench_router.json")
+
+
+def _model(name: str):
+    return init_chat_model(name, temperature=0, model_provider=RAG_MODEL_PROVIDER, cache=False)
+
+
+def _cases() -> List[Dict[str, str]]:
+    cases = []
+    with open(BENCH_QUERIES, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            q = json.loads(line)
+            result = custom_rag._ts_retriever.search(q["query"], mode="hybrid")
+            context = custom_rag._format_hits(collapse_siblings(simplify_hits(result)))
+            cases.append({"qid": q["qid"], "question": q["query"], "context": context})
+    return cases
+
+
+def _timed(fn: Callable[[], Any]) -> tuple[Any, float, str | None]:
+    start = time.perf_counter()
+    try:
+        out = fn()
+        error = None
+    except Exception as e:
+        out, error = None, f"{type(e).__name__}: {e}"[:200]
+    return out, (time.perf_counter() - start) * 1000, error
+
+
+def _grade_value(out: Any) -> str | None:
+    value = (getattr(out, "jawaban", None) or "").strip().lower()
+    return value if value in ("yes", "no") else None
+
+
+def _summary(latencies: List[float], **extra: Any) -> Dict[str, Any]:
+    return {
+        "calls": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        **extra,
+    }
+
+
+def _fallbacks() -> float:
+    return sum(v for (metric, labels), v in tracing._counters.items()
+               if metric == "rag_model_fallback_total" and ("node", "grade") in labels)
+
+
+def main() -> None:
+    big, small = _model(BENCH_BIG_MODEL), _model(BENCH_SMALL_MODEL)
+    router = ModelRouter({"grade": small})
+    chains = {
+        "big": custom_rag.GRADE_PROMPT | big.with_structured_output(custom_rag.GradeDocuments),
+        "small": custom_rag.GRADE_PROMPT | small.with_structured_output(custom_rag.GradeDocuments),
+        "routed": router.structured("grade", big, custom_rag.GRADE_PROMPT, custom_rag.GradeDocuments,
+                                    validate=custom_rag._valid_grade),
+    }
+    cases = _cases()
+    grade_ms: Dict[str, List[float]] = {k: [] for k in chains}
+    invalid: Dict[str, int] = {k: 0 for k in chains}
+    rewrite_ms: Dict[str, List[float]] = {"big": [], "small": []}
+    agree = compared = 0
+    per_query = []
+
+    fallback_before = _fallbacks()
+    for case in cases:
+        labels = {}
+        for _ in range(BENCH_REPEAT):
+            for name, chain in chains.items():
+                out, ms, _ = _timed(lambda: chain.invoke({"question": case["question"], "context": case["context"]}))
+                grade_ms[name].append(ms)
+                labels[name] = _grade_value(out)
+                if labels[name] is None:
+                    invalid[name] += 1
+            prompt = [{"role": "user", "content": custom_rag.REWRITE_PROMPT.format(question=case["question"])}]
+            for name, model in (("big", big), ("small", small)):
+                _, ms, _ = _timed(lambda: model.invoke(prompt))
+                rewrite_ms[name].append(ms)
+        if labels.get("big") and labels.get("routed"):
+            compared += 1
+            agree += labels["big"] == labels["routed"]
+        per_query.append({"qid": case["qid"], **labels})
+
+    report = {
+        "big_model": BENCH_BIG_MODEL,
+        "small_model": BENCH_SMALL_MODEL,
+        "queries": len(cases),
+        "repeat": BENCH_REPEAT,
+        "grade": {name: _summary(grade_ms[name], invalid=invalid[name]) for name in chains},
+        "rewrite": {name: _summary(ms) for name, ms in rewrite_ms.items()},
+        "routed_fallbacks": _fallbacks() - fallback_before,
+        "grade_agreement": round(agree / compared, 3) if compared else None,
+        "per_query": per_query,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if BENCH_OUTPUT:
+        with open(BENCH_OUTPUT, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
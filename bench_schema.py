@@ -0,0 +1,112 @@
+"""
+Bandingkan profil schema "baseline" (schema awal) vs "search" (tuned, lihat collection.SEARCH_TUNING).
+
+Untuk tiap profil: buat collection hospitals / doctors sementara (`<kind>_bench_<profil>`), import data,
+ukur selisih memori Typesense (`typesense_memory_active_bytes` dari /metrics.json), jalankan satu set
+query filter / facet / sort BENCH_ROUNDS kali dan catat latency (search_time_ms dari Typesense dan
+waktu round-trip client), lalu hapus collection-nya. Query yang tidak didukung profil (mis. facet di
+baseline) dicatat sebagai error. Output dalam format JSON.
+
+Contoh: python bench_schema.py
+        BENCH_ROUNDS=200 BENCH_KEEP=1 python bench_schema.py
+"""
+import json
+import os
+import time
+
+import requests
+
+import collection
+from collection import build_schema, client
+
+
+BENCH_ROUNDS = int(os.getenv("BENCH_ROUNDS", "50"))
+BENCH_SETTLE_SECONDS = float(os.getenv("BENCH_SETTLE_SECONDS", "2"))  # Tunggu alokasi memori stabil
+_BASE_URL = "http://localhost:8108"
+
+QUERIES = {
+    "doctors": {
+        "text_name": {"q": "andi", "query_by": "name"},
+        "filter_specialization": {"q": "*", "filter_by": "specialization_name:=Anak"},
+        "filter_emergency_type": {"q": "*", "filter_by": "is_emergency_enable:=true && consultation_type:=[\"offline\"]"},
+        "facet_specialization": {"q": "*", "facet_by": "specialization_name,consultation_type", "per_page": 0},
+        "sort_price_range": {"q": "*", "filter_by": "consultation_price:[100000..300000]", "sort_by": "consultation_price(missing_values: last):asc"},
+    },
+    "hospitals": {
+        "text_hospital": {"q": "siloam", "query_by": "hospital,alias"},
+        "filter_city": {"q": "*", "filter_by": "city:=Jakarta"},
+        "facet_city_province": {"q": "*", "facet_by": "city,province", "per_page": 0},
+    },
+}
+
+
+def _memory_bytes() -> float:
+    res = requests.get(
+        f"{_BASE_URL}/metrics.json",
+        headers={"X-TYPESENSE-API-KEY": collection.api_key or ""},
+        timeout=10,
+    )
+    res.raise_for_status()
+    return float(res.json().get("typesense_memory_active_bytes", 0))
+
+
+def _percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def _run_queries(kind: str, name: str) -> dict:
+    out = {}
+    for label, params in QUERIES[kind].items():
+        params = {"query_by": "name" if kind == "doctors" else "hospital", **params}
+        server_ms, client_ms = [], []
+        try:
+            for _ in range(BENCH_ROUNDS):
+                start = time.perf_counter()
+                res = client.collections[name].documents.search(params)
+                client_ms.append((time.perf_counter() - start) * 1000)
+                server_ms.append(res.get("search_time_ms", 0))
+        except Exception as e:
+            out[label] = {"error": str(e)[:200]}
+            continue
+        out[label] = {
+            "found": res.get("found"),
+            "server_p50_ms": _percentile(server_ms, 50),
+            "server_p95_ms": _percentile(server_ms, 95),
+            "client_p50_ms": round(_percentile(client_ms, 50), 2),
+            "client_p95_ms": round(_percentile(client_ms, 95), 2),
+        }
+    return out
+
+
+def bench_profile(profile: str) -> dict:
+    report = {"profile": profile, "collections": {}}
+    setups = {"hospitals": collection.setup_hospitals_collection, "doctors": collection.setup_doctors_collection}
+    for kind, setup in setups.items():
+        name = f"{kind}_bench_{profile}"
+        collection.delete_collection_if_exists(name)
+        time.sleep(BENCH_SETTLE_SECONDS)
+        before = _memory_bytes()
+        stats = setup(name=name, profile=profile)
+        time.sleep(BENCH_SETTLE_SECONDS)
+        after = _memory_bytes()
+        report["collections"][kind] = {
+            "docs": stats["ok"],
+            "import_docs_per_sec": stats["docs_per_sec"],
+            "memory_delta_mb": round((after - before) / 1e6, 2),
+            "indexed_fields": sum(1 for f in build_schema(kind, name, profile)["fields"] if f.get("index", True)),
+            "queries": _run_queries(kind, name),
+        }
+        if os.getenv("BENCH_KEEP") != "1":
+            collection.delete_collection_if_exists(name)
+    return report
+
+
+def main() -> None:
+    print(json.dumps([bench_profile(p) for p in ("baseline", "search")], indent=2))
+
+
+if __name__ == "__main__":
+    main()
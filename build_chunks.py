@@ -1,7 +1,16 @@
 
+import hashlib
 import json
 import os
-from typing import List, Dict, Any
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Dict, Any
+
+from chunk_splitter import emit_sub_chunks, split_items, split_text  # Sub-chunking konten panjang
+from chunk_store import convert_jsonl  # Artifact kolumnar untuk rag_index.py / retriever lokal
+from dedup import dedup_chunks  # Exact + near-duplicate dedup sebelum indexing
+from json_stream import iter_json_array  # Parser JSON inkremental (record per record)
 
 
 # Nama file FAQ, RS, dan dokter bisa diubah lewat environment variable
@@ -9,14 +18,34 @@ FAqs_FILE = os.getenv("FAQS_FILE", "faqs_extend_no_split.jsonl")
 HOSPITALS_FILE = os.getenv("HOSPITALS_FILE", "hospitals_prod.json")
 DOCTOR_FILE = os.getenv("DOCTOR_FILE", "doctors.json")
 
-# Fungsi untuk membuat chunk dari data FAQ
-def build_faq_chunks(limit: int | None = None) -> List[Dict[str, Any]]:
-    chunks: List[Dict[str, Any]] = []  # List penampung hasil chunk
+# ID chunk: stabil dan unik lintas sumber, diturunkan dari natural key tiap sumber
+#   faqs      -> "faq:<hash konten>"     (FAQ tidak punya id, jadi pakai hash prompt + completion)
+#   hospitals -> "hospital:<Id>"         (fallback "hospital:no-<No>")
+#   doctors   -> "doctor:<doctor_id>"    (fallback hash konten)
+# Dengan begitu upsert di collection `chunks` tidak saling menimpa antar sumber, dan id tidak
+# bergeser kalau ada record baru di tengah file sumber (penting untuk indexing / cache embedding).
+def _content_hash(*parts: Any) -> str:
+    text = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _chunk_id(source: str, key: Any) -> str:
+    return f"{source}:{str(key).strip()}"
+
+
+class ChunkIdCollisionError(ValueError):
+    """Dua chunk berbeda konten mendapat id yang sama."""
+
+
+
+# Fungsi untuk membuat chunk dari data FAQ (generator, satu chunk per baris)
+def build_faq_chunks(limit: int | None = None) -> Iterator[Dict[str, Any]]:
+    count = 0  # Jumlah chunk yang sudah di-yield
     # if not os.path.exists(FAqs_FILE):  # Kalau file tidak ada, langsung return kosong
-    #     return chunks
+    #     return
     with open(FAqs_FILE, encoding="utf-8") as f:
         for i, line in enumerate(f, start=1):  # Baca baris per baris
-            if limit is not None and len(chunks) >= limit:  # Batasi jumlah chunk jika limit diberikan
+            if limit is not None and count >= limit:  # Batasi jumlah chunk jika limit diberikan
                 break
             line = line.strip()  # Bersihkan spasi
             if not line:
@@ -24,30 +53,29 @@ def build_faq_chunks(limit: int | None = None) -> List[Dict[str, Any]]:
             d = json.loads(line)  # Parse JSON
             prompt = d.get("prompt", "")  # Ambil pertanyaan
             completion = d.get("completion", "")  # Ambil jawaban
-            content = f"Pertanyaan: {prompt}\nJawaban: {completion}"  # Format konten
-            chunks.append(
-                {
-                    "id": f"{i}",  # ID unik per FAQ
-                    "content": content,
-                    "source": "faqs",
-                    "faq_index": i,  # Index FAQ
-                }
-            )
-    return chunks
-
-
-
-# Fungsi untuk membuat chunk dari data rumah sakit
-def build_hospital_chunks(limit: int | None = None) -> List[Dict[str, Any]]:
-    chunks: List[Dict[str, Any]] = []  # List penampung hasil chunk
-    # if not os.path.exists(HOSPITALS_FILE):  # Kalau file tidak ada, return kosong
-    #     return chunks
+            header = f"Pertanyaan: {prompt}\nJawaban: "  # Format konten
+            chunk = {
+                "id": _chunk_id("faq", _content_hash(prompt, completion)),  # ID stabil dari konten FAQ
+                "content": header + completion,
+                "source": "faqs",
+                "faq_index": i,  # Index FAQ
+            }
+            count += 1
+            # Jawaban panjang dipecah jadi sub-chunk, masing-masing tetap diawali pertanyaannya
+            parts = split_text(header, completion)
+            yield from emit_sub_chunks(chunk, [{"content": c} for c in parts])
+
 
-    with open(HOSPITALS_FILE, encoding="utf-8") as f:
-        raw = json.load(f)  # Baca seluruh data JSON
 
-    for item in raw:
-        if limit is not None and len(chunks) >= limit:  # Batasi jumlah chunk jika limit diberikan
+# Fungsi untuk membuat chunk dari data rumah sakit (generator, satu chunk per RS)
+def build_hospital_chunks(limit: int | None = None) -> Iterator[Dict[str, Any]]:
+    count = 0  # Jumlah chunk yang sudah di-yield
+    # if not os.path.exists(HOSPITALS_FILE):  # Kalau file tidak ada, return kosong
+    #     return
+
+    # Array top-level dibaca record per record, bukan json.load seluruh file
+    for item in iter_json_array(HOSPITALS_FILE):
+        if limit is not None and count >= limit:  # Batasi jumlah chunk jika limit diberikan
             break
 
         name = item.get("Hospital") or ""  # Nama RS
@@ -70,43 +98,33 @@ def build_hospital_chunks(limit: int | None = None) -> List[Dict[str, Any]]:
 
         content = ". ".join(parts)  # Gabungkan semua bagian jadi satu string
 
-        chunks.append(
-            {
-                "id": f"{item.get('No')}",  # ID unik per RS
-                "content": content,
-                "source": "hospitals",
-                "hospital_id": item.get("Id"),
-                "no": item.get("No"),
-                "city": city,
-                "province": province,
-            }
-        )
-    return chunks
+        count += 1
+        yield {
+            "id": _chunk_id("hospital", item.get("Id") or f"no-{item.get('No')}"),  # ID stabil dari Id RS
+            "content": content,
+            "source": "hospitals",
+            "hospital_id": item.get("Id"),
+            "no": item.get("No"),
+            "city": city,
+            "province": province,
+        }
 
 
 
 # Fungsi untuk membuat chunk dari data dokter
-def build_doctor_chunks(limit: int | None = None) -> List[Dict[str, Any]]:
+def build_doctor_chunks(limit: int | None = None) -> Iterator[Dict[str, Any]]:
     """
-    Ambil data dokter dari file doctors.json, satu chunk per dokter
+    Ambil data dokter dari file doctors.json, satu chunk per dokter.
+    Array `data` (atau array top-level) dibaca secara inkremental, jadi memori tetap datar
+    berapapun ukuran file.
     """
     print("Load data dokter dari file doctors.json untuk build chunks...")  # Info proses
-    import json
-    with open(DOCTOR_FILE, encoding="utf-8") as f:
-        doctors_json = json.load(f)  # Baca data dokter
-    all_docs = doctors_json.get("data", []) if isinstance(doctors_json, dict) else doctors_json  # Handle format dict/list
-    total = len(all_docs)
-    effective_total = min(total, limit) if limit is not None else total  # Hitung jumlah yang akan diproses sesuai limit
-    print(f"Total dokter: {total},fetch: {effective_total}")
-    if limit is not None:
-        all_docs = all_docs[:limit]  # Potong jika limit
-
-    chunks: List[Dict[str, Any]] = []
+    count = 0
     # if not os.path.exists(DOCTOR_FILE):  # Kalau file tidak ada, return kosong
-    #     return chunks
- 
-    for i, doc in enumerate(all_docs, start=1):  # Loop tiap dokter
-        if limit is not None and len(chunks) >= limit:
+    #     return
+
+    for i, doc in enumerate(iter_json_array(DOCTOR_FILE, key="data"), start=1):  # Loop tiap dokter
+        if limit is not None and count >= limit:
             break
 
         name = doc.get("name") or ""  # Nama dokter
@@ -131,53 +149,178 @@ def build_doctor_chunks(limit: int | None = None) -> List[Dict[str, Any]]:
             parts.append(f"Spesialisasi: {spec}")
         if subspec:
             parts.append(f"Sub-spesialisasi: {subspec}")
-        if hospitals:
-            parts.append("Praktek di: " + ", ".join(hospitals))
-
-        content = ". ".join(parts)  # Gabungkan semua bagian jadi satu string
-
-        chunks.append(
-            {
-                "id": f"{i}",  # ID unik per dokter
-                "content": content,
-                "source": "doctors",
-                "doctor_id": doc.get("doctor_id"),
-                "specialization_name": spec,
-                "sub_specialization_name": subspec,
-                "hospital_names": hospitals,
-            }
+        header = ". ".join(parts)  # Gabungkan semua bagian jadi satu string
+
+        chunk = {
+            "id": _chunk_id("doctor", doc.get("doctor_id") or _content_hash(name, spec, subspec, *hospitals)),  # ID stabil dari doctor_id
+            "content": header,
+            "source": "doctors",
+            "doctor_id": doc.get("doctor_id"),
+            "specialization_name": spec,
+            "sub_specialization_name": subspec,
+            "hospital_names": hospitals,
+        }
+        count += 1
+        if not hospitals:
+            yield chunk
+            continue
+        # Daftar RS praktek yang panjang dipecah per grup RS (nama RS tidak terpotong)
+        prefix = header + ". Praktek di: "
+        groups = split_items(prefix, hospitals)
+        yield from emit_sub_chunks(
+            chunk,
+            [{"content": prefix + ", ".join(g), "hospital_names": g} for g in groups],
         )
-    return chunks
-
-
-
-# Fungsi untuk membuat semua chunk sekaligus (FAQ, RS, dokter)
-def build_all_chunks() -> List[Dict[str, Any]]:
-    chunks: List[Dict[str, Any]] = []  # List penampung hasil akhir
-
-    max_faq = 5  # Limit FAQ
-    max_hosp = 5  # Limit RS
-    max_doc = 5  # Limit dokter
-
-    chunks.extend(build_faq_chunks(limit=max_faq))  # Tambahkan chunk FAQ
-    chunks.extend(build_hospital_chunks(limit=max_hosp))  # Tambahkan chunk RS
-    chunks.extend(build_doctor_chunks(limit=max_doc))  # Tambahkan chunk dokter
-    return chunks
+    print(f"Total dokter diproses: {count}")
+
+
+
+# Limit per sumber, kosong = semua record (bisa diatur via env)
+def _env_limit(name: str) -> int | None:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else None
+
+
+SOURCE_LIMITS: Dict[str, int | None] = {
+    "faqs": _env_limit("FAQ_LIMIT"),
+    "hospitals": _env_limit("HOSPITAL_LIMIT"),
+    "doctors": _env_limit("DOCTOR_LIMIT"),
+}
+
+# Builder per sumber, urutan ini juga urutan chunk di file output
+_BUILDERS = {
+    "faqs": build_faq_chunks,
+    "hospitals": build_hospital_chunks,
+    "doctors": build_doctor_chunks,
+}
+
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", str(len(_BUILDERS))))  # 1 = serial, tanpa process pool
+_WRITE_BUFFER = 1 << 20  # Buffer writer 1 MiB
+
+
+
+# Fungsi untuk membuat semua chunk (FAQ, RS, dokter) sebagai generator
+def build_all_chunks(limits: Dict[str, int | None] | None = None) -> Iterator[Dict[str, Any]]:
+    limits = {**SOURCE_LIMITS, **(limits or {})}
+    for source, builder in _BUILDERS.items():
+        yield from builder(limit=limits.get(source))  # Chunk per sumber, satu per satu
+
+
+
+# Cek id unik saat build, per record sumber (chunk utuh atau grup sub-chunk dengan parent_id yang sama):
+# - record yang isinya sama (tanpa field posisi seperti faq_index / no) -> duplikat, dibuang,
+# - id dari natural key (doctor_id / Id RS) dengan isi berbeda -> record sama yang tercantum dua kali,
+#   versi pertama dipakai (dihitung sebagai conflicts),
+# - id dari hash konten / fallback dengan isi berbeda -> ChunkIdCollisionError.
+# Seluruh sub-chunk satu record ikut keputusan sub-chunk pertamanya, jadi `part` / `parts` tetap konsisten.
+_POSITIONAL_KEYS = ("faq_index", "no")  # Posisi record di file sumber, bukan bagian dari isi
+_NATURAL_KEYS = ("doctor_id", "hospital_id")
+
+
+class ChunkIdChecker:
+    def __init__(self) -> None:
+        self._seen: Dict[str, bytes] = {}  # id record -> digest isi chunk pertamanya
+        self._keep = True  # Keputusan untuk record yang sedang berjalan (sub-chunk berikutnya ikut)
+        self.duplicates = 0
+        self.conflicts = 0
+
+    @staticmethod
+    def _digest(chunk: Dict[str, Any]) -> bytes:
+        body = {k: v for k, v in chunk.items() if k not in _POSITIONAL_KEYS}
+        line = json.dumps(body, ensure_ascii=False, sort_keys=True)
+        return hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest()
+
+    def add(self, chunk: Dict[str, Any]) -> bool:
+        """True kalau chunk perlu ditulis, False kalau bagian dari record duplikat."""
+        if chunk.get("part", 1) != 1:
+            return self._keep  # Sub-chunk lanjutan dari record yang sama
+        key = chunk.get("parent_id") or chunk["id"]
+        digest = self._digest(chunk)
+        prev = self._seen.get(key)
+        if prev is None:
+            self._seen[key] = digest
+            self._keep = True
+        elif prev == digest:
+            self.duplicates += 1  # Record identik muncul dua kali, cukup satu
+            self._keep = False
+        elif any(chunk.get(k) for k in _NATURAL_KEYS):
+            self.conflicts += 1  # Natural key sama, isi beda: pakai record pertama
+            self._keep = False
+        else:
+            raise ChunkIdCollisionError(f"ID chunk bentrok dengan konten berbeda: {key}")
+        return self._keep
+
+
+
+# Worker: build satu sumber dan tulis langsung ke file part JSONL
+def _write_source(source: str, limit: int | None, path: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    count = 0
+    checker = ChunkIdChecker()  # Id sudah di-namespace per sumber, jadi cek per sumber cukup
+    with open(path, "w", encoding="utf-8", buffering=_WRITE_BUFFER) as f:
+        for c in _BUILDERS[source](limit=limit):
+            if checker.add(c):
+                f.write(json.dumps(c, ensure_ascii=False) + "\n")  # Tulis per baris
+                count += 1
+    return {
+        "source": source,
+        "count": count,
+        "duplicates": checker.duplicates,
+        "conflicts": checker.conflicts,
+        "seconds": time.perf_counter() - start,
+    }
 
 
 
 # Fungsi untuk menulis hasil chunk ke file JSONL
-def write_chunks_jsonl(path: str = "chunks.jsonl") -> None:
-    chunks = build_all_chunks()  # buat semua chunk
-    print(f"Total chunks: {len(chunks)}")  # Info jumlah chunk
-    with open(path, "w", encoding="utf-8") as f:
-        for c in chunks:
-            f.write(json.dumps(c, ensure_ascii=False) + "\n")  # Tulis per baris
+def write_chunks_jsonl(
+    path: str = "chunks.jsonl",
+    limits: Dict[str, int | None] | None = None,
+    workers: int = BUILD_WORKERS,
+) -> List[Dict[str, Any]]:
+    """
+    Build semua sumber secara paralel (satu proses per sumber), masing-masing ditulis streaming ke
+    file part `<path>.<source>.part`, lalu part digabung berurutan ke `path`. Memori tetap konstan
+    karena tidak ada list chunk yang ditampung. Return statistik per sumber.
+    """
+    limits = {**SOURCE_LIMITS, **(limits or {})}
+    start = time.perf_counter()
+    parts = {source: f"{path}.{source}.part" for source in _BUILDERS}
+    jobs = [(source, limits.get(source), parts[source]) for source in _BUILDERS]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(_write_source, *job) for job in jobs]
+            stats = [fut.result() for fut in futures]
+    else:
+        stats = [_write_source(*job) for job in jobs]
+
+    # Gabungkan part sesuai urutan sumber
+    with open(path, "wb") as out:
+        for source in _BUILDERS:
+            with open(parts[source], "rb") as part:
+                shutil.copyfileobj(part, out, _WRITE_BUFFER)
+            os.remove(parts[source])
+
+    elapsed = time.perf_counter() - start
+    for st in stats:
+        rate = st["count"] / st["seconds"] if st["seconds"] else 0.0
+        dup = f", {st['duplicates']} duplikat identik dibuang" if st["duplicates"] else ""
+        if st["conflicts"]:
+            dup += f", {st['conflicts']} record dengan id sama tapi isi beda (dipakai yang pertama)"
+        print(f"  {st['source']}: {st['count']} chunks, {st['seconds']:.2f}s ({rate:,.0f} rows/s){dup}")
+    total = sum(st["count"] for st in stats)
+    print(f"Total chunks: {total} dalam {elapsed:.2f}s ({total / elapsed:,.0f} rows/s)")  # Info jumlah chunk
     print(f"Tersimpan ke {path}")  # Info selesai
+    return stats
 
 
 
 # Kalau file ini dijalankan langsung, tulis chunk ke file
 if __name__ == "__main__":
-    write_chunks_jsonl()
-
+    out = os.getenv("CHUNKS_JSONL", "chunks.jsonl")
+    write_chunks_jsonl(out)
+    # Dedup langsung setelah build supaya rag_index.py tidak meng-embed chunk duplikat (CHUNKS_DEDUP=0 untuk skip)
+    if os.getenv("CHUNKS_DEDUP", "1") != "0":
+        dedup_chunks(out, report_path=os.getenv("DEDUP_REPORT", "dedup_report.jsonl"))
+    convert_jsonl(out, os.getenv("CHUNKS_STORE", "chunks.store"))
@@ -0,0 +1,104 @@
+"""
+Bulk loader JSONL untuk Typesense, dipakai setup collection di collection.py.
+
+- Dokumen dari iterator (stream) dikelompokkan per batch lalu langsung di-serialisasi jadi JSONL,
+  sehingga client Typesense tidak perlu men-dump list dict lagi dan memori hanya sebesar batch in-flight.
+- Beberapa request `documents.import_` per collection dikirim bersamaan (IMPORT_CONCURRENCY), dengan
+  jumlah batch yang menunggu dibatasi supaya producer tidak jauh di depan Typesense.
+- Hasil per batch (sukses / gagal per dokumen) dijumlahkan; contoh error disimpan untuk dilaporkan.
+
+Env: IMPORT_BATCH_SIZE (default 250), IMPORT_CONCURRENCY (default 4), IMPORT_MAX_ERRORS (default 5).
+"""
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "250"))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "5"))  # Contoh error yang disimpan per collection
+
+
+def _serialize(batch: List[Mapping[str, Any]]) -> str:
+    return "\n".join(json.dumps(d, ensure_ascii=False) for d in batch)
+
+
+def _import_batch(client: Any, collection: str, body: str, action: str) -> List[Dict[str, Any]]:
+    # Body string JSONL dikirim apa adanya; respons juga JSONL (satu baris per dokumen)
+    res = client.collections[collection].documents.import_(body, {"action": action})
+    if isinstance(res, str):
+        return [json.loads(line) for line in res.splitlines() if line.strip()]
+    return list(res)
+
+
+def bulk_import(
+    client: Any,
+    collection: str,
+    docs: Iterable[Mapping[str, Any]],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    concurrency: int = IMPORT_CONCURRENCY,
+    action: str = "create",
+) -> Dict[str, Any]:
+    """Import `docs` ke `collection` secara paralel per batch; return statistik agregat."""
+    stats: Dict[str, Any] = {"collection": collection, "docs": 0, "ok": 0, "fail": 0, "batches": 0, "errors": []}
+    start = time.perf_counter()
+
+    pending: Dict[Future, Tuple[int, int]] = {}  # future -> (nomor batch, jumlah dokumen)
+
+    def collect(fut: Future) -> None:
+        batch_no, size = pending.pop(fut)
+        try:
+            res = fut.result()
+        except Exception as e:  # Seluruh batch gagal (mis. timeout)
+            stats["fail"] += size
+            if len(stats["errors"]) < IMPORT_MAX_ERRORS:
+                stats["errors"].append({"batch": batch_no, "error": str(e)})
+            return
+        for r in res:
+            if r.get("success"):
+                stats["ok"] += 1
+            else:
+                stats["fail"] += 1
+                if len(stats["errors"]) < IMPORT_MAX_ERRORS:
+                    stats["errors"].append({"batch": batch_no, **r})
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"import-{collection}") as pool:
+
+        def submit(batch: List[Mapping[str, Any]]) -> None:
+            # Maksimal 2x concurrency batch in-flight; tunggu sebagian selesai sebelum submit lagi
+            while len(pending) >= concurrency * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    collect(fut)
+            stats["batches"] += 1
+            fut = pool.submit(_import_batch, client, collection, _serialize(batch), action)
+            pending[fut] = (stats["batches"], len(batch))
+
+        batch: List[Mapping[str, Any]] = []
+        for doc in docs:
+            batch.append(doc)
+            stats["docs"] += 1
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+        if batch:
+            submit(batch)
+        done, _ = wait(pending)
+        for fut in done:
+            collect(fut)
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 2)
+    stats["docs_per_sec"] = round(stats["docs"] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+def print_stats(stats: Mapping[str, Any]) -> None:
+    print(
+        f"Import {stats['collection']}: {stats['ok']} sukses, {stats['fail']} gagal, total {stats['docs']} "
+        f"({stats['batches']} batch, {stats['seconds']}s, {stats['docs_per_sec']} docs/s)"
+    )
+    for err in stats["errors"]:
+        print("Contoh error:", err)
@@ -1,10 +1,7 @@
-import typesense, os
+from typesense_cluster import get_cluster
 
-client = typesense.Client({
-    "nodes": [{"host": "localhost", "port": "8108", "protocol": "http"}],
-    "api_key": os.getenv("TYPESENSE_API_KEY"),
-    "connection_timeout_seconds": 10,
-})
+cluster = get_cluster()
+client = cluster.client
 
 # # list semua collection + jumlah dokumen
 collections = client.collections.retrieve()
@@ -17,4 +14,7 @@ docs = client.collections["chunks"].documents.search({
     "query_by": "content",
     "per_page": 1,
 })
-print(docs)
\ No newline at end of file
+print(docs)
+
+# status tiap node (health, latency, hedge)
+print(cluster.status())
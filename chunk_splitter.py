@@ -0,0 +1,115 @@
+"""
+Splitter untuk memecah konten panjang (jawaban FAQ, daftar RS praktek dokter) jadi sub-chunk.
+
+- Budget dihitung per "token" (kata, dipisah whitespace) atau per karakter: env CHUNK_UNIT = token | char.
+- CHUNK_MAX_SIZE: ukuran maksimal satu sub-chunk (0 = tidak di-split), CHUNK_OVERLAP: overlap antar
+  sub-chunk yang berurutan, dalam satuan yang sama.
+- Konten yang muat dalam budget tidak diubah sama sekali (id dan field tetap).
+- Konten yang dipecah menghasilkan sub-chunk dengan id turunan yang stabil `<id induk>#<n>` plus field
+  `parent_id`, `part` (mulai 1), dan `parts`, sehingga retriever bisa menggabungkan hit dari induk yang sama.
+"""
+import os
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "token")
+CHUNK_MAX_SIZE = int(os.getenv("CHUNK_MAX_SIZE", "200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "20"))
+_MIN_BODY_RATIO = 0.25  # Body minimal 25% budget walaupun header panjang
+
+
+def measure(text: str, unit: str = CHUNK_UNIT) -> int:
+    """Ukuran teks dalam satuan budget (jumlah kata atau karakter)."""
+    return len(text.split()) if unit == "token" else len(text)
+
+
+def pack(
+    units: Sequence[str],
+    max_size: int,
+    overlap: int = 0,
+    size: Callable[[str], int] = lambda u: 1,
+) -> List[List[str]]:
+    """
+    Kelompokkan `units` (kata / item daftar) secara greedy ke grup dengan total ukuran <= max_size.
+    Grup berikutnya mengulang unit di akhir grup sebelumnya sampai total `overlap`.
+    Satu unit yang lebih besar dari budget tetap jadi satu grup sendiri.
+    """
+    if not units:
+        return []
+    groups: List[List[str]] = []
+    start = 0
+    while start < len(units):
+        end, total = start, 0
+        while end < len(units) and (end == start or total + size(units[end]) <= max_size):
+            total += size(units[end])
+            end += 1
+        groups.append(list(units[start:end]))
+        if end >= len(units):
+            break
+        # Mundur dari akhir grup selama masih dalam budget overlap, tapi harus tetap maju
+        back, carried = end, 0
+        while back - 1 > start and carried + size(units[back - 1]) <= overlap:
+            back -= 1
+            carried += size(units[back])
+        start = back
+    return groups
+
+
+def _unit_size(unit: str, sep: str) -> Callable[[str], int]:
+    if unit == "token":
+        return lambda u: len(u.split())
+    return lambda u: len(u) + len(sep)
+
+
+def _body_budget(header: str, max_size: int, unit: str) -> int:
+    return max(max_size - measure(header, unit), int(max_size * _MIN_BODY_RATIO), 1)
+
+
+def split_text(
+    header: str,
+    body: str,
+    max_size: int = CHUNK_MAX_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+    unit: str = CHUNK_UNIT,
+) -> List[str]:
+    """Pecah `body` per kata; setiap potongan diawali `header` supaya tetap bisa berdiri sendiri."""
+    if max_size <= 0 or measure(header + body, unit) <= max_size:
+        return [header + body]
+    words = body.split()
+    groups = pack(words, _body_budget(header, max_size, unit), overlap, _unit_size(unit, " "))
+    return [header + " ".join(g) for g in groups]
+
+
+def split_items(
+    header: str,
+    items: Sequence[str],
+    max_size: int = CHUNK_MAX_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+    unit: str = CHUNK_UNIT,
+    sep: str = ", ",
+) -> List[List[str]]:
+    """Pecah daftar item (mis. RS praktek) tanpa memotong item; return grup item per sub-chunk."""
+    items = list(items)
+    if max_size <= 0 or measure(header + sep.join(items), unit) <= max_size:
+        return [items]
+    return pack(items, _body_budget(header, max_size, unit), overlap, _unit_size(unit, sep))
+
+
+def emit_sub_chunks(chunk: Dict[str, Any], parts: Sequence[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield `chunk` apa adanya kalau hanya satu bagian; kalau lebih, yield sub-chunk dengan
+    id `<id>#<n>`, `parent_id`, `part`, `parts`. `parts` berisi field yang di-override per bagian
+    (minimal `content`).
+    """
+    if len(parts) <= 1:
+        yield {**chunk, **(parts[0] if parts else {})}
+        return
+    for n, override in enumerate(parts, start=1):
+        yield {
+            **chunk,
+            **override,
+            "id": f"{chunk['id']}#{n}",
+            "parent_id": chunk["id"],
+            "part": n,
+            "parts": len(parts),
+        }
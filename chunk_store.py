@@ -0,0 +1,443 @@
+"""
+Format artifact kolumnar untuk chunk + vektor, pengganti handoff chunks.jsonl antar tahap.
+
+Satu store adalah folder (default `chunks.store/`):
+    manifest.json       jumlah baris, dimensi + model embedding, versi format, baris yang vektornya belum ada
+    id.bin / id.off.npy              kolom id (UTF-8 berurutan) + offset uint64 (n + 1)
+    content.bin / content.off.npy    kolom content
+    metadata.bin / metadata.off.npy  kolom metadata (string JSON, sama persis dengan field Typesense)
+    vectors.npy         float32 (n, dim), baris ke-i sejajar dengan chunk ke-i (opsional)
+
+Semua file dibaca lewat mmap: membuka store tidak mem-parse apa pun, akses baris ke-i hanya
+membaca slice offset dan byte baris tersebut, dan vektor dikembalikan sebagai memoryview tanpa copy.
+Saat store ditulis ulang, vektor baris dengan id + content yang sama dibawa dari store lama; baris baru /
+berubah dicatat di manifest ("stale") dan hanya baris itu yang di-embed oleh embed_store.
+File .npy memakai format standar numpy (v1.0), jadi bisa juga dibuka dengan np.load(..., mmap_mode="r").
+numpy sendiri opsional; kalau ter-install dipakai untuk pencarian vektor LocalRetriever.
+"""
+import ast  # Parse header .npy
+import hashlib
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+try:
+    import numpy as np  # Opsional: brute-force vector search yang cepat
+except ImportError:  # pragma: no cover
+    np = None
+
+
+FORMAT_VERSION = 1
+COLUMNS = ("id", "content", "metadata")
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+_NPY_HEADER_LEN = 128  # Header di-reserve tetap supaya shape bisa ditulis ulang setelah streaming
+
+if sys.byteorder != "little":  # pragma: no cover
+    raise ImportError("chunk_store hanya mendukung mesin little-endian")
+
+
+def _npy_header(descr: str, shape: Sequence[int]) -> bytes:
+    shape_str = "(" + ", ".join(str(s) for s in shape) + ("," if len(shape) == 1 else "") + ")"
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': %s, }" % (descr, shape_str)
+    pad = _NPY_HEADER_LEN - len(_NPY_MAGIC) - 2 - len(header) - 1
+    if pad < 0:
+        raise ValueError(f"Header .npy terlalu panjang untuk shape {shape}")
+    body = (header + " " * pad + "\n").encode("latin1")
+    return _NPY_MAGIC + len(body).to_bytes(2, "little") + body
+
+
+def _open_npy(path: str, typecode: str):
+    """mmap file .npy; return (mmap, memoryview data ter-cast ke `typecode`, shape)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None, memoryview(b"").cast(typecode), (0,)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:6] != _NPY_MAGIC[:6]:
+        raise ValueError(f"{path} bukan file .npy")
+    hlen = int.from_bytes(mm[8:10], "little")
+    header = ast.literal_eval(mm[10:10 + hlen].decode("latin1"))
+    offset = 10 + hlen
+    data = memoryview(mm)[offset:].cast(typecode)
+    return mm, data, tuple(header["shape"])
+
+
+def _mmap_bytes(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None, memoryview(b"")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm)
+
+
+def _split_row(raw: Mapping[str, Any], id_fallback: int) -> Dict[str, str]:
+    """Sama dengan rag_index._normalize_chunk: id, content, sisanya jadi metadata JSON."""
+    meta = {k: v for k, v in raw.items() if k not in {"id", "content", "text"}}
+    return {
+        "id": str(raw.get("id") or id_fallback),
+        "content": raw.get("content") or raw.get("text") or "",
+        "metadata": json.dumps(meta, ensure_ascii=False),
+    }
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _content_hash(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _previous_vectors(path: str) -> Tuple[Dict[str, Tuple[bytes, int]], Dict[str, Any] | None]:
+    """
+    Vektor store lama yang masih bisa dipakai: {id: (hash content, baris)} + manifest lama.
+    vectors.npy lama dipindah ke vectors.prev.npy supaya tidak ikut ter-mmap saat kolom ditulis ulang.
+    """
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        return {}, None
+    try:
+        store = ChunkStore(path)
+    except ValueError:
+        return {}, None  # Versi format lain: build ulang penuh
+    with store:
+        if not store.has_vectors(stale_ok=True):
+            return {}, None
+        stale = set(store.manifest.get("stale") or ())
+        rows = {
+            store.id(i): (_content_hash(store.raw("content", i)), i)
+            for i in range(len(store)) if i not in stale  # Baris stale belum punya vektor yang valid
+        }
+        manifest = store.manifest
+    os.replace(os.path.join(path, "vectors.npy"), os.path.join(path, "vectors.prev.npy"))
+    return rows, manifest
+
+
+def write_store(chunks: Iterable[Mapping[str, Any]], path: str = "chunks.store") -> int:
+    """
+    Tulis chunk (stream) ke store kolumnar di folder `path`. Return jumlah baris.
+    Vektor baris yang id + content-nya sama dengan store lama dipertahankan; sisanya ditandai stale.
+    """
+    os.makedirs(path, exist_ok=True)
+    previous, prev_manifest = _previous_vectors(path)
+    bins = {c: open(os.path.join(path, f"{c}.bin"), "wb", buffering=1 << 20) for c in COLUMNS}
+    offsets = {c: array("Q", [0]) for c in COLUMNS}
+    reuse: List[int] = []  # Baris lama untuk setiap baris baru, -1 = perlu di-embed
+    n = 0
+    try:
+        for n, raw in enumerate(chunks, start=1):
+            row = {c: v.encode("utf-8") for c, v in _split_row(raw, id_fallback=n).items()}
+            for c in COLUMNS:
+                bins[c].write(row[c])
+                offsets[c].append(offsets[c][-1] + len(row[c]))
+            if previous:
+                old = previous.get(row["id"].decode("utf-8"))
+                same = old is not None and old[0] == _content_hash(row["content"])
+                reuse.append(old[1] if same else -1)
+    finally:
+        for f in bins.values():
+            f.close()
+
+    for c in COLUMNS:
+        with open(os.path.join(path, f"{c}.off.npy"), "wb") as f:
+            f.write(_npy_header("<u8", (n + 1,)))
+            offsets[c].tofile(f)
+    manifest: Dict[str, Any] = {"version": FORMAT_VERSION, "count": n, "dim": None, "model": None}
+    prev_path = os.path.join(path, "vectors.prev.npy")
+    if any(r >= 0 for r in reuse):
+        dim = prev_manifest["dim"]
+        _write_reused_vectors(path, prev_path, reuse, dim)
+        manifest.update(dim=dim, model=prev_manifest["model"], stale=[i for i, r in enumerate(reuse) if r < 0])
+    if os.path.exists(prev_path):
+        os.remove(prev_path)  # Tidak ada baris yang bisa dipakai ulang: embed_store membuat vectors.npy baru
+    _write_manifest(path, manifest)
+    return n
+
+
+def _write_reused_vectors(path: str, prev_path: str, reuse: List[int], dim: int) -> None:
+    """vectors.npy baru: baris lama disalin, baris stale diisi nol sampai di-embed oleh embed_store."""
+    mm, old, _ = _open_npy(prev_path, "f")
+    zeros = bytes(4 * dim)
+    try:
+        with open(os.path.join(path, "vectors.npy"), "wb", buffering=1 << 20) as f:
+            f.write(_npy_header("<f4", (len(reuse), dim)))
+            for r in reuse:
+                f.write(old[r * dim:(r + 1) * dim] if r >= 0 else zeros)
+    finally:
+        old.release()
+        if mm is not None:
+            mm.close()
+
+
+def convert_jsonl(src: str = "chunks.jsonl", path: str = "chunks.store") -> int:
+    start = time.perf_counter()
+    n = write_store(iter_jsonl(src), path)
+    print(f"Store: {n} chunks dari {src} -> {path} dalam {time.perf_counter() - start:.2f}s")
+    return n
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    tmp = os.path.join(path, "manifest.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(path, "manifest.json"))
+
+
+def embed_store(
+    path: str,
+    embed: Callable[[str], List[float]],
+    model: str,
+    progress_every: int = 1000,
+) -> bool:
+    """
+    Hitung embedding dan simpan ke vectors.npy (float32, sejajar dengan baris).
+    Kalau vectors.npy sudah ada untuk `model` yang sama, hanya baris stale (baru / berubah sejak build
+    sebelumnya) yang di-embed; kalau tidak ada yang stale, tidak ada yang di-embed (return False).
+    """
+    store = ChunkStore(path)
+    if store.has_vectors(model):
+        store.close()
+        return False
+    n = len(store)
+    vec_path = os.path.join(path, "vectors.npy")
+    if store.has_vectors(model, stale_ok=True):
+        _embed_stale(store, embed, progress_every)
+        return True
+    tmp_path = vec_path + ".tmp"
+    dim = None
+    start = time.perf_counter()
+    with open(tmp_path, "wb", buffering=1 << 20) as f:
+        for i in range(n):
+            vec = array("f", embed(store.content(i)))
+            if dim is None:
+                dim = len(vec)
+                f.write(_npy_header("<f4", (n, dim)))
+            elif len(vec) != dim:
+                raise ValueError(f"Dimensi embedding baris {i} = {len(vec)}, seharusnya {dim}")
+            vec.tofile(f)
+            if progress_every and (i + 1) % progress_every == 0:
+                print(f"Embedding {i + 1}/{n} ({(i + 1) / (time.perf_counter() - start):.1f} chunk/s)")
+        if dim is None:
+            dim = 0
+            f.write(_npy_header("<f4", (0, 0)))
+    store.close()
+    os.replace(tmp_path, vec_path)
+    manifest = {k: v for k, v in store.manifest.items() if k != "stale"}
+    _write_manifest(path, {**manifest, "dim": dim, "model": model})
+    return True
+
+
+def _embed_stale(store: "ChunkStore", embed: Callable[[str], List[float]], progress_every: int) -> None:
+    """Embed baris stale saja dan tulis langsung ke posisinya di vectors.npy."""
+    stale, dim = store.manifest["stale"], store.dim
+    start = time.perf_counter()
+    with open(os.path.join(store.path, "vectors.npy"), "r+b") as f:
+        for done, i in enumerate(stale, start=1):
+            vec = array("f", embed(store.content(i)))
+            if len(vec) != dim:
+                raise ValueError(f"Dimensi embedding baris {i} = {len(vec)}, seharusnya {dim}")
+            f.seek(_NPY_HEADER_LEN + i * dim * vec.itemsize)
+            vec.tofile(f)
+            if progress_every and done % progress_every == 0:
+                print(f"Embedding {done}/{len(stale)} ({done / (time.perf_counter() - start):.1f} chunk/s)")
+    store.close()
+    _write_manifest(store.path, {k: v for k, v in store.manifest.items() if k != "stale"})
+
+
+class ChunkStore:
+    """Reader store kolumnar berbasis mmap (lihat docstring modul)."""
+
+    def __init__(self, path: str = "chunks.store") -> None:
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        if self.manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Versi store {self.manifest.get('version')} tidak didukung")
+        self._maps: List[Any] = []
+        self._data: Dict[str, memoryview] = {}
+        self._offsets: Dict[str, memoryview] = {}
+        for c in COLUMNS:
+            mm, data = _mmap_bytes(os.path.join(path, f"{c}.bin"))
+            omm, offsets, _ = _open_npy(os.path.join(path, f"{c}.off.npy"), "Q")
+            self._maps += [mm, omm]
+            self._data[c] = data
+            self._offsets[c] = offsets
+        self._vectors: memoryview | None = None
+        self._id_index: Dict[str, int] | None = None
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def __enter__(self) -> "ChunkStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for view in list(self._data.values()) + list(self._offsets.values()):
+            view.release()
+        if self._vectors is not None:
+            self._vectors.release()
+        for mm in self._maps:
+            if mm is None:
+                continue
+            try:
+                mm.close()
+            except BufferError:
+                pass  # Masih ada slice raw()/vector() di pemanggil; mmap dilepas saat slice itu di-GC
+        self._maps = []
+
+    # Akses kolom per baris
+    def raw(self, column: str, i: int) -> memoryview:
+        """Byte UTF-8 kolom `column` baris ke-i, tanpa copy."""
+        off = self._offsets[column]
+        return self._data[column][off[i]:off[i + 1]]
+
+    def id(self, i: int) -> str:
+        return str(self.raw("id", i), "utf-8")
+
+    def content(self, i: int) -> str:
+        return str(self.raw("content", i), "utf-8")
+
+    def metadata(self, i: int) -> str:
+        return str(self.raw("metadata", i), "utf-8")
+
+    def document(self, i: int) -> Dict[str, Any]:
+        """Dokumen siap import Typesense (id, content, metadata string JSON)."""
+        return {"id": self.id(i), "content": self.content(i), "metadata": self.metadata(i)}
+
+    def index_of(self, chunk_id: str) -> int:
+        if self._id_index is None:
+            self._id_index = {self.id(i): i for i in range(len(self))}
+        return self._id_index[chunk_id]
+
+    # Vektor
+    @property
+    def dim(self) -> int | None:
+        return self.manifest.get("dim")
+
+    def has_vectors(self, model: str | None = None, stale_ok: bool = False) -> bool:
+        """vectors.npy ada untuk `model`; baris stale (belum di-embed) hanya diterima kalau `stale_ok`."""
+        if not os.path.exists(os.path.join(self.path, "vectors.npy")) or not self.dim:
+            return False
+        if self.manifest.get("stale") and not stale_ok:
+            return False
+        return model is None or self.manifest.get("model") == model
+
+    @property
+    def vectors(self) -> memoryview:
+        """Seluruh vektor sebagai memoryview float32 datar (n * dim), di-mmap sekali."""
+        if self._vectors is None:
+            mm, data, shape = _open_npy(os.path.join(self.path, "vectors.npy"), "f")
+            if tuple(shape) != (len(self), self.dim):
+                raise ValueError(f"Shape vectors.npy {shape} tidak sejajar dengan {len(self)} baris")
+            self._maps.append(mm)
+            self._vectors = data
+        return self._vectors
+
+    def vector(self, i: int) -> memoryview:
+        d = self.dim
+        return self.vectors[i * d:(i + 1) * d]
+
+    def vector_matrix(self):
+        """numpy array (n, dim) zero-copy di atas mmap; butuh numpy."""
+        if np is None:
+            raise ImportError("numpy diperlukan untuk vector_matrix()")
+        return np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+
+
+class LocalRetriever:
+    """
+    Retriever in-process di atas ChunkStore (tanpa Typesense), interface sama dengan TypesenseRetriever:
+    search / asearch dengan mode text | vector | hybrid, hasil berbentuk respons Typesense
+    sehingga simplify_hits / collapse_siblings tetap bisa dipakai. Cocok untuk benchmark dan dev lokal.
+    """
+
+    def __init__(
+        self,
+        store: "ChunkStore | str" = "chunks.store",
+        k: int = 5,
+        embed: Callable[[str], List[float]] | None = None,
+    ) -> None:
+        self.store = ChunkStore(store) if isinstance(store, str) else store
+        self.k = k
+        self._embed = embed
+        self._matrix = None
+        self._norms = None
+
+    def _embed_query(self, query: str) -> List[float]:
+        if self._embed is None:
+            from retriever import _embed  # Lazy: hanya kalau memang butuh embedding query
+            self._embed = _embed
+        return self._embed(query)
+
+    def _prepare(self) -> None:
+        if self._matrix is not None or np is None:
+            return
+        self._matrix = self.store.vector_matrix()
+        norms = np.linalg.norm(self._matrix, axis=1)
+        norms[norms == 0] = 1.0
+        self._norms = norms
+
+    def _vector_scores(self, embedding: Sequence[float]) -> List[float]:
+        """Jarak cosine (1 - cos) query ke semua baris, seperti vector_distance Typesense."""
+        self._prepare()
+        if self._matrix is not None:
+            q = np.asarray(embedding, dtype=np.float32)
+            q = q / (np.linalg.norm(q) or 1.0)
+            return (1.0 - (self._matrix @ q) / self._norms).tolist()
+        qn = sum(x * x for x in embedding) ** 0.5 or 1.0
+        out = []
+        for i in range(len(self.store)):
+            v = self.store.vector(i)
+            vn = sum(x * x for x in v) ** 0.5 or 1.0
+            out.append(1.0 - sum(a * b for a, b in zip(embedding, v)) / (qn * vn))
+        return out
+
+    def _text_scores(self, query: str) -> List[int]:
+        terms = set(query.casefold().split())
+        return [sum(1 for t in terms if t in self.store.content(i).casefold()) for i in range(len(self.store))]
+
+    def _hit(self, i: int, **score: Any) -> Dict[str, Any]:
+        return {"document": self.store.document(i), **score}
+
+    def search(self, query: str, mode: str = "hybrid", k: int | None = None) -> Dict[str, Any]:
+        k = k or self.k
+        if mode == "text":
+            scores = self._text_scores(query)
+            top = sorted((i for i, s in enumerate(scores) if s), key=lambda i: -scores[i])[:k]
+            hits = [self._hit(i, text_match=scores[i]) for i in top]
+        elif mode in ("vector", "hybrid"):
+            dist = self._vector_scores(self._embed_query(query))
+            if mode == "vector":
+                top = sorted(range(len(dist)), key=dist.__getitem__)[:k]
+                hits = [self._hit(i, vector_distance=dist[i]) for i in top]
+            else:
+                # Rank fusion sederhana (RRF) antara ranking keyword dan vektor
+                text = self._text_scores(query)
+                by_vec = sorted(range(len(dist)), key=dist.__getitem__)
+                by_text = sorted((i for i, s in enumerate(text) if s), key=lambda i: -text[i])
+                fused: Dict[int, float] = {}
+                for ranking in (by_vec, by_text):
+                    for rank, i in enumerate(ranking[: k * 10]):
+                        fused[i] = fused.get(i, 0.0) + 1.0 / (60 + rank)
+                top = sorted(fused, key=lambda i: -fused[i])[:k]
+                hits = [self._hit(i, text_match=text[i] or None, vector_distance=dist[i]) for i in top]
+        else:
+            raise ValueError(f"Mode tidak dikenal: {mode}")
+        return {"found": len(hits), "hits": hits}
+
+    async def asearch(self, query: str, mode: str = "hybrid", k: int | None = None) -> Dict[str, Any]:
+        import asyncio
+        return await asyncio.to_thread(self.search, query, mode, k)
+
+
+if __name__ == "__main__":
+    convert_jsonl(os.getenv("CHUNKS_JSONL", "chunks.jsonl"), os.getenv("CHUNKS_STORE", "chunks.store"))
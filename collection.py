@@ -1,13 +1,163 @@
-import os, json, math, requests, typesense  
+import os, json, math, requests, time
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from datetime import datetime, timezone
+
+from bulk_import import bulk_import, print_stats  # import JSONL paralel per batch
+from hospital_join import HospitalJoin  # join dokter <-> RS saat load
+from json_stream import iter_json_array  # parsing json inkremental (record per record)
+from typesense_cluster import get_client
 
 api_key = os.getenv("TYPESENSE_API_KEY")  # ambil API key dari environment variable
 
-client = typesense.Client({
-    # konfigurasi koneksi ke Typesense lokal
-    "nodes": [{"host": "localhost", "port": "8108", "protocol": "http"}],
-    "api_key": api_key,
-    "connection_timeout_seconds": 10,
-})
+client = get_client()  # client Typesense bersama (node dari env TYPESENSE_NODES, lihat typesense_cluster.py)
+
+# Field dasar tiap collection (= schema awal / profil "baseline")
+HOSPITAL_FIELDS = [
+    {"name": "id", "type": "string"},  # id unik untuk tiap dokumen
+    {"name": "no", "type": "int32"},  # nomor urut
+    {"name": "hospital_id", "type": "string"},  # id rumah sakit
+    {"name": "hospital", "type": "string"},  # nama rumah sakit
+    {"name": "hospital_2", "type": "string", "optional": True},  # nama alternatif rumah sakit
+    {"name": "alias", "type": "string"},  # alias
+    {"name": "address", "type": "string"},  # alamat
+    {"name": "district", "type": "string"},  # kecamatan
+    {"name": "city", "type": "string"},  # kota
+    {"name": "province", "type": "string"},  # provinsi
+    {"name": "slug", "type": "string", "optional": True},  # slug url
+    {"name": "lng", "type": "float", "optional": True},  # longitude
+    {"name": "lat", "type": "float", "optional": True},  # latitude
+]
+
+DOCTOR_FIELDS = [
+    {"name": "id", "type": "string"},  # id urut unik untuk tiap dokumen
+    {"name": "doctor_id", "type": "string"},  # id dokter
+    {"name": "name", "type": "string"},  # nama dokter
+    {"name": "doctor_hope_id", "type": "int64", "optional": True},  # id hope (opsional)
+    {"name": "gender_name", "type": "string", "optional": True},  # jenis kelamin
+    {"name": "specialization_id", "type": "string", "optional": True},  # id spesialisasi
+    {"name": "specialization_name", "type": "string", "optional": True},  # nama spesialisasi
+    {"name": "specialization_name_en", "type": "string", "optional": True},  # nama spesialisasi (en)
+    {"name": "sub_specialization_name", "type": "string", "optional": True},  # subspesialisasi
+    {"name": "sub_specialization_name_en", "type": "string", "optional": True},  # subspesialisasi (en)
+    {"name": "image_url", "type": "string", "optional": True},  # foto
+    {"name": "is_emergency_enable", "type": "bool", "optional": True},  # bisa emergency?
+    {"name": "consultation_price", "type": "int64", "optional": True},  # harga konsultasi
+    {"name": "teleconsult_price", "type": "int64", "optional": True},  # harga telekonsultasi
+    {"name": "is_have_schedule", "type": "bool", "optional": True},  # punya jadwal?
+    {"name": "consultation_type", "type": "string", "optional": True},  # tipe konsultasi
+    {"name": "doctor_seo_key", "type": "string", "optional": True},  # seo key maksudnya adalah bagian dari url dokter yang unik, biasanya berupa nama yang sudah diubah jadi lowercase dan diganti spasi dengan tanda hubung, contoh: "dr-xyz-spesialis-kulit"
+    {"name": "next_avail", "type": "string", "optional": True},  # jadwal berikutnya
+    {"name": "hospital_names", "type": "string[]", "optional": True},  # list nama RS
+    {"name": "hospital_aliases", "type": "string[]", "optional": True},  # list alias RS
+]
+
+# Field hasil join dokter <-> RS (hospital_join.py), ada di semua profil
+JOIN_FIELDS = {
+    "hospitals": [
+        {"name": "doctor_count", "type": "int32", "optional": True},  # jumlah dokter yang praktek
+        {"name": "specializations", "type": "string[]", "optional": True},  # spesialisasi dokter yang praktek
+    ],
+    "doctors": [
+        {"name": "hospital_ids", "type": "string[]", "optional": True},  # Id RS (hospitals.hospital_id)
+        {"name": "cities", "type": "string[]", "optional": True},  # kota RS tempat praktek
+        {"name": "provinces", "type": "string[]", "optional": True},  # provinsi RS tempat praktek
+    ],
+}
+
+# Profil "search": override per field di atas schema dasar
+# - index: False  -> field tampilan saja (url gambar, slug, seo key), disimpan tapi tidak di-index
+# - facet: True   -> field filter (kota, provinsi, spesialisasi, emergency, tipe konsultasi)
+# - sort: True    -> field numerik yang dipakai sort / range filter. Harga yang kosong tidak dikirim, jadi sort
+#                    harga pakai `consultation_price(missing_values: last):asc` supaya dokter tanpa harga di akhir
+SEARCH_TUNING = {
+    "hospitals": {
+        "city": {"facet": True},
+        "province": {"facet": True},
+        "district": {"facet": True},
+        "slug": {"index": False},
+        "no": {"sort": True},
+        "doctor_count": {"sort": True},
+        "specializations": {"facet": True},
+    },
+    "doctors": {
+        "specialization_name": {"facet": True},
+        "sub_specialization_name": {"facet": True},
+        "gender_name": {"facet": True},
+        "is_emergency_enable": {"facet": True},
+        "is_have_schedule": {"facet": True},
+        "consultation_type": {"facet": True},
+        "consultation_price": {"sort": True},
+        "teleconsult_price": {"sort": True},
+        "image_url": {"index": False},
+        "doctor_seo_key": {"index": False},
+        "doctor_hope_id": {"index": False},
+        "hospital_ids": {"facet": True},
+        "cities": {"facet": True},
+        "provinces": {"facet": True},
+    },
+}
+
+# Field tambahan profil "search" yang tidak ada di schema dasar
+SEARCH_EXTRA_FIELDS = {
+    "doctors": [
+    {"name": "next_avail_ts", "type": "int64", "optional": True, "sort": True},  # next_avail dalam epoch detik
+    ],
+}
+
+_BASE_FIELDS = {"hospitals": HOSPITAL_FIELDS, "doctors": DOCTOR_FIELDS}
+
+SCHEMA_PROFILE = os.getenv("SCHEMA_PROFILE", "search")  # "search" (tuned) atau "baseline" (schema awal)
+
+
+def build_schema(kind: str, name: str | None = None, profile: str = SCHEMA_PROFILE) -> dict:
+    """Schema collection `kind` (hospitals / doctors) untuk profil `profile`."""
+    fields = [dict(f) for f in _BASE_FIELDS[kind] + JOIN_FIELDS.get(kind, [])]
+    if profile == "search":
+        tuning = SEARCH_TUNING.get(kind, {})
+        fields = [{**f, **tuning.get(f["name"], {})} for f in fields] + SEARCH_EXTRA_FIELDS.get(kind, [])
+    elif profile != "baseline":
+        raise ValueError(f"Profil schema tidak dikenal: {profile}")
+    return {"name": name or kind, "fields": fields}
+
+
+_join = None
+_join_lock = threading.Lock()
+
+
+def hospital_join():
+    # index RS + agregat dokter per RS, dibangun sekali dan dipakai bersama oleh setup hospitals & doctors
+    global _join
+    with _join_lock:
+        if _join is None:
+            _join = HospitalJoin.from_files("hospitals_prod.json", "doctors.json")
+            print(f"Join dokter-RS: {_join.resolved} entri RS ter-resolve, {_join.unresolved} tidak ketemu")
+    return _join
+
+
+def _to_int(value, default=None):
+    # harga kadang datang sebagai string / float dari API; simpan sebagai int64 supaya bisa di-sort.
+    # Harga kosong / tidak valid -> None (field tidak dikirim), bukan 0 yang ikut ter-sort sebagai termurah
+    if value is None or value == "":
+        return default
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_epoch(value):
+    # next_avail berupa tanggal / datetime ISO; None kalau tidak bisa di-parse
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
 
 ""
 def delete_collection_if_exists(name: str):
@@ -32,7 +182,12 @@ def setup_faqs_collection():
     }
     client.collections.create(schema)  # bikin collection baru
 
-    docs = []
+    stats = bulk_import(client, "faqs", _faq_docs())  # import ke Typesense per batch, paralel
+    print_stats(stats)
+    return stats
+
+
+def _faq_docs():
     with open("faqs_extend_no_split.jsonl", encoding="utf-8") as f:
         for i, line in enumerate(f, start=1):
             line = line.strip()
@@ -40,48 +195,24 @@ def setup_faqs_collection():
                 continue  # skip baris kosong
             d = json.loads(line)
             d["id"] = str(i)  # kasih id urut
-            docs.append(d)
+            yield d
 
-    res = client.collections["faqs"].documents.import_(docs, {"action": "create"})  # import ke Typesense
-    ok = sum(1 for r in res if r.get("success"))  # hitung yang sukses
-    fail = len(res) - ok
-    print(f"   Import faqs: {ok} sukses, {fail} gagal, total {len(docs)}")
-    if fail:
-        for r in res:
-            if not r.get("success"):
-                print("Contoh error:", r)  # tampilkan error 
-                break
 
-
-def setup_hospitals_collection():
+def setup_hospitals_collection(name="hospitals", profile=SCHEMA_PROFILE):
     print("hospitals \n")  # info proses
-    delete_collection_if_exists("hospitals")  # hapus collection lama kalau perlu
+    delete_collection_if_exists(name)  # hapus collection lama kalau perlu
 
-    schema = {
-        "name": "hospitals",
-        "fields": [
-            {"name": "id", "type": "string"},  # id unik untuk tiap dokumen
-            {"name": "no", "type": "int32"},  # nomor urut
-            {"name": "hospital_id", "type": "string"},  # id rumah sakit
-            {"name": "hospital", "type": "string"},  # nama rumah sakit
-            {"name": "hospital_2", "type": "string", "optional": True},  # nama alternatif rumah sakit
-            {"name": "alias", "type": "string"},  # alias
-            {"name": "address", "type": "string"},  # alamat
-            {"name": "district", "type": "string"},  # kecamatan
-            {"name": "city", "type": "string"},  # kota
-            {"name": "province", "type": "string"},  # provinsi
-            {"name": "slug", "type": "string", "optional": True},  # slug url
-            {"name": "lng", "type": "float", "optional": True},  # longitude
-            {"name": "lat", "type": "float", "optional": True},  # latitude
-        ],
-    }
+    schema = build_schema("hospitals", name, profile)
     client.collections.create(schema)  # bikin collection baru
 
-    with open("hospitals_prod.json", encoding="utf-8") as f:
-        raw = json.load(f)  # load data json
+    stats = bulk_import(client, name, _hospital_docs())  # import ke Typesense per batch, paralel
+    print_stats(stats)
+    return stats
+
 
-    docs = []
-    for item in raw:
+def _hospital_docs():
+    join = hospital_join()
+    for item in iter_json_array("hospitals_prod.json"):  # baca record satu per satu
         d = {
             "id": str(item["No"]),
             "no": item["No"],
@@ -98,58 +229,27 @@ def setup_hospitals_collection():
         }
         if item.get("Hospital_2"):
             d["hospital_2"] = item["Hospital_2"]  # tambahkan jika ada
-        docs.append(d)
+        d.update(join.hospital_fields(item["Id"]))  # doctor_count + specializations
+        yield d
 
-    res = client.collections["hospitals"].documents.import_(docs, {"action": "create"})  # import ke Typesense
-    ok = sum(1 for r in res if r.get("success")) # hitung yang sukses
-    fail = len(res) - ok
-    print(f"Import hospitals: {ok} sukses, {fail} gagal, total {len(docs)}")
-    if fail:
-        for r in res:
-            if not r.get("success"):
-                print("Contoh error:", r) # tampilkan error 
-                break
 
-
-def setup_doctors_collection():
+def setup_doctors_collection(name="doctors", profile=SCHEMA_PROFILE):
     print("doctors \n")  # info proses
-    delete_collection_if_exists("doctors")  # hapus collection lama kalau perlu
+    delete_collection_if_exists(name)  # hapus collection lama kalau perlu
 
-    schema = {
-        "name": "doctors",
-        "fields": [
-            {"name": "id", "type": "string"},  # id urut unik untuk tiap dokumen
-            {"name": "doctor_id", "type": "string"},  # id dokter
-            {"name": "name", "type": "string"},  # nama dokter
-            {"name": "doctor_hope_id", "type": "int64", "optional": True},  # id hope (opsional)
-            {"name": "gender_name", "type": "string", "optional": True},  # jenis kelamin
-            {"name": "specialization_id", "type": "string", "optional": True},  # id spesialisasi
-            {"name": "specialization_name", "type": "string", "optional": True},  # nama spesialisasi
-            {"name": "specialization_name_en", "type": "string", "optional": True},  # nama spesialisasi (en)
-            {"name": "sub_specialization_name", "type": "string", "optional": True},  # subspesialisasi
-            {"name": "sub_specialization_name_en", "type": "string", "optional": True},  # subspesialisasi (en)
-            {"name": "image_url", "type": "string", "optional": True},  # foto
-            {"name": "is_emergency_enable", "type": "bool", "optional": True},  # bisa emergency?
-            {"name": "consultation_price", "type": "int64", "optional": True},  # harga konsultasi
-            {"name": "teleconsult_price", "type": "int64", "optional": True},  # harga telekonsultasi
-            {"name": "is_have_schedule", "type": "bool", "optional": True},  # punya jadwal?
-            {"name": "consultation_type", "type": "string", "optional": True},  # tipe konsultasi
-            {"name": "doctor_seo_key", "type": "string", "optional": True},  # seo key maksudnya adalah bagian dari url dokter yang unik, biasanya berupa nama yang sudah diubah jadi lowercase dan diganti spasi dengan tanda hubung, contoh: "dr-xyz-spesialis-kulit"
-            {"name": "next_avail", "type": "string", "optional": True},  # jadwal berikutnya
-            {"name": "hospital_names", "type": "string[]", "optional": True},  # list nama RS
-            {"name": "hospital_aliases", "type": "string[]", "optional": True},  # list alias RS
-        ],
-    }
+    schema = build_schema("doctors", name, profile)
     client.collections.create(schema)  # bikin collection baru
 
     print("Mengambil data dokter dari file doctors.json...")
-    with open("doctors.json", encoding="utf-8") as f:
-        doctors_json = json.load(f)
-    all_docs = doctors_json.get("data", []) if isinstance(doctors_json, dict) else doctors_json
-    print(f"Total diambil: {len(all_docs)}")
+    stats = bulk_import(client, name, _doctor_docs())  # batch IMPORT_BATCH_SIZE, dikirim paralel
+    print_stats(stats)
+    return stats
+
 
-    docs = []
-    for i, doc in enumerate(all_docs, start=1):
+def _doctor_docs():
+    join = hospital_join()
+    # array `data` dibaca inkremental, dokumen dikirim per batch tanpa menampung semua dokter
+    for i, doc in enumerate(iter_json_array("doctors.json", key="data"), start=1):
         hosp_names, hosp_aliases = [], []
         for h in doc.get("hospital_ids") or []:
             if h.get("hospital_name"):
@@ -167,43 +267,37 @@ def setup_doctors_collection():
             "sub_specialization_name_en": doc.get("sub_specialization_name_en") or "",
             "image_url": doc.get("image_url") or "",
             "is_emergency_enable": doc.get("is_emergency_enable", False),
-            "consultation_price": doc.get("consultation_price") or 0,
-            "teleconsult_price": doc.get("teleconsult_price") or 0,
             "is_have_schedule": doc.get("is_have_schedule", False),
             "consultation_type": doc.get("consultation_type") or "",
             "doctor_seo_key": doc.get("doctor_seo_key") or "",
             "next_avail": doc.get("next_avail") or "",
             "hospital_names": hosp_names,
             "hospital_aliases": hosp_aliases,
+            **join.doctor_fields(doc),  # hospital_ids, cities, provinces
         }
+        for field in ("consultation_price", "teleconsult_price"):
+            price = _to_int(doc.get(field))
+            if price is not None:
+                t[field] = price  # field optional: dokter tanpa harga tidak ikut range filter harga
         if doc.get("doctor_hope_id") is not None:
             t["doctor_hope_id"] = doc["doctor_hope_id"]  # tambahkan jika ada
         if doc.get("gender_name"):
             t["gender_name"] = doc["gender_name"]
         if doc.get("specialization_id"):
             t["specialization_id"] = doc["specialization_id"]
-        docs.append(t)
-
-    batch_size = 250  # biar ga terlalu besar sekali import
-    total_ok = total_fail = 0
-    for i in range(0, len(docs), batch_size):
-        batch = docs[i : i + batch_size]
-        res = client.collections["doctors"].documents.import_(batch, {"action": "create"})
-        ok = sum(1 for r in res if r.get("success"))
-        fail = len(res) - ok
-        total_ok += ok
-        total_fail += fail
-        if fail:
-            for r in res:
-                if not r.get("success"):
-                    print(f"Error batch {i // batch_size + 1}:", r)  # tampilkan error
-                    break
-
-    print(f"Import doctors: {total_ok} sukses, {total_fail} gagal, total {len(docs)}")
+        next_avail_ts = _to_epoch(doc.get("next_avail"))
+        if next_avail_ts is not None:
+            t["next_avail_ts"] = next_avail_ts  # versi numerik next_avail untuk sort / range filter
+        yield t
 
 
 if __name__ == "__main__":
-    # jalankan semua setup collection sekaligus
-    setup_faqs_collection()
-    setup_hospitals_collection()
-    setup_doctors_collection()
+    # jalankan semua setup collection sekaligus, tiap collection di thread sendiri
+    start = time.perf_counter()
+    setups = (setup_faqs_collection, setup_hospitals_collection, setup_doctors_collection)
+    with ThreadPoolExecutor(max_workers=len(setups)) as pool:
+        results = [f.result() for f in [pool.submit(fn) for fn in setups]]
+    elapsed = time.perf_counter() - start
+    docs = sum(r["docs"] for r in results)
+    ok = sum(r["ok"] for r in results)
+    print(f"Total: {ok} sukses, {docs - ok} gagal dari {docs} dokumen dalam {elapsed:.2f}s ({docs / elapsed:.1f} docs/s)")
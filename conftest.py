@@ -0,0 +1,2 @@
+# embedding_test.py adalah skrip cek manual ke provider embedding asli, bukan tes pytest
+collect_ignore = ["embedding_test.py"]
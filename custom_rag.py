@@ -1,14 +1,29 @@
+import asyncio  # Untuk graph async dan speculative retrieval versi async
+import difflib  # Untuk mengukur kemiripan query speculative vs query tool
 import os  # Untuk akses environment variable
-from typing import Literal  # Untuk tipe literal pada return function
+import threading  # Lock untuk cache hasil prefetch
+import time  # Masa berlaku hasil prefetch
+import uuid  # Untuk id tool_call sintetis pada retrieval alternatif
+from collections import Counter  # Untuk metrik kedalaman loop rewrite
+from concurrent.futures import Future, ThreadPoolExecutor  # Pool untuk speculative retrieval
+from typing import Annotated, Any, Dict, List, Literal, Tuple, TypedDict  # Untuk tipe literal pada return function
 
-from langchain.tools import tool  # Dekorator untuk definisi tool
 from langchain.chat_models import init_chat_model  # Inisialisasi model chat
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage, message_chunk_to_message  # Tipe pesan LangChain
 from langchain_core.prompts import ChatPromptTemplate  # import ChatPromptTemplate
-from langgraph.graph import MessagesState, StateGraph, START, END  # Untuk workflow graph
+from langchain_core.tools import InjectedToolCallId, StructuredTool  # Tool dengan versi sync + async
+from langgraph.graph import StateGraph, START, END  # Untuk workflow graph
 from langgraph.prebuilt import ToolNode, tools_condition  # Node dan kondisi tool
 from pydantic import BaseModel, Field  # Untuk validasi dan schema output
 
-from retriever import TypesenseRetriever, simplify_hits  # Import retriever custom
+import history  # Reducer history terbatas (trim + ringkas output tool lama)
+import profiling  # Profil stack untuk request lambat (opt-in, RAG_PROFILE=1)
+import llm_cache  # Cache respons LLM persisten
+from model_router import ModelRouter  # Model per node (grade / rewrite pakai model kecil)
+import structured_search  # Pencarian terstruktur dokter / RS tanpa embedding
+import tracing  # Span latency + metrik per node
+from embedding import RAG_KEEP_ALIVE  # keep_alive model OLLAMA
+from retriever import TypesenseRetriever, collapse_siblings, simplify_hits  # Import retriever custom
 
 
 # Daftar provider model yang didukung (catatan saja)
@@ -19,9 +34,27 @@ mistralal, nvidia, ollama, openal, perplexity, together, upstage, xal"""
 # Nama model agent utama, bisa diubah lewat env
 AGENT_MODEL_NAME = "gpt-oss:120b-cloud"  # Default, override via AGENT_MODEL
 
-# Inisialisasi model untuk agent dan penilai relevansi
-response_model = init_chat_model(AGENT_MODEL_NAME, temperature=0, model_provider="ollama")  # Model utama untuk generate response
-model_penilai = init_chat_model(AGENT_MODEL_NAME, temperature=0, model_provider="ollama")  # Model untuk grading relevansi
+# Model untuk agent dan penilai relevansi (dibuat init_backends(), lihat di bawah)
+# Keduanya temperature=0, jadi respons untuk prompt yang sama di-cache persisten (llm_cache.py, env RAG_LLM_CACHE);
+# agent decide (tool calling) tidak di-cache, lihat UNCACHED_NODES di model_router.py
+# keep_alive: model tetap ter-load di OLLAMA di antara request (env RAG_KEEP_ALIVE, lihat warmup.py)
+def _chat_model():
+    return init_chat_model(AGENT_MODEL_NAME, temperature=0, model_provider="ollama", cache=llm_cache.get_cache(), keep_alive=RAG_KEEP_ALIVE)
+
+
+response_model: Any  # Model utama untuk generate response
+model_penilai: Any  # Model untuk grading relevansi
+
+# Override model per node (env RAG_MODEL_DECIDE / _GRADE / _REWRITE / _GENERATE, lihat model_router.py).
+# Node tanpa override memakai response_model (grade: model_penilai), jadi stub di stubs.py tetap berlaku.
+MODEL_ROUTER: ModelRouter
+
+
+# State graph: messages (reducer terbatas dari history.py, bukan add_messages yang terus tumbuh)
+# + jumlah retry (rewrite / retrieval alternatif) yang sudah dipakai
+class AgentState(TypedDict):
+    messages: Annotated[List[AnyMessage], history.bounded_messages]
+    retry_count: int
 
 
 """"
@@ -43,10 +76,165 @@ _DEFAULT_TOP_K = int(os.getenv("RAG_TOP_K", "5"))
 - k: Jumlah hasil teratas yang ingin diambil dari pencarian. Default 5, bisa diubah lewat environment variable RAG_TOP_K. Parameter ini menentukan berapa banyak hasil
  yang akan dikembalikan oleh retriever untuk setiap query yang diberikan.
 """
-_ts_retriever = TypesenseRetriever(
-    collection_name=_DEFAULT_COLLECTION,
-    k=_DEFAULT_TOP_K,
+_ts_retriever: Any
+
+# Model, router, dan retriever asli dibuat saat pertama dibutuhkan (build_graph atau akses atribut modul),
+# bukan saat import: install_stubs (stubs.py) memasang stub lebih dulu, jadi graph stub tidak pernah
+# membuat client OLLAMA, router dari env, atau retriever Typesense.
+_BACKENDS = {
+    "response_model": _chat_model,
+    "model_penilai": _chat_model,
+    "MODEL_ROUTER": ModelRouter.from_env,
+    "_ts_retriever": lambda: TypesenseRetriever(collection_name=_DEFAULT_COLLECTION, k=_DEFAULT_TOP_K),
+}
+_backends_lock = threading.RLock()
+
+
+def init_backends() -> None:
+    """Buat model / router / retriever asli untuk yang belum di-set (stub yang sudah dipasang tidak diganti)."""
+    with _backends_lock:
+        for name, factory in _BACKENDS.items():
+            if name not in globals():
+                globals()[name] = factory()
+
+
+def _backend(name: str) -> Any:
+    """Model / router / retriever untuk dipakai node dan tool: dibuat dulu kalau belum ada.
+    Nama global biasa di dalam modul tidak lewat __getattr__ modul, jadi node / tool yang dipanggil
+    langsung (mis. retrieve_chunks.invoke) sebelum build_graph() akan NameError tanpa accessor ini."""
+    value = globals().get(name)
+    if value is None:
+        init_backends()
+        value = globals()[name]
+    return value
+
+
+def _model(node: str) -> Any:
+    """Model untuk `node` dari MODEL_ROUTER (default response_model)."""
+    return _backend("MODEL_ROUTER").get(node, _backend("response_model"))
+
+#1b. Speculative retrieval (opsional)
+"""
+Speculative retrieval: begitu pertanyaan masuk, hybrid search untuk pertanyaan mentah user langsung
+dijalankan di thread terpisah bersamaan dengan LLM call di `generate_query_or_respond`.
+- Kalau query di tool_call agent cukup mirip (>= SPECULATIVE_MIN_SIMILARITY) dengan pertanyaan mentah,
+  hasil prefetch dipakai oleh `retrieve_chunks` sehingga latency embedding + Typesense tersembunyi di balik LLM call.
+- Kalau tidak mirip (atau agent langsung menjawab), hasil prefetch dibuang.
+- Hasil prefetch disimpan per id tool_call agent (bukan per teks query), jadi request paralel dengan pertanyaan
+  yang sama tidak saling mengambil prefetch. Yang tidak diambil dalam SPECULATIVE_TTL detik (mis. graph error
+  sebelum node tools) dibatalkan dan dibuang.
+- Aktifkan lewat env SPECULATIVE_RETRIEVAL=1 atau `build_graph(speculative=True)`.
+- Hasil search yang sudah diambil di luar graph (batch_qa.py: batch embedding + multi_search untuk banyak
+  pertanyaan sekaligus) bisa dititipkan lewat `prime_retrieval(question, result)`; node speculative memakainya
+  sebagai hasil prefetch untuk pertanyaan itu, tanpa search baru.
+"""
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "0") == "1"
+SPECULATIVE_MIN_SIMILARITY = float(os.getenv("SPECULATIVE_MIN_SIMILARITY", "0.8"))
+SPECULATIVE_TTL = float(os.getenv("SPECULATIVE_TTL", "60"))
+_MAX_PREFETCHED = 256  # Batas entry prefetch yang belum diambil (hindari bocor memori)
+
+_prefetch_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPECULATIVE_WORKERS", "4")),
+    thread_name_prefix="rag-prefetch",
 )
+_prefetched: Dict[str, Tuple[float, Future]] = {}  # id tool_call agent -> (deadline, future hasil search)
+_prefetched_lock = threading.Lock()
+_primed: Dict[str, Dict[str, Any]] = {}  # pertanyaan -> hasil search dari prime_retrieval
+
+
+def _normalize_query(text: str) -> str:
+    return " ".join(str(text).casefold().split())  # Lowercase + rapikan spasi
+
+
+def _query_similarity(a: str, b: str) -> float:
+    """Skor kemiripan 0..1 antara dua query (setelah normalisasi)."""
+    return difflib.SequenceMatcher(None, _normalize_query(a), _normalize_query(b)).ratio()
+
+
+def _latest_question(messages) -> str:
+    """Ambil HumanMessage terakhir (pertanyaan asli atau hasil rewrite)."""
+    for msg in reversed(messages):
+        if getattr(msg, "type", None) == "human":
+            return msg.content
+    return messages[0].content
+
+
+def _claim_prefetch(question: str, future: Future, response) -> None:
+    """Cocokkan tool_call agent dengan hasil prefetch; simpan per id tool_call kalau mirip, buang kalau tidak."""
+    for call in getattr(response, "tool_calls", None) or []:
+        if call.get("name") != retrieve_chunks.name or not call.get("id"):
+            continue
+        query = (call.get("args") or {}).get("query", "")
+        if _query_similarity(query, question) >= SPECULATIVE_MIN_SIMILARITY:
+            now = time.monotonic()
+            with _prefetched_lock:
+                _expire_prefetched(now)
+                _prefetched[call["id"]] = (now + SPECULATIVE_TTL, future)
+                while len(_prefetched) > _MAX_PREFETCHED:
+                    _prefetched.pop(next(iter(_prefetched)))[1].cancel()  # Buang entry paling lama
+            return
+    future.cancel()  # Tidak dipakai: batalkan (kalau belum jalan) dan buang
+
+
+def _expire_prefetched(now: float) -> None:
+    """Buang prefetch yang lewat SPECULATIVE_TTL (dipanggil dengan _prefetched_lock). Urutan dict = urutan deadline."""
+    while _prefetched:
+        key = next(iter(_prefetched))
+        if _prefetched[key][0] > now:
+            return
+        _prefetched.pop(key)[1].cancel()
+
+
+def prime_retrieval(question: str, result: Dict[str, Any]) -> None:
+    """Titipkan hasil hybrid search untuk `question` (dipakai sekali oleh node speculative)."""
+    with _prefetched_lock:
+        _primed[_normalize_query(question)] = result
+        while len(_primed) > _MAX_PREFETCHED:
+            _primed.pop(next(iter(_primed)))  # Buang entry paling lama
+
+
+def _primed_future(question: str) -> Future | None:
+    """Future yang sudah selesai berisi hasil prime_retrieval untuk `question` (None kalau tidak ada)."""
+    with _prefetched_lock:
+        result = _primed.pop(_normalize_query(question), None)
+    if result is None:
+        return None
+    future: Future = Future()
+    future.set_result(result)
+    return future
+
+
+def _pop_prefetched(tool_call_id: str | None) -> Future | None:
+    if not tool_call_id:
+        return None
+    with _prefetched_lock:
+        entry = _prefetched.pop(tool_call_id, None)
+    return entry[1] if entry is not None else None
+
+
+def _take_prefetched(tool_call_id: str | None) -> Dict[str, Any] | None:
+    """Ambil hasil prefetch untuk tool_call ini (sekali pakai). None kalau tidak ada / gagal."""
+    future = _pop_prefetched(tool_call_id)
+    if future is None or isinstance(future, asyncio.Future):
+        return None  # Task asyncio hanya bisa ditunggu dari graph async
+    try:
+        return future.result()
+    except Exception:
+        return None  # Prefetch gagal, fallback ke search biasa
+
+
+async def _atake_prefetched(tool_call_id: str | None) -> Dict[str, Any] | None:
+    """Versi async dari _take_prefetched (menerima task asyncio maupun Future dari thread pool)."""
+    future = _pop_prefetched(tool_call_id)
+    if future is None:
+        return None
+    try:
+        if isinstance(future, asyncio.Future):
+            return await future
+        return await asyncio.wrap_future(future)
+    except Exception:
+        return None
+
 
 #2. Tool: `retrieve_chunks` (pencarian ke Typesense)
 # Tool untuk retrieval chunk dari Typesense
@@ -58,11 +246,8 @@ retrieve_chunks adalah tool yang digunakan untuk mencari dan mengembalikan poton
 - Hasil pencarian disederhanakan dengan fungsi simplify_hits, kemudian konten dari setiap chunk yang ditemukan digabungkan menjadi satu string panjang yang akan dikembalikan sebagai output.
 - Output berupa string yang berisi konten dari chunk yang relevan, dipisahkan dengan garis "---" antar chunk. Jika tidak ada hasil yang ditemukan, akan mengembalikan string kosong.
 """
-@tool
-def retrieve_chunks(query: str) -> str:
-    """Cari dan kembalikan potongan dokumen lokal dari Typesense."""
-    result = _ts_retriever.search(query, mode="hybrid")  # Cari dengan mode hybrid
-    hits = simplify_hits(result)  # Sederhanakan hasil
+def _format_hits(hits: List[Dict[str, Any]]) -> str:
+    """Gabungkan hasil simplify_hits jadi satu context string untuk LLM."""
     if not hits:
         return ""  # Kalau tidak ada hasil, return kosong
 
@@ -80,21 +265,135 @@ def retrieve_chunks(query: str) -> str:
     return "\n\n---\n\n".join(parts)  # Pisahkan antar chunk
 
 
+def _retrieve_chunks(query: str, tool_call_id: Annotated[str, InjectedToolCallId] = "") -> str:
+    """Cari dan kembalikan potongan dokumen lokal dari Typesense."""
+    with tracing.span("tool.retrieve_chunks") as sp:
+        result = _take_prefetched(tool_call_id)  # Pakai hasil speculative retrieval kalau ada
+        sp.set(prefetched=result is not None)
+        if result is None:
+            result = _backend("_ts_retriever").search(query, mode="hybrid")  # Cari dengan mode hybrid
+        hits = collapse_siblings(simplify_hits(result))  # Sederhanakan hasil, satu hit per induk
+        return _format_hits(hits)
+
+
+async def _aretrieve_chunks(query: str, tool_call_id: Annotated[str, InjectedToolCallId] = "") -> str:
+    """Cari dan kembalikan potongan dokumen lokal dari Typesense."""
+    with tracing.span("tool.retrieve_chunks") as sp:
+        result = await _atake_prefetched(tool_call_id)
+        sp.set(prefetched=result is not None)
+        if result is None:
+            result = await _backend("_ts_retriever").asearch(query, mode="hybrid")  # Retriever async
+        return _format_hits(collapse_siblings(simplify_hits(result)))
+
+
+# Tool dengan dua implementasi: ToolNode memakai `_aretrieve_chunks` saat graph dijalankan async
+retrieve_chunks = StructuredTool.from_function(
+    func=_retrieve_chunks,
+    coroutine=_aretrieve_chunks,
+    name="retrieve_chunks",
+)
+
+
 # Alias tool untuk dipakai di agent
 retriever_tool = retrieve_chunks
 
+
+#2b. Tool: `search_doctors_hospitals` (filter terstruktur ke collection doctors / hospitals)
+def _search_doctors_hospitals(
+    target: Literal["doctors", "hospitals"] = "doctors",
+    specialization: str | None = None,
+    city: str | None = None,
+    hospital: str | None = None,
+    gender: str | None = None,
+    emergency: bool | None = None,
+) -> str:
+    """Cari dokter atau rumah sakit dengan filter terstruktur. Pakai tool ini (bukan retrieve_chunks) untuk
+    pertanyaan seperti "psikolog di Yogyakarta", "dokter anak perempuan di Siloam Kebon Jeruk",
+    atau "rumah sakit dengan layanan jantung di Surabaya".
+
+    Args:
+        target: "doctors" untuk mencari dokter, "hospitals" untuk mencari rumah sakit.
+        specialization: Spesialisasi / layanan, mis. "Psikologi", "Anak", "Jantung".
+        city: Nama kota, mis. "Yogyakarta".
+        hospital: Nama atau alias rumah sakit tempat dokter praktek.
+        gender: Jenis kelamin dokter ("Laki-laki" / "Perempuan"); untuk target "hospitals" = RS yang punya dokter ini.
+        emergency: True kalau hanya dokter dengan layanan emergency; untuk target "hospitals" = RS yang punya dokter ini.
+    """
+    with tracing.span("tool.search_doctors_hospitals", target=target):
+        result = structured_search.search(target, specialization, city, hospital, gender, emergency)
+        return structured_search.format_results(target, result)
+
+
+async def _asearch_doctors_hospitals(
+    target: Literal["doctors", "hospitals"] = "doctors",
+    specialization: str | None = None,
+    city: str | None = None,
+    hospital: str | None = None,
+    gender: str | None = None,
+    emergency: bool | None = None,
+) -> str:
+    """Versi async dari `_search_doctors_hospitals`."""
+    with tracing.span("tool.search_doctors_hospitals", target=target):
+        result = await structured_search.asearch(target, specialization, city, hospital, gender, emergency)
+        return structured_search.format_results(target, result)
+
+
+search_doctors_hospitals = StructuredTool.from_function(
+    func=_search_doctors_hospitals,
+    coroutine=_asearch_doctors_hospitals,
+    name="search_doctors_hospitals",
+    parse_docstring=True,
+)
+
+# Semua tool agent: retrieval teks bebas + pencarian terstruktur
+AGENT_TOOLS = [retriever_tool, search_doctors_hospitals]
+
 # 3. Node: Agent decide (generate_query_or_respond)
 #    - Memutuskan: langsung jawab atau panggil tool `retrieve_chunks`
 
 # Node agent: memutuskan apakah perlu retrieval atau langsung jawab
-def generate_query_or_respond(state: MessagesState):
+def generate_query_or_respond(state: AgentState):
     """Panggil model untuk memutuskan: perlu retrieval atau langsung jawab.
 
     Jika perlu retrieval, model akan mengeluarkan tool_call ke `retrieve_chunks`.
     """
-    response = response_model.bind_tools([retriever_tool]).invoke(state["messages"])  # Bind tool dan invoke
+    response = _model("decide").bind_tools(AGENT_TOOLS).invoke(state["messages"])  # Bind tool dan invoke
+    return _after_decide(state, response)
+
+
+def _after_decide(state: AgentState, response):
+    tracing.record_usage(response)  # Token prompt / response ke span node
+    _record_prompt_tokens("generate_query_or_respond", state, state["messages"], response)
+    if not getattr(response, "tool_calls", None):
+        _record_loop_depth(state.get("retry_count", 0), "direct")  # Jawab langsung tanpa retrieval
     return {"messages": [response]}  # Kembalikan response
 
+
+# Varian speculative: hybrid search untuk pertanyaan mentah jalan paralel dengan LLM call
+def generate_query_or_respond_speculative(state: AgentState):
+    """Sama seperti `generate_query_or_respond`, tapi retrieval dimulai bersamaan dengan LLM call."""
+    question = _latest_question(state["messages"])
+    future = _primed_future(question) or _prefetch_pool.submit(_backend("_ts_retriever").search, question, "hybrid")  # Mulai prefetch
+    response = _model("decide").bind_tools(AGENT_TOOLS).invoke(state["messages"])  # Bind tool dan invoke
+    _claim_prefetch(question, future, response)  # Pakai atau buang hasil prefetch
+    return _after_decide(state, response)
+
+
+# Versi async node agent decide
+async def agenerate_query_or_respond(state: AgentState):
+    """Versi async dari `generate_query_or_respond`."""
+    response = await _model("decide").bind_tools(AGENT_TOOLS).ainvoke(state["messages"])
+    return _after_decide(state, response)
+
+
+async def agenerate_query_or_respond_speculative(state: AgentState):
+    """Versi async dari `generate_query_or_respond_speculative` (prefetch sebagai task asyncio)."""
+    question = _latest_question(state["messages"])
+    task = _primed_future(question) or asyncio.ensure_future(_backend("_ts_retriever").asearch(question, mode="hybrid"))
+    response = await _model("decide").bind_tools(AGENT_TOOLS).ainvoke(state["messages"])
+    _claim_prefetch(question, task, response)
+    return _after_decide(state, response)
+
 # 4. Relevance Check (grade_documents)
 
 # Prompt untuk relevansi context
@@ -136,8 +435,8 @@ class GradeDocuments(BaseModel):
 
 # Node relevansi: menentukan langkah selanjutnya
 def grade_documents(
-    state: MessagesState,
-) -> Literal["generate_answer", "rewrite_question"]:
+    state: AgentState,
+) -> Literal["generate_answer", "rewrite_question", "retrieve_alternative", "not_found"]:
     """Menentukan apakah context hasil retrieval relevan dengan pertanyaan."""
     #ini adalah asumsi dari saya bahwa state["messages"] memiliki struktur di mana pesan pertama (messages[0]) 
     # adalah pertanyaan pengguna, dan pesan terakhir (messages[-1]) adalah hasil retrieval dari tool `retrieve_chunks`.
@@ -146,16 +445,36 @@ def grade_documents(
     question = state["messages"][0].content  # Ambil pertanyaan user
     context = state["messages"][-1].content  # Ambil context hasil retrieval
 
-    # Gabung prompt dengan model via struktur `.with_structured_output(PydanticModel)`
-    structured_llm = model_penilai.with_structured_output(GradeDocuments)
-    grade_chain = GRADE_PROMPT | structured_llm
-    
-    response = grade_chain.invoke({"question": question, "context": context})  # Invoke chain
+    response = _grade_chain().invoke({"question": question, "context": context})  # Invoke chain
+    return _route_after_grade(state, response)
+
+
+async def agrade_documents(
+    state: AgentState,
+) -> Literal["generate_answer", "rewrite_question", "retrieve_alternative", "not_found"]:
+    """Versi async dari `grade_documents`."""
+    question = state["messages"][0].content
+    context = state["messages"][-1].content
+    response = await _grade_chain().ainvoke({"question": question, "context": context})
+    return _route_after_grade(state, response)
+
+
+def _grade_chain():
+    # Gabung prompt dengan model via struktur `.with_structured_output(PydanticModel)`.
+    # Kalau grade di-route ke model kecil (RAG_MODEL_GRADE), output yang bukan yes/no jatuh ke model_penilai
+    return _backend("MODEL_ROUTER").structured("grade", _backend("model_penilai"), GRADE_PROMPT, GradeDocuments, validate=_valid_grade)
+
+
+def _valid_grade(response) -> bool:
+    return (response.jawaban or "").strip().lower() in ("yes", "no")
+
+
+def _route_after_grade(state: AgentState, response) -> str:
     nilai = (response.jawaban or "").strip().lower()  # Ambil hasil normalisasi jawaban
 
     if nilai == "yes":
         return "generate_answer"  # Kalau relevan, lanjut generate answer
-    return "rewrite_question"  # Kalau tidak, rewrite pertanyaan
+    return _next_retry_node(state.get("retry_count", 0))  # Kalau tidak: rewrite, retrieval alternatif, atau berhenti
 
 
 
@@ -198,17 +517,165 @@ REWRITE_PROMPT = (
 
 
 # Node rewrite pertanyaan: supaya retrieval lebih relevan
-def rewrite_question(state: MessagesState):
+def rewrite_question(state: AgentState):
     """Rewrite pertanyaan user supaya retrieval berikutnya lebih relevan."""
-    messages = state["messages"]
-    question = messages[0].content  # Ambil pertanyaan user
+    response = _model("rewrite").invoke(_rewrite_messages(state))  # Invoke model
+    return _after_rewrite(state, response)
+
+
+async def arewrite_question(state: AgentState):
+    """Versi async dari `rewrite_question`."""
+    response = await _model("rewrite").ainvoke(_rewrite_messages(state))
+    return _after_rewrite(state, response)
+
+
+def _rewrite_messages(state: AgentState) -> List[Dict[str, str]]:
+    question = state["messages"][0].content  # Ambil pertanyaan user
     prompt = REWRITE_PROMPT.format(question=question)  # Format prompt
-    response = response_model.invoke([{"role": "user", "content": prompt}])  # Invoke model
+    return [{"role": "user", "content": prompt}]
 
+
+def _after_rewrite(state: AgentState, response):
+    tracing.record_usage(response)
+    _record_prompt_tokens("rewrite_question", state, _rewrite_messages(state), response)
     # Kembalikan sebagai HumanMessage baru, agar node berikutnya treat ini
     # seperti pertanyaan user yang sudah diperbaiki.
-    from langchain_core.messages import HumanMessage
-    return {"messages": [HumanMessage(content=response.content)]}  # Kembalikan pesan baru
+    return {
+        "messages": [HumanMessage(content=response.content)],  # Kembalikan pesan baru
+        "retry_count": state.get("retry_count", 0) + 1,  # Hitung pemakaian budget retry
+    }
+
+
+# 5b. Retry budget: retrieval alternatif yang murah sebelum rewrite LLM berikutnya
+"""
+Loop rewrite dibatasi oleh budget retry (env RAG_MAX_RETRIES, default = panjang RETRY_PLAN).
+- RETRY_PLAN menentukan strategi untuk tiap retry secara berurutan: "rewrite" = rewrite via LLM
+  (lalu kembali ke agent decide), sedangkan "text", "vector", dan "wide" langsung search ulang
+  pertanyaan terakhir dengan mode lain atau k yang lebih besar tanpa LLM call tambahan.
+- Retry di luar panjang RETRY_PLAN memakai "rewrite".
+- Kalau budget habis dan context tetap tidak relevan, graph berakhir di node `not_found`
+  dengan jawaban NOT_FOUND_ANSWER, bukan error recursion limit.
+"""
+RETRY_PLAN = ("rewrite", "text", "vector", "wide")
+MAX_RETRIES = int(os.getenv("RAG_MAX_RETRIES", str(len(RETRY_PLAN))))
+_WIDE_K_FACTOR = 3  # Strategi "wide": hybrid dengan k = top_k * faktor ini
+
+# Strategi retrieval alternatif -> (mode, k)
+_ALTERNATIVE_SEARCH = {
+    "text": ("text", None),
+    "vector": ("vector", None),
+    "wide": ("hybrid", _DEFAULT_TOP_K * _WIDE_K_FACTOR),
+}
+
+NOT_FOUND_ANSWER = os.getenv(
+    "RAG_NOT_FOUND_ANSWER",
+    "Maaf, informasi yang kamu cari tidak ditemukan di basis pengetahuan lokal.",
+)
+
+# Metrik kedalaman loop: (jumlah retry, outcome) -> jumlah percakapan
+LOOP_DEPTH = Counter()
+_loop_depth_lock = threading.Lock()
+
+
+def _record_loop_depth(depth: int, outcome: str) -> None:
+    with _loop_depth_lock:
+        LOOP_DEPTH[(depth, outcome)] += 1
+    tracing.inc("rag_loop_depth_total", depth=depth, outcome=outcome)  # Ikut diexport ke /metrics
+
+
+def loop_depth_stats() -> Dict[str, Dict[int, int]]:
+    """Ringkasan metrik kedalaman loop per outcome, contoh {"answered": {0: 10, 1: 3}}."""
+    stats: Dict[str, Dict[int, int]] = {}
+    with _loop_depth_lock:
+        for (depth, outcome), n in sorted(LOOP_DEPTH.items()):
+            stats.setdefault(outcome, {})[depth] = n
+    return stats
+
+
+# Metrik token prompt per node per putaran: (node, retry_count) -> [jumlah call, total token, max token].
+# Dipakai untuk memastikan prompt tetap rata di loop rewrite (history dibatasi history.bounded_messages).
+PROMPT_TOKENS: Dict[tuple, List[int]] = {}
+_prompt_tokens_lock = threading.Lock()
+
+
+def _record_prompt_tokens(node: str, state: AgentState, messages, response) -> None:
+    usage = getattr(response, "usage_metadata", None) or {}
+    tokens = usage.get("input_tokens") or history.estimate_tokens(messages)  # Estimasi kalau model tidak lapor usage
+    tracing.annotate(history_messages=len(state["messages"]), prompt_tokens_seen=tokens)
+    key = (node, state.get("retry_count", 0))
+    with _prompt_tokens_lock:
+        agg = PROMPT_TOKENS.setdefault(key, [0, 0, 0])
+        agg[0] += 1
+        agg[1] += tokens
+        agg[2] = max(agg[2], tokens)
+
+
+def prompt_token_stats() -> Dict[str, Dict[int, Dict[str, float]]]:
+    """Token prompt per node per putaran, contoh {"generate_query_or_respond": {0: {"n": 10, "mean": 850.0, "max": 910}}}."""
+    stats: Dict[str, Dict[int, Dict[str, float]]] = {}
+    with _prompt_tokens_lock:
+        for (node, retry), (n, total, peak) in sorted(PROMPT_TOKENS.items()):
+            stats.setdefault(node, {})[retry] = {"n": n, "mean": round(total / n, 1), "max": peak}
+    return stats
+
+
+def _retry_strategy(retries: int) -> str:
+    return RETRY_PLAN[retries] if retries < len(RETRY_PLAN) else "rewrite"
+
+
+def _next_retry_node(retries: int) -> str:
+    """Tentukan node berikutnya setelah context dinilai tidak relevan."""
+    if retries >= MAX_RETRIES:
+        return "not_found"  # Budget habis
+    if _retry_strategy(retries) == "rewrite":
+        return "rewrite_question"
+    return "retrieve_alternative"
+
+
+# Node retrieval alternatif: search ulang tanpa LLM call
+def retrieve_alternative(state: AgentState):
+    """Search ulang pertanyaan terakhir dengan mode / k lain sesuai RETRY_PLAN."""
+    retries = state.get("retry_count", 0)
+    mode, k = _ALTERNATIVE_SEARCH[_retry_strategy(retries)]
+    question = _latest_question(state["messages"])
+    result = _backend("_ts_retriever").search(question, mode=mode, k=k)
+    return _alternative_update(question, result, retries)
+
+
+async def aretrieve_alternative(state: AgentState):
+    """Versi async dari `retrieve_alternative`."""
+    retries = state.get("retry_count", 0)
+    mode, k = _ALTERNATIVE_SEARCH[_retry_strategy(retries)]
+    question = _latest_question(state["messages"])
+    result = await _backend("_ts_retriever").asearch(question, mode=mode, k=k)
+    return _alternative_update(question, result, retries)
+
+
+def _alternative_update(question: str, result: Dict[str, Any], retries: int):
+    # Bungkus sebagai pasangan tool_call + ToolMessage supaya history tetap valid untuk model
+    call_id = f"call_{uuid.uuid4().hex}"
+    call = AIMessage(
+        content="",
+        tool_calls=[{"name": retrieve_chunks.name, "args": {"query": question}, "id": call_id}],
+    )
+    tool_msg = ToolMessage(
+        content=_format_hits(collapse_siblings(simplify_hits(result))),
+        tool_call_id=call_id,
+        name=retrieve_chunks.name,
+    )
+    return {"messages": [call, tool_msg], "retry_count": retries + 1}
+
+
+# Node akhir kalau budget retry habis
+def not_found(state: AgentState):
+    """Akhiri percakapan dengan jawaban "tidak ditemukan"."""
+    _record_loop_depth(state.get("retry_count", 0), "not_found")
+    return {"messages": [AIMessage(content=NOT_FOUND_ANSWER)]}
+
+
+async def anot_found(state: AgentState):
+    """Versi async dari `not_found` (tanpa I/O, hanya supaya semua node graph async seragam)."""
+    return not_found(state)
 
 # 6. Generate Final Answer
 # Prompt untuk generate jawaban final
@@ -244,13 +711,55 @@ GENERATE_PROMPT = (
 
 
 # Node generate jawaban final
-def generate_answer(state: MessagesState):
+def generate_answer(state: AgentState):
     """Generate jawaban final menggunakan konteks yang sudah lolos relevance check."""
+    _record_loop_depth(state.get("retry_count", 0), "answered")
+    messages = _generate_messages(state)
+    response = _model("generate").invoke(messages)  # Invoke model
+    tracing.record_usage(response)
+    _record_prompt_tokens("generate_answer", state, messages, response)
+    return {"messages": [response]}  # Kembalikan response
+
+
+# Versi async: token di-stream lewat `astream`, sehingga graph.astream(stream_mode="messages")
+# bisa menampilkan jawaban begitu token pertama keluar
+async def agenerate_answer(state: AgentState):
+    """Versi async dari `generate_answer` dengan token streaming."""
+    _record_loop_depth(state.get("retry_count", 0), "answered")
+    messages = _generate_messages(state)
+    model = _model("generate")
+    cached = await llm_cache.alookup_message(model, messages)  # astream tidak lewat cache LangChain
+    if cached is not None:
+        tracing.annotate(cache="hit")
+        return {"messages": [cached]}
+    response = None
+    async for chunk in model.astream(messages):
+        response = chunk if response is None else response + chunk  # Gabungkan chunk token
+    if response is None:
+        return {"messages": [AIMessage(content="")]}
+    tracing.record_usage(response)
+    _record_prompt_tokens("generate_answer", state, messages, response)
+    response = message_chunk_to_message(response)
+    await llm_cache.aupdate_message(model, messages, response)
+    return {"messages": [response]}
+
+
+def _generate_messages(state: AgentState) -> List[Dict[str, str]]:
     question = state["messages"][0].content  # Ambil pertanyaan user
     context = state["messages"][-1].content  # Ambil context hasil retrieval
     prompt = GENERATE_PROMPT.format(question=question, context=context)  # Format prompt
-    response = response_model.invoke([{"role": "user", "content": prompt}])  # Invoke model
-    return {"messages": [response]}  # Kembalikan response
+    return [{"role": "user", "content": prompt}]
+
+
+
+def _structured_hit(state: AgentState) -> bool:
+    """True kalau pesan terakhir adalah hasil `search_doctors_hospitals` yang tidak kosong."""
+    msg = state["messages"][-1]
+    return (
+        isinstance(msg, ToolMessage)
+        and msg.name == search_doctors_hospitals.name
+        and bool(str(msg.content).strip())
+    )
 
 
 
@@ -258,14 +767,37 @@ def generate_answer(state: MessagesState):
 "langgraph-hybrid-rag-tutorial.avif"
 
 # proses graph LangGraph (Agent + RAG Flow)
-def build_graph():
-    workflow = StateGraph(MessagesState)  # Inisialisasi workflow
-
-    # Tambahkan node ke graph
-    workflow.add_node("generate_query_or_respond", generate_query_or_respond)
-    workflow.add_node("retrieve", ToolNode([retriever_tool]))
-    workflow.add_node("rewrite_question", rewrite_question)
-    workflow.add_node("generate_answer", generate_answer)
+def build_graph(speculative: bool = SPECULATIVE_RETRIEVAL, use_async: bool = False):
+    """
+    Bangun graph Agent + RAG.
+    - speculative: aktifkan speculative retrieval di node agent decide.
+    - use_async: pakai versi async semua node (jalankan dengan `ainvoke` / `astream`).
+    """
+    init_backends()  # Model / retriever asli untuk yang belum diganti stub
+    workflow = StateGraph(AgentState)  # Inisialisasi workflow
+
+    # Pilih implementasi node (sync atau async)
+    if use_async:
+        decide = agenerate_query_or_respond_speculative if speculative else agenerate_query_or_respond
+        nodes = (arewrite_question, aretrieve_alternative, agenerate_answer, anot_found)
+        grade = agrade_documents
+    else:
+        decide = generate_query_or_respond_speculative if speculative else generate_query_or_respond
+        nodes = (rewrite_question, retrieve_alternative, generate_answer, not_found)
+        grade = grade_documents
+    rewrite_node, alternative_node, answer_node, not_found_node = nodes
+    grade = tracing.traced_node("grade_documents", grade)  # Grading juga LLM call, ikut diukur
+
+    # Tambahkan node ke graph (setiap node dibungkus span `node.<nama>`)
+    def add_node(name, fn):
+        workflow.add_node(name, tracing.traced_node(name, fn))
+
+    add_node("generate_query_or_respond", decide)
+    workflow.add_node("retrieve", ToolNode(AGENT_TOOLS))  # Diukur lewat span tool.<nama tool>
+    add_node("rewrite_question", rewrite_node)
+    add_node("retrieve_alternative", alternative_node)
+    add_node("generate_answer", answer_node)
+    add_node("not_found", not_found_node)
 
     # Start: dari user question ke agent decide
     workflow.add_edge(START, "generate_query_or_respond")
@@ -280,14 +812,28 @@ def build_graph():
         },
     )
 
-    # Setelah retrieval, relevance check → tentukan langkah berikutnya
+    # Setelah retrieval, relevance check → tentukan langkah berikutnya.
+    # Hasil pencarian terstruktur yang tidak kosong sudah pasti sesuai filter: langsung ke generate_answer
+    if use_async:
+        async def route_retrieve(state: AgentState):
+            return "generate_answer" if _structured_hit(state) else await grade(state)
+    else:
+        def route_retrieve(state: AgentState):
+            return "generate_answer" if _structured_hit(state) else grade(state)
+
     workflow.add_conditional_edges(
         "retrieve",
-        grade_documents,
+        route_retrieve,
+        ["generate_answer", "rewrite_question", "retrieve_alternative", "not_found"],
+    )
+    workflow.add_conditional_edges(
+        "retrieve_alternative",
+        grade,
     )
 
-    # generate_answer → END
+    # generate_answer / not_found → END
     workflow.add_edge("generate_answer", END)
+    workflow.add_edge("not_found", END)
 
     # rewrite_question → kembali ke agent decide
     workflow.add_edge("rewrite_question", "generate_query_or_respond")
@@ -296,40 +842,86 @@ def build_graph():
 
 
 
-# Graph siap dipakai oleh aplikasi lain.
-graph = build_graph()
-
-
-
-# Contoh pemanggilan sederhana dari CLI
-if __name__ == "__main__":
-    from langchain_core.messages import HumanMessage
-
+# Graph siap dipakai oleh aplikasi lain: `custom_rag.graph` / `custom_rag.async_graph` (untuk ainvoke / astream,
+# token streaming), dibangun saat pertama diakses supaya import custom_rag tetap ringan.
+graph: Any
+async_graph: Any
+
+
+def _compiled(name: str) -> Any:
+    with _backends_lock:
+        if name not in globals():
+            globals()[name] = build_graph(use_async=name == "async_graph")
+        return globals()[name]
+
+
+def __getattr__(name: str) -> Any:
+    if name in ("graph", "async_graph"):
+        return _compiled(name)
+    if name in _BACKENDS:
+        init_backends()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Cetak update per node (dipakai CLI)
+def _print_update(node: str, update: Dict[str, Any]) -> None:
+    msg = update["messages"][-1]
+    content = getattr(msg, 'content', msg)
+    # Handle output yang mengandung signature
+    if isinstance(content, list) and content and isinstance(content[0], dict):
+        for item in content:
+            if 'extras' in item and 'signature' in item['extras']:
+                item = item.copy()
+                item['extras'] = {k: v for k, v in item['extras'].items() if k != 'signature'}
+        print(f"[{node}] -> {msg.type}: {content}\n")
+    elif isinstance(content, dict) and 'extras' in content and 'signature' in content['extras']:
+        content = content.copy()
+        content['extras'] = {k: v for k, v in content['extras'].items() if k != 'signature'}
+        print(f"[{node}] -> {msg.type}: {content}\n")
+    else:
+        print(f"[{node}] -> {msg.type}: {content}\n")
+
+
+# Jalankan satu pertanyaan di graph async: update node dicetak seperti biasa,
+# token dari `generate_answer` dicetak langsung begitu keluar dari model
+async def _achat(question: str) -> None:
+    state = {"messages": [HumanMessage(role="user", content=question)]}  # Bungkus pertanyaan
+    streaming = False
+    with tracing.span("graph"), profiling.profile_request(question=question):
+        async for mode, payload in _compiled("async_graph").astream(state, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                token, meta = payload
+                if meta.get("langgraph_node") == "generate_answer" and isinstance(token.content, str):
+                    if not streaming:
+                        print("[generate_answer] -> ai: ", end="", flush=True)
+                        streaming = True
+                    print(token.content, end="", flush=True)
+                continue
+            for node, update in payload.items():
+                if node == "generate_answer" and streaming:
+                    print("\n")  # Jawaban sudah tercetak per token
+                    continue
+                _print_update(node, update)
+
+
+
+# Loop CLI dalam satu event loop (client async OLLAMA terikat ke event loop yang sama)
+async def _amain() -> None:
     print("\nRunning Agentic RAG (LangGraph + Typesense)\n")
+    if os.getenv("RAG_METRICS_PORT"):
+        tracing.start_metrics_server()  # Endpoint /metrics untuk Prometheus
     while True:
-        question = input("Pertanyaan kamu (atau ketik 'exit' untuk keluar): ")  # Input dari user
+        question = await asyncio.to_thread(input, "Pertanyaan kamu (atau ketik 'exit' untuk keluar): ")  # Input dari user
         if question.strip().lower() in ["exit", "quit"]:
             print("Keluar dari chat.")
             break
         if not question.strip():
             print("Pertanyaan tidak boleh kosong. Silakan masukkan pertanyaan.")
             continue
-        state = {"messages": [HumanMessage(role="user", content=question)]}  # Bungkus pertanyaan
-        for chunk in graph.stream(state):  # Stream hasil dari graph
-            for node, update in chunk.items():
-                msg = update["messages"][-1]
-                content = getattr(msg, 'content', msg)
-                # Handle output yang mengandung signature
-                if isinstance(content, list) and content and isinstance(content[0], dict):
-                    for item in content:
-                        if 'extras' in item and 'signature' in item['extras']:
-                            item = item.copy()
-                            item['extras'] = {k: v for k, v in item['extras'].items() if k != 'signature'}
-                    print(f"[{node}] -> {msg.type}: {content}\n")
-                elif isinstance(content, dict) and 'extras' in content and 'signature' in content['extras']:
-                    content = content.copy()
-                    content['extras'] = {k: v for k, v in content['extras'].items() if k != 'signature'}
-                    print(f"[{node}] -> {msg.type}: {content}\n")
-                else:
-                    print(f"[{node}] -> {msg.type}: {content}\n")
+        await _achat(question)  # Stream update node + token jawaban final
 
+
+# Contoh pemanggilan sederhana dari CLI
+if __name__ == "__main__":
+    asyncio.run(_amain())
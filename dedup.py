@@ -0,0 +1,275 @@
+"""
+Tahap dedup antara build_chunks.py dan rag_index.py.
+
+Alur: chunks.jsonl -> dedup.py -> chunks.jsonl (tanpa duplikat) + dedup_report.jsonl -> rag_index.py
+
+1. Exact dedup: konten yang sama setelah normalisasi (lowercase, spasi dirapikan) digabung.
+2. Near-duplicate: MinHash atas shingle 3 kata + LSH banding. Signature memakai one-permutation
+   hashing dengan densifikasi (satu hash per shingle, bukan satu per permutasi), jadi tetap cepat
+   walau tanpa numpy. Kandidat dari bucket LSH diverifikasi dengan estimasi Jaccard >= threshold.
+3. Chunk dalam satu cluster digabung ke chunk yang muncul paling awal di file; sisanya dibuang.
+   Cluster hanya dibentuk di dalam sumber yang sama (faqs / hospitals).
+
+Unit dedup adalah record sumber, bukan sub-chunk: sub-chunk dengan parent_id yang sama (chunk_splitter.py)
+dibandingkan sebagai satu teks dan dibuang / dipertahankan bersama, jadi `part` / `parts` sub-chunk yang
+tersisa tetap konsisten. Sumber di DEDUP_SKIP_SOURCES (default doctors) tidak ikut dedup konten: dua dokter
+berbeda bisa punya nama, spesialisasi, dan RS yang sama; duplikat dokter sudah dibuang per doctor_id oleh
+ChunkIdChecker di build_chunks.py.
+
+Kompleksitas mendekati linear: satu pass untuk signature, O(n * bands) untuk LSH (setiap chunk hanya
+dibandingkan dengan anggota pertama bucket), lalu satu pass lagi untuk menulis hasil.
+
+Env: DEDUP_THRESHOLD (default 0.9), DEDUP_NUM_PERM (default 64), DEDUP_SHINGLE (default 3),
+     DEDUP_SKIP_SOURCES (default doctors, dipisah koma),
+     CHUNKS_JSONL (input), DEDUP_OUTPUT (default = input, ditimpa), DEDUP_REPORT (default dedup_report.jsonl).
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from array import array
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))
+DEDUP_SHINGLE = int(os.getenv("DEDUP_SHINGLE", "3"))
+DEDUP_SKIP_SOURCES = frozenset(s.strip() for s in os.getenv("DEDUP_SKIP_SOURCES", "doctors").split(",") if s.strip())
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_EMPTY = 0xFFFFFFFF  # Penanda bin kosong di signature
+_VALUE_MASK = 0xFFFFFFFF
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def _exact_key(text: str) -> bytes:
+    return hashlib.blake2b(_normalize(text).encode("utf-8"), digest_size=16).digest()
+
+
+def shingles(text: str, size: int = DEDUP_SHINGLE) -> set:
+    """Shingle n-kata dari teks ter-normalisasi (teks pendek -> satu shingle)."""
+    words = _WORD.findall(text.casefold())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str, num_perm: int = DEDUP_NUM_PERM, size: int = DEDUP_SHINGLE) -> array:
+    """
+    Signature MinHash dengan one-permutation hashing: tiap shingle di-hash sekali, bin = hash % num_perm,
+    nilai minimum per bin disimpan. Bin kosong diisi dari bin terisi berikutnya (densifikasi rotasi)
+    supaya signature tetap bisa dibandingkan posisi per posisi.
+    """
+    sig = array("I", [_EMPTY]) * num_perm
+    for sh in shingles(text, size):
+        h = int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "little")
+        b = h % num_perm
+        v = (h >> 32) & _VALUE_MASK
+        if v < sig[b]:
+            sig[b] = v
+    if _EMPTY in sig and any(v != _EMPTY for v in sig):
+        # Satu pass mundur melingkar: isi bin kosong dari bin terisi berikutnya,
+        # plus offset jarak supaya bin hasil salinan tidak identik dengan sumbernya
+        dense = array("I", sig)
+        nxt = None
+        for j in range(2 * num_perm - 1, -1, -1):
+            i = j % num_perm
+            if sig[i] != _EMPTY:
+                nxt = j
+            elif nxt is not None and j < num_perm:
+                dense[i] = (sig[nxt % num_perm] + (nxt - j) * 0x9E3779B1) & _VALUE_MASK
+        sig = dense
+    return sig
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimasi Jaccard dari dua signature."""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """Pilih (bands, rows) dengan titik belok (1/b)^(1/r) paling dekat ke threshold."""
+    best = (num_perm, 1)
+    best_err = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if bands == 0:
+            break
+        err = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+class _UnionFind:
+    def __init__(self) -> None:
+        self.parent: List[int] = []
+
+    def add(self) -> int:
+        self.parent.append(len(self.parent))
+        return len(self.parent) - 1
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Root = index terkecil, yaitu chunk yang muncul paling awal
+            if rb < ra:
+                ra, rb = rb, ra
+            self.parent[rb] = ra
+
+
+def _iter_records(path: str) -> Iterator[List[Dict[str, Any]]]:
+    """Chunk per record sumber: chunk utuh, atau semua sub-chunk berurutan dengan parent_id yang sama."""
+    record: List[Dict[str, Any]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if record and chunk.get("part", 1) == 1:
+                yield record
+                record = []
+            record.append(chunk)
+    if record:
+        yield record
+
+
+def find_duplicates(
+    path: str,
+    threshold: float = DEDUP_THRESHOLD,
+    num_perm: int = DEDUP_NUM_PERM,
+    skip_sources: frozenset = DEDUP_SKIP_SOURCES,
+) -> Tuple[List[str], List[int], Dict[int, Tuple[int, str, float]]]:
+    """
+    Pass pertama: hitung cluster duplikat per record.
+    Return (ids, sizes, merged): id record (parent_id / id), jumlah baris chunk per record, dan
+    merged[index record] = (index record yang dipertahankan, alasan, similarity).
+    """
+    bands, rows = lsh_params(threshold, num_perm)
+    uf = _UnionFind()
+    ids: List[str] = []
+    sizes: List[int] = []
+    sigs: List[array | None] = []
+    reason: Dict[int, Tuple[str, float]] = {}
+    exact: Dict[Tuple[str, bytes], int] = {}
+    buckets: Dict[Tuple[str, int, bytes], int] = {}  # (source, band, slice) -> index pertama
+
+    for i, record in enumerate(_iter_records(path)):
+        uf.add()
+        head = record[0]
+        ids.append(str(head.get("parent_id") or head.get("id")))
+        sizes.append(len(record))
+        source = str(head.get("source", ""))
+        if source in skip_sources:
+            sigs.append(None)
+            continue
+        content = " ".join(c.get("content") or "" for c in record)
+
+        key = (source, _exact_key(content))
+        first = exact.get(key)
+        if first is not None:
+            uf.union(first, i)
+            reason[i] = ("exact", 1.0)
+            sigs.append(sigs[first])
+            continue
+        exact[key] = i
+
+        sig = minhash(content, num_perm)
+        sigs.append(sig)
+        for band in range(bands):
+            part = sig[band * rows:(band + 1) * rows].tobytes()
+            bkey = (source, band, part)
+            other = buckets.get(bkey)
+            if other is None:
+                buckets[bkey] = i
+                continue
+            if uf.find(other) == uf.find(i):
+                continue
+            sim = similarity(sig, sigs[other])
+            if sim >= threshold:
+                uf.union(other, i)
+                reason.setdefault(i, ("near", round(sim, 3)))
+
+    merged: Dict[int, Tuple[int, str, float]] = {}
+    for i in range(len(ids)):
+        root = uf.find(i)
+        if root != i:
+            why, sim = reason.get(i, ("near", round(similarity(sigs[i], sigs[root]), 3)))
+            merged[i] = (root, why, sim)
+    return ids, sizes, merged
+
+
+def dedup_chunks(
+    in_path: str = "chunks.jsonl",
+    out_path: str | None = None,
+    report_path: str = "dedup_report.jsonl",
+    threshold: float = DEDUP_THRESHOLD,
+    num_perm: int = DEDUP_NUM_PERM,
+) -> Dict[str, Any]:
+    """Dedup file chunk JSONL; tulis hasil ke out_path (default: timpa in_path) dan laporan cluster."""
+    start = time.perf_counter()
+    ids, sizes, merged = find_duplicates(in_path, threshold, num_perm)
+
+    # Laporan: satu baris per cluster, chunk yang dipertahankan + daftar yang digabung
+    clusters: Dict[int, List[Dict[str, Any]]] = {}
+    for i, (root, why, sim) in merged.items():
+        clusters.setdefault(root, []).append({"id": ids[i], "reason": why, "similarity": sim})
+    with open(report_path, "w", encoding="utf-8") as f:
+        for root in sorted(clusters):
+            f.write(json.dumps({"kept": ids[root], "merged": clusters[root]}, ensure_ascii=False) + "\n")
+
+    # Pass kedua: tulis chunk yang dipertahankan (via file sementara supaya bisa timpa input)
+    out_path = out_path or in_path
+    tmp_path = out_path + ".tmp"
+    kept = 0
+    with open(in_path, encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8", buffering=1 << 20) as dst:
+        i, left = 0, sizes[0] if sizes else 0  # Record ke-i, sisa baris chunk record itu
+        for line in src:
+            if not line.strip():
+                continue
+            if not left:
+                i += 1
+                left = sizes[i]
+            left -= 1
+            if i not in merged:
+                dst.write(line if line.endswith("\n") else line + "\n")
+                kept += 1
+    os.replace(tmp_path, out_path)
+
+    stats = {
+        "input": sum(sizes),
+        "records": len(ids),
+        "kept": kept,
+        "exact_duplicates": sum(1 for _, why, _ in merged.values() if why == "exact"),
+        "near_duplicates": sum(1 for _, why, _ in merged.values() if why == "near"),
+        "clusters": len(clusters),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    print(
+        f"Dedup: {stats['input']} -> {stats['kept']} chunks ({stats['records']} record, "
+        f"{stats['exact_duplicates']} exact, {stats['near_duplicates']} near-duplicate, "
+        f"{stats['clusters']} cluster) dalam {stats['seconds']}s. Laporan: {report_path}"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    src = os.getenv("CHUNKS_JSONL", "chunks.jsonl")
+    dedup_chunks(
+        src,
+        out_path=os.getenv("DEDUP_OUTPUT") or src,
+        report_path=os.getenv("DEDUP_REPORT", "dedup_report.jsonl"),
+    )
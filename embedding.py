@@ -0,0 +1,456 @@
+"""
+Provider embedding yang bisa diganti-ganti, dengan timeout per provider, circuit breaker, dan failover.
+
+Provider (EMBEDDING_PROVIDERS, dipisah koma, urutan = prioritas):
+- ollama : model EMBEDDING_MODEL di OLLAMA_HOST (remote, default perilaku lama)
+- onnx   : model yang sama (Embedding-Gemma) di-export ke ONNX dan dijalankan in-process di CPU
+           (onnxruntime + tokenizers, folder EMBEDDING_ONNX_DIR berisi model.onnx + tokenizer.json)
+- hash   : feature hashing deterministik, offline (tes / benchmark); dimensi EMBEDDING_HASH_DIM.
+           Ruang vektornya beda dengan model asli, jadi tidak bisa dicampur dengan ollama / onnx di satu rantai
+           failover (FailoverEmbedder menolaknya: vektor query dari ruang lain lolos guard dimensi tapi hasil
+           search-nya sampah).
+
+Setiap call lewat `FailoverEmbedder`:
+- timeout per provider (EMBEDDING_TIMEOUT, bisa di-override EMBEDDING_TIMEOUT_<NAMA>, mis. EMBEDDING_TIMEOUT_OLLAMA=2),
+  dipasang di client provider itu sendiri (HTTP client OLLAMA), jadi dihitung sejak request dimulai dan request
+  yang timeout benar-benar dibatalkan. Provider in-process (onnx / hash) tidak punya timeout; kalau lambat,
+  ia dipindah ke belakang lewat EWMA latency,
+- circuit breaker per provider: terbuka setelah EMBEDDING_BREAKER_FAILURES kegagalan beruntun, provider
+  dilewati selama EMBEDDING_BREAKER_RESET detik lalu dicoba satu kali lagi (half-open),
+- failover berbasis latency: provider yang rata-rata latency-nya (EWMA) di atas EMBEDDING_SLOW_MS
+  dipindah ke belakang selama masih ada provider lain yang sehat. Setiap EMBEDDING_SLOW_PROBE detik satu call
+  dikirim lagi ke provider itu sebagai probe; latency probe menggantikan EWMA-nya, jadi provider yang sudah
+  pulih naik lagi ke urutan prioritasnya,
+- `embed_batch` untuk banyak teks sekaligus (mis. batch_qa.py): satu call provider (OLLAMA /api/embed dengan
+  list input), timeout client dikali jumlah teks,
+- guard dimensi: kalau `dim` diberikan (num_dim field `vector` di collection), vektor dengan dimensi lain
+  dianggap kegagalan provider dan call pindah ke provider berikutnya; kalau semua salah, EmbeddingDimError.
+
+Contoh: EMBEDDING_PROVIDERS=ollama,onnx EMBEDDING_TIMEOUT_OLLAMA=2 EMBEDDING_ONNX_DIR=models/embeddinggemma python custom_rag.py
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Sequence
+
+from tracing import inc, log, span
+
+
+OLLAMA_HOST = os.getenv(
+    "OLLAMA_HOST",
+    "https://boats-billing-kinds-detected.trycloudflare.com",  # Endpoint OLLAMA default, bisa diganti dengan env
+)
+EMBEDDING_MODEL = os.getenv(
+    "EMBEDDING_MODEL",
+    "hf.co/rizkysulaeman/Embedding-Gemma-300m-Healthcare:F16",
+)
+# keep_alive untuk setiap request ke OLLAMA (embedding di sini, chat model di custom_rag / model_router),
+# supaya model tetap ter-load di antara request; heartbeat warmup.py memperpanjangnya saat idle
+RAG_KEEP_ALIVE = os.getenv("RAG_KEEP_ALIVE", "30m")
+EMBEDDING_PROVIDERS = [p.strip() for p in os.getenv("EMBEDDING_PROVIDERS", "ollama").split(",") if p.strip()]
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "10"))
+EMBEDDING_BREAKER_FAILURES = int(os.getenv("EMBEDDING_BREAKER_FAILURES", "3"))
+EMBEDDING_BREAKER_RESET = float(os.getenv("EMBEDDING_BREAKER_RESET", "30"))
+EMBEDDING_SLOW_MS = float(os.getenv("EMBEDDING_SLOW_MS", "0"))  # 0 = setengah timeout provider
+EMBEDDING_SLOW_PROBE = float(os.getenv("EMBEDDING_SLOW_PROBE", "30"))
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "models/embeddinggemma-onnx")
+EMBEDDING_ONNX_MAX_TOKENS = int(os.getenv("EMBEDDING_ONNX_MAX_TOKENS", "2048"))
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0 = default onnxruntime
+EMBEDDING_HASH_DIM = int(os.getenv("EMBEDDING_HASH_DIM", "768"))  # Sama dengan dimensi Embedding-Gemma
+
+_EWMA_ALPHA = 0.2
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class EmbeddingError(RuntimeError):
+    """Semua provider gagal (timeout, error, atau circuit terbuka)."""
+
+
+class EmbeddingDimError(EmbeddingError):
+    """Dimensi vektor tidak sama dengan num_dim collection."""
+
+
+def check_dim(vector: Sequence[float], num_dim: int | None, source: str = "embedding") -> Sequence[float]:
+    """Guard dimensi: raise EmbeddingDimError kalau len(vector) != num_dim (None = tidak dicek)."""
+    if num_dim and len(vector) != num_dim:
+        raise EmbeddingDimError(f"{source} menghasilkan vektor {len(vector)} dimensi, collection butuh num_dim={num_dim}")
+    return vector
+
+
+def hash_embed(text: str, dim: int = EMBEDDING_HASH_DIM) -> List[float]:
+    """Embedding deterministik (feature hashing kata, bertanda) untuk tes / benchmark offline."""
+    vec = [0.0] * dim
+    for tok in _TOKEN.findall(text.casefold()):
+        h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    return vec
+
+
+def _is_timeout(e: BaseException) -> bool:
+    """Timeout dari client provider (TimeoutError, httpx.TimeoutException, dst.)."""
+    return isinstance(e, TimeoutError) or "Timeout" in type(e).__name__
+
+
+class EmbeddingProvider:
+    """Interface provider: `embed` wajib, `aembed` default menjalankan `embed` di thread.
+    `timeout` harus ditegakkan provider sendiri di call client-nya."""
+
+    name = "base"
+    space = EMBEDDING_MODEL  # Ruang vektor (sama dengan model_key); provider dengan space beda tidak bisa failover
+
+    def __init__(self, timeout: float | None = None) -> None:
+        self.timeout = timeout if timeout is not None else float(
+            os.getenv(f"EMBEDDING_TIMEOUT_{self.name.upper()}", EMBEDDING_TIMEOUT)
+        )
+
+    def embed(self, text: str) -> List[float]:
+        raise NotImplementedError
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed, text)
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self.embed(t) for t in texts]
+
+
+class OllamaProvider(EmbeddingProvider):
+    name = "ollama"
+
+    def __init__(self, host: str = OLLAMA_HOST, model: str = EMBEDDING_MODEL, timeout: float | None = None) -> None:
+        super().__init__(timeout)
+        import ollama as lama  # Lazy: provider lain tidak butuh client OLLAMA
+        self._lama = lama
+        self.host = host
+        self.model = model
+        self.client = lama.Client(host=host, timeout=self.timeout)
+        self.async_client = lama.AsyncClient(host=host, timeout=self.timeout)  # Untuk graph async
+        self._batch_clients: Dict[int, Any] = {}  # Ukuran batch -> client dengan timeout timeout * ukuran
+
+    def embed(self, text: str) -> List[float]:
+        return self.client.embeddings(model=self.model, prompt=text, keep_alive=RAG_KEEP_ALIVE)["embedding"]
+
+    async def aembed(self, text: str) -> List[float]:
+        return (await self.async_client.embeddings(model=self.model, prompt=text, keep_alive=RAG_KEEP_ALIVE))["embedding"]
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        client = self._batch_clients.get(len(texts))
+        if client is None:
+            client = self._batch_clients[len(texts)] = self._lama.Client(host=self.host, timeout=self.timeout * len(texts))
+        return list(client.embed(model=self.model, input=list(texts), keep_alive=RAG_KEEP_ALIVE)["embeddings"])
+
+
+class OnnxProvider(EmbeddingProvider):
+    """Embedding-Gemma versi ONNX di CPU. Output `sentence_embedding` dipakai langsung kalau ada, kalau tidak mean pooling."""
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str = EMBEDDING_ONNX_DIR, timeout: float | None = None) -> None:
+        super().__init__(timeout)
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self._np = np
+        opts = ort.SessionOptions()
+        if EMBEDDING_ONNX_THREADS:
+            opts.intra_op_num_threads = EMBEDDING_ONNX_THREADS
+        path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(path):
+            path = os.path.join(model_dir, "onnx", "model.onnx")  # Layout export HF / optimum
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(EMBEDDING_ONNX_MAX_TOKENS)
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self._outputs = [o.name for o in self.session.get_outputs()]
+        self._lock = threading.Lock()  # Satu inferensi per waktu; onnxruntime sudah multi-thread di dalam
+
+    def embed(self, text: str) -> List[float]:
+        np = self._np
+        enc = self.tokenizer.encode(text)
+        ids = np.asarray([enc.ids], dtype=np.int64)
+        mask = np.asarray([enc.attention_mask], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        with self._lock:
+            if "sentence_embedding" in self._outputs:
+                (vec,) = self.session.run(["sentence_embedding"], feed)
+                return vec[0].astype(np.float32).tolist()
+            (hidden,) = self.session.run([self._outputs[0]], feed)
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled[0].tolist()
+
+
+class HashProvider(EmbeddingProvider):
+    name = "hash"
+
+    def __init__(self, dim: int = EMBEDDING_HASH_DIM, timeout: float | None = None) -> None:
+        super().__init__(timeout)
+        self.dim = dim
+        self.space = f"hash-{dim}"
+
+    def embed(self, text: str) -> List[float]:
+        return hash_embed(text, self.dim)
+
+    async def aembed(self, text: str) -> List[float]:
+        return hash_embed(text, self.dim)  # Murni CPU dan cepat, tidak perlu thread
+
+
+PROVIDERS = {"ollama": OllamaProvider, "onnx": OnnxProvider, "hash": HashProvider}
+
+
+class CircuitBreaker:
+    """closed -> open setelah `failures` kegagalan beruntun -> half-open (satu percobaan) setelah `reset_seconds`."""
+
+    def __init__(self, failures: int = EMBEDDING_BREAKER_FAILURES, reset_seconds: float = EMBEDDING_BREAKER_RESET) -> None:
+        self.max_failures = failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True  # Hanya satu request yang menguji provider
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.max_failures:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class _Slot:
+    """Provider + breaker + statistik latency."""
+
+    def __init__(self, provider: EmbeddingProvider, priority: int, probe_seconds: float = EMBEDDING_SLOW_PROBE) -> None:
+        self.provider = provider
+        self.priority = priority
+        self.breaker = CircuitBreaker()
+        self.ewma_ms: float | None = None
+        self.calls = 0
+        self.errors = 0
+        slow = EMBEDDING_SLOW_MS or provider.timeout * 500
+        self.slow_ms = slow
+        self.probe_seconds = probe_seconds
+        self.probed_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def record(self, ms: float) -> None:
+        with self._lock:
+            self.calls += 1
+            was_slow, probe = self.slow, self.probing
+            if probe or self.ewma_ms is None:
+                self.ewma_ms = ms  # Probe: ukur ulang dari nol, bukan sisa EWMA periode lambat
+            else:
+                self.ewma_ms = (1 - _EWMA_ALPHA) * self.ewma_ms + _EWMA_ALPHA * ms
+            self.probing = False
+            if self.slow and (probe or not was_slow):
+                self.probed_at = time.monotonic()  # Jeda sampai probe berikutnya dihitung sejak call ini selesai
+
+    def failed(self) -> None:
+        with self._lock:
+            self.errors += 1
+            self.probing = False
+
+    @property
+    def slow(self) -> bool:
+        return self.ewma_ms is not None and self.ewma_ms > self.slow_ms
+
+    def demoted(self) -> bool:
+        """Lambat dan belum waktunya probe. Saat probe jatuh tempo, satu call dikirim ke slot ini lagi
+        (EWMA hanya terupdate oleh call yang jalan di slot ini, jadi tanpa probe slot lambat tidak pernah pulih)."""
+        if not self.slow:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self.probed_at < self.probe_seconds:
+                return True  # Termasuk probe yang sedang jalan (atau dilewati): diklaim ulang setelah jeda berikutnya
+            self.probed_at = now
+            self.probing = True
+            return False
+
+
+class FailoverEmbedder:
+    """Coba provider berurutan (prioritas, provider lambat di belakang) sampai ada yang berhasil."""
+
+    def __init__(self, providers: Sequence[EmbeddingProvider], slow_probe: float = EMBEDDING_SLOW_PROBE) -> None:
+        if not providers:
+            raise ValueError("Minimal satu provider embedding")
+        spaces = {p.space for p in providers}
+        if len(spaces) > 1:
+            names = ", ".join(f"{p.name}={p.space}" for p in providers)
+            raise ValueError(f"Provider embedding beda ruang vektor tidak bisa failover satu sama lain: {names}")
+        self.space = spaces.pop()
+        self._slots = [_Slot(p, i, slow_probe) for i, p in enumerate(providers)]
+
+    @property
+    def providers(self) -> List[EmbeddingProvider]:
+        return [s.provider for s in self._slots]
+
+    def _order(self) -> List[_Slot]:
+        return sorted(self._slots, key=lambda s: (s.demoted(), s.priority))
+
+    def _ok(self, slot: _Slot, vec: List[float], dim: int | None, start: float) -> List[float]:
+        check_dim(vec, dim, source=f"provider {slot.provider.name}")
+        slot.record((time.perf_counter() - start) * 1000)
+        slot.breaker.success()
+        return vec
+
+    def _fail(self, slot: _Slot, e: BaseException, errors: List[str], sp: Any) -> None:
+        slot.failed()
+        slot.breaker.failure()
+        error = "timeout" if _is_timeout(e) else type(e).__name__
+        inc("rag_embedding_failures_total", provider=slot.provider.name, error=error)
+        errors.append(f"{slot.provider.name}: {type(e).__name__}: {e}"[:200])
+        sp.set(failed=error)
+
+    def _raise(self, errors: List[str], dim_errors: int) -> None:
+        cls = EmbeddingDimError if errors and dim_errors == len(errors) else EmbeddingError
+        raise cls("Semua provider embedding gagal: " + ("; ".join(errors) or "semua circuit terbuka"))
+
+    def embed(self, text: str, dim: int | None = None) -> List[float]:
+        errors: List[str] = []
+        dim_errors = 0
+        for slot in self._order():
+            if not slot.breaker.allow():
+                continue
+            with span("embed", provider=slot.provider.name, chars=len(text)) as sp:
+                start = time.perf_counter()
+                try:
+                    return self._ok(slot, slot.provider.embed(text), dim, start)
+                except Exception as e:
+                    dim_errors += isinstance(e, EmbeddingDimError)
+                    self._fail(slot, e, errors, sp)
+        self._raise(errors, dim_errors)
+
+    async def aembed(self, text: str, dim: int | None = None) -> List[float]:
+        errors: List[str] = []
+        dim_errors = 0
+        for slot in self._order():
+            if not slot.breaker.allow():
+                continue
+            with span("embed", provider=slot.provider.name, chars=len(text)) as sp:
+                start = time.perf_counter()
+                try:
+                    return self._ok(slot, await slot.provider.aembed(text), dim, start)
+                except Exception as e:
+                    dim_errors += isinstance(e, EmbeddingDimError)
+                    self._fail(slot, e, errors, sp)
+        self._raise(errors, dim_errors)
+
+    def embed_batch(self, texts: Sequence[str], dim: int | None = None) -> List[List[float]]:
+        """Embedding banyak teks dalam satu call provider; failover / breaker sama dengan `embed`."""
+        if not texts:
+            return []
+        errors: List[str] = []
+        dim_errors = 0
+        for slot in self._order():
+            if not slot.breaker.allow():
+                continue
+            with span("embed", provider=slot.provider.name, chars=sum(len(t) for t in texts), batch=len(texts)) as sp:
+                start = time.perf_counter()
+                try:
+                    vecs = slot.provider.embed_batch(list(texts))
+                    if len(vecs) != len(texts):
+                        raise EmbeddingError(f"{len(vecs)} vektor untuk {len(texts)} teks")
+                    for vec in vecs:
+                        check_dim(vec, dim, source=f"provider {slot.provider.name}")
+                    slot.record((time.perf_counter() - start) * 1000 / len(texts))  # EWMA tetap per teks
+                    slot.breaker.success()
+                    return vecs
+                except Exception as e:
+                    dim_errors += isinstance(e, EmbeddingDimError)
+                    self._fail(slot, e, errors, sp)
+        self._raise(errors, dim_errors)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Ringkasan per provider (state breaker, latency EWMA, jumlah call / error)."""
+        return [
+            {
+                "provider": s.provider.name,
+                "state": s.breaker.state,
+                "ewma_ms": round(s.ewma_ms, 2) if s.ewma_ms is not None else None,
+                "slow": s.slow,
+                "calls": s.calls,
+                "errors": s.errors,
+            }
+            for s in sorted(self._slots, key=lambda s: (s.slow, s.priority))  # Tanpa mengklaim probe
+        ]
+
+
+def build_embedder(names: Sequence[str] = EMBEDDING_PROVIDERS) -> FailoverEmbedder:
+    """FailoverEmbedder dari daftar nama provider. Provider yang gagal diinisialisasi (mis. onnxruntime
+    tidak ter-install) dilewati dengan peringatan, selama masih ada provider lain."""
+    providers: List[EmbeddingProvider] = []
+    for name in names:
+        if name not in PROVIDERS:
+            raise ValueError(f"Provider embedding tidak dikenal: {name} (pilihan: {', '.join(PROVIDERS)})")
+        try:
+            providers.append(PROVIDERS[name]())
+        except Exception as e:
+            if len(names) == 1:
+                raise
+            log("embedding", f"provider {name} dilewati: {type(e).__name__}: {e}", "warning")
+    return FailoverEmbedder(providers)
+
+
+def model_key(names: Sequence[str] = EMBEDDING_PROVIDERS) -> str:
+    """Identitas ruang vektor (untuk cache vektor di chunk_store): ollama / onnx berbagi EMBEDDING_MODEL."""
+    if names and all(n == "hash" for n in names):
+        return f"hash-{EMBEDDING_HASH_DIM}"
+    return EMBEDDING_MODEL
+
+
+_default: FailoverEmbedder | None = None
+_default_lock = threading.Lock()
+
+
+def default_embedder() -> FailoverEmbedder:
+    """Embedder bersama dari env EMBEDDING_PROVIDERS, dibuat saat pertama dipakai."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = build_embedder()
+    return _default
+
+
+def embed(text: str, dim: int | None = None) -> List[float]:
+    return default_embedder().embed(text, dim)
+
+
+async def aembed(text: str, dim: int | None = None) -> List[float]:
+    return await default_embedder().aembed(text, dim)
+
+
+def embed_batch(texts: Sequence[str], dim: int | None = None) -> List[List[float]]:
+    return default_embedder().embed_batch(texts, dim)
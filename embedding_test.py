@@ -1,14 +1,11 @@
-import ollama as lama
+from embedding import build_embedder, EMBEDDING_PROVIDERS
 
-client = lama.Client(host='https://boats-billing-kinds-detected.trycloudflare.com') 
+# Cek tiap provider di EMBEDDING_PROVIDERS (mis. EMBEDDING_PROVIDERS=ollama,onnx python embedding_test.py)
+embedder = build_embedder(EMBEDDING_PROVIDERS)
 
 text = "Halo, apa kabar?"
 
-rspn = client.embeddings(
-    model="hf.co/rizkysulaeman/Embedding-Gemma-300m-Healthcare:F16",
-    prompt=text,
-)
-
-vec = rspn["embedding"]
+vec = embedder.embed(text)
 print(len(vec))
-print(rspn)             
\ No newline at end of file
+print(vec[:8])
+print(embedder.status())
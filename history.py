@@ -0,0 +1,114 @@
+"""
+Reducer state `messages` yang terbatas, pengganti `add_messages` bawaan MessagesState.
+
+Tanpa batas, setiap loop rewrite menambah ToolMessage hasil retrieval lengkap + HumanMessage baru, dan node
+agent decide mengirim ulang seluruh history ke model. `bounded_messages` menjaga supaya prompt tetap rata:
+- pesan pertama (pertanyaan asli user) selalu dipertahankan,
+- hasil retrieval terbaru (AIMessage tool_call terakhir + ToolMessage-nya) selalu utuh,
+- ToolMessage yang lebih lama diganti referensi ringkas (tool, query, id chunk / dokter / RS),
+  jadi model tetap tahu apa yang sudah dicari tanpa membaca ulang isinya,
+- sisanya jendela pesan terbaru sampai RAG_HISTORY_TOKENS token (estimasi); pasangan tool_call + ToolMessage
+  tidak pernah dipisah supaya history tetap valid untuk API model. RAG_HISTORY_TOKENS=0 = tanpa batas jendela.
+Token diestimasi dari jumlah karakter (~4 karakter per token), cukup untuk menjaga batas tanpa tokenizer.
+"""
+import json
+import os
+import re
+from typing import Any, Iterable, List, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, ToolMessage
+from langgraph.graph.message import add_messages
+
+
+RAG_HISTORY_TOKENS = int(os.getenv("RAG_HISTORY_TOKENS", "6000"))
+_CHARS_PER_TOKEN = 4
+_MESSAGE_OVERHEAD = 4  # Token role / pemisah per pesan
+_COMPACT_PREFIX = "[hasil tool sebelumnya diringkas]"
+_REF_IDS = re.compile(r"\[(chunk_id|doctor_id|hospital_id)=([^\s\]]+)")
+_MAX_REF_IDS = 10
+
+
+def _text(msg: Any) -> str:
+    content = msg.get("content", "") if isinstance(msg, dict) else getattr(msg, "content", "")
+    text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False, default=str)
+    for call in getattr(msg, "tool_calls", None) or []:
+        text += json.dumps(call.get("args", {}), ensure_ascii=False, default=str)
+    return text
+
+
+def estimate_tokens(messages: Iterable[Any]) -> int:
+    """Estimasi jumlah token prompt untuk list pesan (BaseMessage atau dict role/content)."""
+    return sum(len(_text(m)) // _CHARS_PER_TOKEN + _MESSAGE_OVERHEAD for m in messages)
+
+
+def _compact(msg: ToolMessage, query: str | None) -> ToolMessage:
+    content = str(msg.content)
+    if content.startswith(_COMPACT_PREFIX):
+        return msg
+    ids = [v for _, v in _REF_IDS.findall(content)]
+    ref = f"{_COMPACT_PREFIX} {msg.name or 'tool'}"
+    if query:
+        ref += f"(query={query!r})"
+    if ids:
+        more = f" (+{len(ids) - _MAX_REF_IDS} lagi)" if len(ids) > _MAX_REF_IDS else ""
+        ref += " -> " + ", ".join(ids[:_MAX_REF_IDS]) + more
+    else:
+        ref += " -> kosong" if not content.strip() else f" -> {len(content)} karakter"
+    return msg.model_copy(update={"content": ref})
+
+
+def _units(messages: Sequence[AnyMessage]) -> List[List[AnyMessage]]:
+    """Kelompokkan AIMessage ber-tool_call dengan ToolMessage jawabannya; pesan lain satu per unit."""
+    units: List[List[AnyMessage]] = []
+    open_calls: set = set()
+    for msg in messages:
+        if isinstance(msg, ToolMessage) and msg.tool_call_id in open_calls and units:
+            units[-1].append(msg)
+            continue
+        units.append([msg])
+        open_calls = {c["id"] for c in getattr(msg, "tool_calls", None) or []} if isinstance(msg, AIMessage) else set()
+    return units
+
+
+def trim_messages(messages: Sequence[AnyMessage], max_tokens: int = RAG_HISTORY_TOKENS) -> List[AnyMessage]:
+    """Terapkan aturan di docstring modul ke list pesan (tanpa mengubah list aslinya)."""
+    if len(messages) <= 1:
+        return list(messages)
+    first, rest = messages[0], list(messages[1:])
+
+    # Query per tool_call_id, untuk referensi ringkas
+    queries = {}
+    for msg in rest:
+        for call in getattr(msg, "tool_calls", None) or []:
+            args = call.get("args") or {}
+            queries[call["id"]] = args.get("query") or ", ".join(f"{k}={v}" for k, v in args.items() if v) or None
+
+    units = _units(rest)
+    latest = max((i for i, u in enumerate(units) if getattr(u[0], "tool_calls", None)), default=None)
+    for i, unit in enumerate(units):
+        if i == latest:
+            continue
+        unit[:] = [_compact(m, queries.get(m.tool_call_id)) if isinstance(m, ToolMessage) else m for m in unit]
+
+    # Jendela dari belakang; unit terakhir dan retrieval terbaru selalu masuk
+    keep = set()
+    budget = max_tokens - estimate_tokens([first]) if max_tokens > 0 else None
+    for forced in {len(units) - 1, latest} - {None}:
+        keep.add(forced)
+        if budget is not None:
+            budget -= estimate_tokens(units[forced])
+    for i in range(len(units) - 1, -1, -1):
+        if i in keep:
+            continue
+        cost = estimate_tokens(units[i])
+        if budget is not None:
+            if cost > budget:
+                break  # Jendela harus bersambung: berhenti di unit pertama yang tidak muat
+            budget -= cost
+        keep.add(i)
+    return [first] + [m for i, unit in enumerate(units) if i in keep for m in unit]
+
+
+def bounded_messages(left: Sequence[AnyMessage], right: Any) -> List[AnyMessage]:
+    """Reducer LangGraph: `add_messages` lalu `trim_messages`."""
+    return trim_messages(add_messages(left, right))
@@ -0,0 +1,108 @@
+"""
+Join dokter <-> rumah sakit yang di-resolve sekali saat load (collection.py), bukan saat query.
+
+Setiap entri `hospital_ids` dokter di doctors.json dicocokkan ke record hospitals_prod.json:
+1. `hospital_id` entri == `Id` RS,
+2. kalau tidak ada: nama RS (`hospital_name`) == `Hospital` / `Hospital_2` (case-insensitive),
+3. kalau tidak ada: `alias` yang unik (alias yang dipakai lebih dari satu RS tidak dipakai).
+
+Hasilnya:
+- dokumen dokter mendapat `hospital_ids`, `cities`, `provinces` (filter exact, mis.
+  `hospital_ids:=[...] && cities:=Yogyakarta`),
+- dokumen RS mendapat `doctor_count` dan `specializations` (spesialisasi dokter yang praktek di sana).
+"""
+from typing import Any, Dict, Iterable, List, Mapping, Set
+
+from json_stream import iter_json_array
+
+
+def _key(text: Any) -> str:
+    return " ".join(str(text or "").casefold().split())
+
+
+class HospitalJoin:
+    def __init__(self, hospitals: Iterable[Mapping[str, Any]]) -> None:
+        self.hospitals: Dict[str, Mapping[str, Any]] = {}
+        self._by_name: Dict[str, str] = {}
+        aliases: Dict[str, Set[str]] = {}
+        for h in hospitals:
+            hid = h.get("Id")
+            if not hid:
+                continue
+            hid = str(hid)
+            self.hospitals[hid] = h
+            for name in (h.get("Hospital"), h.get("Hospital_2")):
+                if name:
+                    self._by_name.setdefault(_key(name), hid)
+            if h.get("Alias"):
+                aliases.setdefault(_key(h["Alias"]), set()).add(hid)
+        self._by_alias = {a: next(iter(ids)) for a, ids in aliases.items() if len(ids) == 1}
+
+        self.doctor_count: Dict[str, int] = {}
+        self.specializations: Dict[str, Set[str]] = {}
+        self.resolved = 0
+        self.unresolved = 0
+
+    @classmethod
+    def from_files(cls, hospitals_path: str = "hospitals_prod.json", doctors_path: str | None = "doctors.json") -> "HospitalJoin":
+        """Index RS dari hospitals_prod.json, lalu (opsional) agregat dokter per RS dari satu pass doctors.json."""
+        join = cls(iter_json_array(hospitals_path))
+        if doctors_path:
+            for doc in iter_json_array(doctors_path, key="data"):
+                join.add_doctor(doc)
+        return join
+
+    def resolve_entry(self, entry: Mapping[str, Any]) -> str | None:
+        """Id RS untuk satu entri `hospital_ids` dokter, atau None kalau tidak ketemu."""
+        hid = entry.get("hospital_id")
+        if hid and str(hid) in self.hospitals:
+            return str(hid)
+        name = _key(entry.get("hospital_name"))
+        if name and name in self._by_name:
+            return self._by_name[name]
+        alias = _key(entry.get("alias"))
+        if alias and alias in self._by_alias:
+            return self._by_alias[alias]
+        return None
+
+    def resolve(self, doctor: Mapping[str, Any]) -> List[str]:
+        """Id RS (unik, urutan sesuai data dokter) tempat dokter praktek."""
+        out: List[str] = []
+        for entry in doctor.get("hospital_ids") or []:
+            hid = self.resolve_entry(entry)
+            if hid is not None and hid not in out:
+                out.append(hid)
+        return out
+
+    def add_doctor(self, doctor: Mapping[str, Any]) -> None:
+        """Masukkan satu dokter ke agregat per RS (dipanggil sekali per dokter)."""
+        entries = doctor.get("hospital_ids") or []
+        ids = self.resolve(doctor)
+        self.resolved += len(ids)
+        self.unresolved += sum(1 for e in entries if self.resolve_entry(e) is None)
+        spec = doctor.get("specialization_name")
+        for hid in ids:
+            self.doctor_count[hid] = self.doctor_count.get(hid, 0) + 1
+            if spec:
+                self.specializations.setdefault(hid, set()).add(spec)
+
+    def doctor_fields(self, doctor: Mapping[str, Any]) -> Dict[str, List[str]]:
+        """Field join untuk dokumen dokter."""
+        ids = self.resolve(doctor)
+        cities: List[str] = []
+        provinces: List[str] = []
+        for hid in ids:
+            h = self.hospitals[hid]
+            if h.get("City") and h["City"] not in cities:
+                cities.append(h["City"])
+            if h.get("Province") and h["Province"] not in provinces:
+                provinces.append(h["Province"])
+        return {"hospital_ids": ids, "cities": cities, "provinces": provinces}
+
+    def hospital_fields(self, hospital_id: Any) -> Dict[str, Any]:
+        """Field join untuk dokumen RS."""
+        hid = str(hospital_id)
+        return {
+            "doctor_count": self.doctor_count.get(hid, 0),
+            "specializations": sorted(self.specializations.get(hid, ())),
+        }
@@ -0,0 +1,106 @@
+"""
+Parser JSON inkremental (stdlib saja) untuk file besar seperti doctors.json dan hospitals_prod.json.
+
+iter_json_array(path, key="data") membaca file per blok dan meng-yield elemen array satu per satu:
+- kalau top-level file adalah array  -> elemen array tersebut (format hospitals_prod.json),
+- kalau top-level adalah object      -> elemen array di field `key` (format doctors.json: {"data": [...]}).
+Memori puncak sebanding dengan ukuran blok + satu record, bukan ukuran file.
+"""
+import json  # raw_decode untuk decode satu value dari buffer
+import re  # Skip whitespace
+from typing import Any, Iterator, TextIO
+
+
+_WS = re.compile(r"[ \t\n\r]*")
+_DELIMITERS = frozenset(" \t\n\r,:]}")  # Karakter yang sah setelah value di dalam array / object
+_DEFAULT_CHUNK = 1 << 16  # 64 KiB per baca
+
+
+class _Reader:
+    """Buffer teks di atas file dengan posisi baca; value JSON di-decode dengan raw_decode."""
+
+    def __init__(self, f: TextIO, chunk_size: int = _DEFAULT_CHUNK) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size: int) -> None:
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + data  # Buang bagian yang sudah dibaca
+        self.pos = 0
+
+    def peek(self) -> str:
+        """Karakter non-whitespace berikutnya ("" kalau EOF), tanpa memajukan posisi."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._fill(self.chunk_size)
+
+    def expect(self, ch: str) -> None:
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"JSON tidak valid: diharapkan {ch!r}, dapat {got!r}")
+        self.pos += 1
+
+    def decode(self) -> Any:
+        """Decode satu value JSON lengkap dari posisi sekarang."""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # Value harus diikuti delimiter; kalau tidak, bisa jadi terpotong di batas blok
+                # (mis. angka "23093." yang lanjutannya belum terbaca)
+                if self.eof or (end < len(self.buf) and self.buf[end] in _DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(size)
+            size *= 2  # Record besar: baca blok makin besar supaya tidak kuadratik
+
+
+def iter_json_array(path: str, key: str = "data", chunk_size: int = _DEFAULT_CHUNK) -> Iterator[Any]:
+    """Yield elemen array JSON dari file secara inkremental (lihat docstring modul)."""
+    with open(path, encoding="utf-8") as f:
+        yield from iter_json_array_file(f, key=key, chunk_size=chunk_size)
+
+
+def iter_json_array_file(f: TextIO, key: str = "data", chunk_size: int = _DEFAULT_CHUNK) -> Iterator[Any]:
+    reader = _Reader(f, chunk_size)
+    if reader.peek() == "{":
+        reader.pos += 1
+        # Cari field `key` di object top-level; field lain di-skip
+        while True:
+            ch = reader.peek()
+            if ch == "}" or ch == "":
+                return  # Field tidak ada
+            if ch == ",":
+                reader.pos += 1
+                continue
+            name = reader.decode()
+            reader.expect(":")
+            if name == key and reader.peek() == "[":
+                break
+            reader.decode()
+
+    reader.expect("[")
+    while True:
+        ch = reader.peek()
+        if ch == "]":
+            return
+        if ch == "":
+            raise ValueError("JSON tidak valid: array tidak ditutup")
+        if ch == ",":
+            reader.pos += 1
+            continue
+        yield reader.decode()
@@ -0,0 +1,178 @@
+"""
+Cache respons LLM yang persisten (SQLite) untuk model temperature=0 di custom_rag.py.
+
+Dipasang lewat parameter `cache=` LangChain di `response_model` dan `model_penilai`, jadi berlaku untuk
+`invoke` / `ainvoke` grade_documents, rewrite_question, dan generate_answer. Agent decide tidak di-cache
+(ModelRouter.get memberi copy model tanpa cache): tool_call hasil replay membawa id dan keputusan lama.
+- Key = sha256(llm_string + prompt). `llm_string` dari LangChain berisi nama model + parameter
+  (temperature, dll.) + kwargs yang di-bind, termasuk schema structured output (`format` / tools)
+  dari `with_structured_output`, jadi schema berubah = key berubah. `prompt` = pesan yang sudah di-render penuh.
+- Eviction berdasarkan ukuran: kalau total isi melebihi RAG_LLM_CACHE_MAX_MB, entri yang paling lama
+  tidak dipakai dihapus sampai tersisa ~90%.
+- Cache hit tidak memanggil model sama sekali. `astream` LangChain tidak lewat cache, jadi
+  agenerate_answer memakai `alookup_message` / `aupdate_message` dengan key yang sama.
+
+File SQLite baru dibuka saat lookup / update pertama, jadi import custom_rag (atau stubs.py) tidak membuat file.
+
+Env: RAG_LLM_CACHE (path file SQLite, default .llm_cache.sqlite; "0" = mati), RAG_LLM_CACHE_MAX_MB (default 256).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import BaseMessage, convert_to_messages
+from langchain_core.outputs import ChatGeneration
+
+from tracing import inc
+
+
+RAG_LLM_CACHE = os.getenv("RAG_LLM_CACHE", ".llm_cache.sqlite")
+RAG_LLM_CACHE_MAX_MB = float(os.getenv("RAG_LLM_CACHE_MAX_MB", "256"))
+_EVICT_TO = 0.9  # Sisakan 90% dari batas setelah eviction
+
+
+def _key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+    """BaseCache LangChain di atas satu file SQLite, dengan eviction LRU berdasarkan ukuran."""
+
+    def __init__(self, path: str = RAG_LLM_CACHE, max_bytes: int = int(RAG_LLM_CACHE_MAX_MB * 1024 * 1024)) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._size = 0
+
+    def _db(self) -> sqlite3.Connection:
+        """Koneksi SQLite, dibuka saat pertama dipakai (dipanggil dengan _lock)."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")  # Beberapa proses (serve + benchmark) boleh berbagi file
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache(last_used)")
+            self._conn = conn
+            self._size = self._total_size()
+        return self._conn
+
+    def _total_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = _key(prompt, llm_string)
+        with self._lock:
+            row = self._db().execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                inc("rag_llm_cache_total", result="miss")
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        inc("rag_llm_cache_total", result="hit")
+        return [loads(v) for v in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        value = json.dumps([dumps(g) for g in return_val])
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return  # Lebih besar dari seluruh cache: tidak disimpan
+        now = time.time()
+        key = _key(prompt, llm_string)
+        with self._lock:
+            old = self._db().execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._size = self._total_size()  # Proses lain mungkin ikut menulis
+        target = int(self.max_bytes * _EVICT_TO)
+        evicted = 0
+        while self._size > target:
+            rows = self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used LIMIT 256").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._size -= size
+                evicted += 1
+                if self._size <= target:
+                    break
+        inc("rag_llm_cache_evictions_total", evicted)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM llm_cache")
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def _model_cache(model: Any) -> Optional[BaseCache]:
+    cache = getattr(model, "cache", None)
+    return cache if isinstance(cache, BaseCache) else None
+
+
+def _prompt_key(model: Any, messages: Sequence[Any]) -> tuple[str, str]:
+    # Sama dengan key yang dipakai BaseChatModel._generate_with_cache, jadi invoke dan astream berbagi entri
+    return dumps(convert_to_messages(messages)), model._get_llm_string()
+
+
+async def alookup_message(model: Any, messages: Sequence[Any]) -> Optional[BaseMessage]:
+    """Pesan dari cache untuk `messages` di `model` (None kalau model tanpa cache atau miss)."""
+    cache = _model_cache(model)
+    if cache is None:
+        return None
+    hit = await cache.alookup(*_prompt_key(model, messages))
+    return hit[0].message if hit else None
+
+
+async def aupdate_message(model: Any, messages: Sequence[Any], message: BaseMessage) -> None:
+    cache = _model_cache(model)
+    if cache is not None:
+        await cache.aupdate(*_prompt_key(model, messages), [ChatGeneration(message=message)])
+
+
+_cache: SQLiteLLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SQLiteLLMCache | None:
+    """Cache bersama dari env (None kalau RAG_LLM_CACHE=0). Murah: file baru dibuka saat dipakai."""
+    global _cache
+    if RAG_LLM_CACHE in ("", "0"):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SQLiteLLMCache()
+    return _cache
@@ -0,0 +1,208 @@
+"""
+Load test end-to-end graph agent tanpa OLLAMA / Typesense (offline, aman untuk CI).
+
+`response_model`, `model_penilai`, retriever, dan pencarian terstruktur diganti stub dari stubs.py:
+- model agent memanggil tool sesuai LOADTEST_TOOL_SCRIPT (default selalu retrieve_chunks),
+- model penilai menjawab "no" dengan peluang LOADTEST_NO_RATE (RNG ber-seed, jadi distribusinya
+  stabil antar run) sehingga loop rewrite / retrieval alternatif ikut teruji,
+- setiap call LLM / retriever diberi latency buatan (plus jitter opsional).
+Graph hasil `build_graph(use_async=True)` lalu dijalankan LOADTEST_REQUESTS kali dengan maksimal
+LOADTEST_CONCURRENCY request bersamaan. Pertanyaan diambil bergiliran dari LOADTEST_QUESTIONS.
+
+Laporan (JSON, stdout + LOADTEST_OUTPUT):
+- throughput (request/detik) dan latency end-to-end p50 / p95 / p99,
+- per node (span `node.*` dari tracing.py): jumlah, durasi p50 / p95, waktu tunggu stub, dan
+  overhead graph = durasi node - waktu tunggu stub (`stub.wait`) di dalamnya,
+- distribusi loop rewrite dari custom_rag.loop_depth_stats(),
+- token prompt per node per putaran dari custom_rag.prompt_token_stats() (harus rata antar putaran).
+Exit 1 kalau ada request yang gagal.
+
+Contoh: python loadtest.py
+        LOADTEST_REQUESTS=1000 LOADTEST_CONCURRENCY=64 LOADTEST_NO_RATE=0.5 python loadtest.py
+        LOADTEST_TOOL_SCRIPT='[{"name": "search_doctors_hospitals", "args": {"specialization": "{question}"}}, {}]' python loadtest.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from langchain_core.messages import HumanMessage
+
+import custom_rag
+import tracing
+from bench_retrieval import percentile
+from stubs import StubChatModel, StubRetriever, StubStructuredSearch, install_stubs
+
+
+LOADTEST_REQUESTS = int(os.getenv("LOADTEST_REQUESTS", "200"))
+LOADTEST_CONCURRENCY = int(os.getenv("LOADTEST_CONCURRENCY", "16"))
+LOADTEST_WARMUP = int(os.getenv("LOADTEST_WARMUP", "5"))  # Request awal yang tidak ikut dihitung
+LOADTEST_LLM_LATENCY = float(os.getenv("LOADTEST_LLM_LATENCY", "0.05"))
+LOADTEST_LLM_JITTER = float(os.getenv("LOADTEST_LLM_JITTER", "0.0"))
+LOADTEST_RETRIEVER_LATENCY = float(os.getenv("LOADTEST_RETRIEVER_LATENCY", "0.01"))
+LOADTEST_NO_RATE = float(os.getenv("LOADTEST_NO_RATE", "0.3"))
+LOADTEST_TOOL_SCRIPT = json.loads(os.getenv("LOADTEST_TOOL_SCRIPT", "[]"))
+LOADTEST_SEED = int(os.getenv("LOADTEST_SEED", "0"))
+LOADTEST_QUESTIONS = os.getenv("LOADTEST_QUESTIONS", "retrieval_queries.v1.jsonl")  # JSONL dengan field "query"
+LOADTEST_OUTPUT = os.getenv("LOADTEST_OUTPUT", "loadtest.json")
+_MAX_ERRORS = 10
+
+
+def load_questions(path: str = LOADTEST_QUESTIONS) -> List[str]:
+    questions: List[str] = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    questions.append(json.loads(line)["query"])
+    return questions or ["Di mana lokasi Siloam Hospitals?", "dokter psikolog di yogyakarta"]
+
+
+def build_graph():
+    """Graph async dengan stub yang dikonfigurasi dari environment."""
+    model = StubChatModel(latency=LOADTEST_LLM_LATENCY, latency_jitter=LOADTEST_LLM_JITTER,
+                          tool_script=LOADTEST_TOOL_SCRIPT, seed=LOADTEST_SEED)
+    grader = StubChatModel(latency=LOADTEST_LLM_LATENCY, latency_jitter=LOADTEST_LLM_JITTER,
+                           grade_no_rate=LOADTEST_NO_RATE, seed=LOADTEST_SEED + 1)
+    return install_stubs(
+        model=model,
+        grader=grader,
+        retriever=StubRetriever(latency=LOADTEST_RETRIEVER_LATENCY),
+        structured=StubStructuredSearch(latency=LOADTEST_RETRIEVER_LATENCY),
+        use_async=True,
+    )
+
+
+class _SpanCollector:
+    """Kumpulkan span yang selesai (listener tracing) untuk dihitung setelah run."""
+
+    def __init__(self) -> None:
+        self.spans: List[tuple] = []
+
+    def __call__(self, sp: tracing.Span) -> None:
+        self.spans.append((sp.span_id, sp.parent_id, sp.name, sp.duration))  # list.append atomic
+
+    def node_stats(self) -> Dict[str, Dict[str, Any]]:
+        parents = {sid: (pid, name) for sid, pid, name, _ in self.spans}
+        waited: Dict[str, float] = defaultdict(float)
+        for sid, pid, name, duration in self.spans:
+            if name != "stub.wait":
+                continue
+            while pid is not None and pid in parents:  # Naik ke node terdekat
+                if parents[pid][1].startswith("node."):
+                    waited[pid] += duration
+                    break
+                pid = parents[pid][0]
+
+        per_node: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: {"duration": [], "wait": [], "overhead": []})
+        for sid, _, name, duration in self.spans:
+            if not name.startswith("node."):
+                continue
+            wait = waited.get(sid, 0.0)
+            per_node[name[5:]]["duration"].append(duration * 1000)
+            per_node[name[5:]]["wait"].append(wait * 1000)
+            per_node[name[5:]]["overhead"].append(max(0.0, duration - wait) * 1000)
+
+        out = {}
+        for node, series in sorted(per_node.items()):
+            n = len(series["duration"])
+            out[node] = {
+                "count": n,
+                "duration_p50_ms": round(percentile(series["duration"], 50), 3),
+                "duration_p95_ms": round(percentile(series["duration"], 95), 3),
+                "stub_wait_mean_ms": round(sum(series["wait"]) / n, 3),
+                "overhead_mean_ms": round(sum(series["overhead"]) / n, 3),
+                "overhead_p50_ms": round(percentile(series["overhead"], 50), 3),
+                "overhead_p95_ms": round(percentile(series["overhead"], 95), 3),
+            }
+        return out
+
+
+def _reset() -> None:
+    tracing.reset_metrics()
+    with custom_rag._loop_depth_lock:
+        custom_rag.LOOP_DEPTH.clear()
+    with custom_rag._prompt_tokens_lock:
+        custom_rag.PROMPT_TOKENS.clear()
+
+
+async def run(
+    graph: Any,
+    questions: List[str],
+    requests: int = LOADTEST_REQUESTS,
+    concurrency: int = LOADTEST_CONCURRENCY,
+    warmup: int = LOADTEST_WARMUP,
+) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def one(i: int) -> None:
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await graph.ainvoke({"messages": [HumanMessage(questions[i % len(questions)])], "retry_count": 0})
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}"[:200])
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(warmup)))
+    latencies.clear()
+    errors.clear()
+    _reset()
+
+    collector = _SpanCollector()
+    tracing.add_listener(collector)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        tracing.remove_listener(collector)
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "fail": len(errors),
+        "errors": errors[:_MAX_ERRORS],
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+        },
+        "nodes": collector.node_stats(),
+        "loop_depth": custom_rag.loop_depth_stats(),
+        "prompt_tokens": custom_rag.prompt_token_stats(),
+        "stubs": {
+            "llm_latency_s": LOADTEST_LLM_LATENCY,
+            "llm_jitter_s": LOADTEST_LLM_JITTER,
+            "retriever_latency_s": LOADTEST_RETRIEVER_LATENCY,
+            "grade_no_rate": LOADTEST_NO_RATE,
+            "seed": LOADTEST_SEED,
+        },
+    }
+
+
+def main() -> None:
+    if not tracing.TRACING_ENABLED:
+        sys.exit("loadtest.py butuh tracing aktif (RAG_TRACING tidak boleh 0)")
+    report = asyncio.run(run(build_graph(), load_questions()))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if LOADTEST_OUTPUT:
+        with open(LOADTEST_OUTPUT, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if report["fail"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
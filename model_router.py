@@ -0,0 +1,110 @@
+"""
+Router model per node graph (decide, grade, rewrite, generate), dikonfigurasi lewat env.
+
+Default semua node memakai model utama custom_rag (`response_model`, dan `model_penilai` untuk grade).
+Node yang perlu model lain (mis. model kecil yang cepat untuk grading yes/no dan rewrite pendek) di-set lewat:
+    RAG_MODEL_DECIDE, RAG_MODEL_GRADE, RAG_MODEL_REWRITE, RAG_MODEL_GENERATE   nama model (kosong = default)
+    RAG_MODEL_PROVIDER                                                         provider init_chat_model (default ollama)
+    RAG_MODEL_FALLBACK=0                                                       matikan fallback structured output
+Model dengan nama sama dipakai bersama, dan semuanya ikut cache respons (llm_cache.py) dan RAG_KEEP_ALIVE (ollama),
+kecuali node di UNCACHED_NODES (decide): `get` memberi copy model tanpa cache, karena tool_call yang di-replay
+dari cache membawa id tool_call dan keputusan lama.
+
+Fallback: kalau structured output model yang di-route gagal (error parsing / validasi schema, atau nilai
+di luar yang diizinkan `validate`), chain yang sama dijalankan ulang dengan model default. Jumlah fallback
+dicatat di counter `rag_model_fallback_total{node=...}`.
+"""
+import os
+from typing import Any, Callable, Dict, Mapping, Tuple
+
+from langchain.chat_models import init_chat_model
+from langchain_core.caches import BaseCache
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableLambda
+
+import llm_cache
+import tracing
+from embedding import RAG_KEEP_ALIVE
+
+
+NODES = ("decide", "grade", "rewrite", "generate")
+RAG_MODEL_PROVIDER = os.getenv("RAG_MODEL_PROVIDER", "ollama")
+RAG_MODEL_FALLBACK = os.getenv("RAG_MODEL_FALLBACK", "1") != "0"
+UNCACHED_NODES = frozenset({"decide"})  # Output tool-calling, tidak boleh di-replay dari cache
+
+
+class ModelRouter:
+    """Peta node -> chat model (hanya node yang di-override; sisanya pakai default dari custom_rag)."""
+
+    def __init__(self, models: Mapping[str, BaseChatModel] | None = None, fallback: bool = RAG_MODEL_FALLBACK) -> None:
+        unknown = set(models or {}) - set(NODES)
+        if unknown:
+            raise ValueError(f"Node tidak dikenal untuk router model: {', '.join(sorted(unknown))}")
+        self.models: Dict[str, BaseChatModel] = dict(models or {})
+        self.fallback = fallback
+        self._uncached: Dict[int, Tuple[BaseChatModel, BaseChatModel]] = {}  # id model -> (model, copy tanpa cache)
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        built: Dict[str, BaseChatModel] = {}
+        models: Dict[str, BaseChatModel] = {}
+        for node in NODES:
+            name = os.getenv(f"RAG_MODEL_{node.upper()}", "").strip()
+            if not name:
+                continue
+            if name not in built:
+                extra = {"keep_alive": RAG_KEEP_ALIVE} if RAG_MODEL_PROVIDER == "ollama" else {}
+                built[name] = init_chat_model(name, temperature=0, model_provider=RAG_MODEL_PROVIDER,
+                                              cache=llm_cache.get_cache(), **extra)
+            models[node] = built[name]
+        return cls(models)
+
+    def get(self, node: str, default: BaseChatModel) -> BaseChatModel:
+        model = self.models.get(node, default)
+        if node in UNCACHED_NODES and isinstance(getattr(model, "cache", None), BaseCache):
+            return self._without_cache(model)
+        return model
+
+    def _without_cache(self, model: BaseChatModel) -> BaseChatModel:
+        entry = self._uncached.get(id(model))
+        if entry is None or entry[0] is not model:
+            entry = self._uncached[id(model)] = (model, model.model_copy(update={"cache": False}))
+        return entry[1]
+
+    def routes(self) -> Dict[str, str]:
+        """Nama model per node yang di-override (untuk log / benchmark)."""
+        return {node: _model_name(m) for node, m in self.models.items()}
+
+    def structured(
+        self,
+        node: str,
+        default: BaseChatModel,
+        prompt: Any,
+        schema: Any,
+        validate: Callable[[Any], bool] | None = None,
+    ) -> Runnable:
+        """`prompt | model.with_structured_output(schema)` untuk node, dengan fallback ke model default."""
+        base = prompt | default.with_structured_output(schema)
+        model = self.models.get(node)
+        if model is None or model is default:
+            return base
+
+        def _check(result: Any) -> Any:
+            if result is None or (validate is not None and not validate(result)):
+                raise ValueError(f"Structured output {node} dari {_model_name(model)} tidak valid: {result!r}")
+            return result
+
+        routed = prompt | model.with_structured_output(schema) | RunnableLambda(_check)
+        if not self.fallback:
+            return routed
+
+        def _count(value: Any) -> Any:
+            tracing.inc("rag_model_fallback_total", node=node)
+            tracing.annotate(fallback=True)
+            return value
+
+        return routed.with_fallbacks([RunnableLambda(_count) | base])
+
+
+def _model_name(model: Any) -> str:
+    return getattr(model, "model", None) or getattr(model, "model_name", None) or type(model).__name__
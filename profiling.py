@@ -0,0 +1,251 @@
+"""
+Profil otomatis (stack sampling) untuk request graph yang lambat. Opt-in lewat env RAG_PROFILE=1.
+
+Span tracing.py menunjukkan node mana yang lambat, tapi tidak menunjukkan di mana waktu Python-nya habis
+(decode simplify_hits, format prompt, konversi pesan LangChain, I/O yang memblokir). `profile_request()`
+membungkus satu eksekusi graph; selama ada request yang dibungkus, satu thread sampler mengambil stack
+setiap RAG_PROFILE_INTERVAL_MS milidetik (sys._current_frames):
+- thread event loop: sampel masuk ke request pemilik task asyncio yang sedang jalan (contextvars task,
+  Python 3.12+), prefix frame `[span:<span aktif>]`; di Python lama task tidak bisa dipetakan, jadi sampel
+  masuk ke semua request di loop itu dengan prefix `[loop]`. Loop yang idle (menunggu I/O async) tidak dihitung,
+- thread worker ThreadPoolExecutor yang sedang mengerjakan sesuatu (embedding, Typesense, node sync LangGraph):
+  tidak bisa dipetakan ke request, jadi masuk ke semua request yang sedang aktif dengan prefix
+  `[thread:<nama>]` (jumlahnya dicatat sebagai shared_samples; tepat kalau hanya satu request berjalan),
+- thread pemanggil request sync (graph.invoke) masuk ke request itu.
+Stack disimpan sebagai Counter tuple code object (nama frame baru dibentuk saat ditulis), jadi biaya per sampel
+kecil; sampler berhenti sendiri kalau tidak ada request aktif.
+
+Setelah request selesai, profil ditulis kalau durasinya >= RAG_PROFILE_THRESHOLD_MS atau request terpilih
+sampel acak (RAG_PROFILE_SAMPLE_RATE, 0..1); selain itu sampelnya dibuang. Per profil di RAG_PROFILE_DIR:
+- <waktu>-<question id>.collapsed  format "frame;frame;... jumlah" (flamegraph.pl, speedscope, inferno),
+- <waktu>-<question id>.json       question id, pertanyaan, durasi, alasan, jumlah sampel, dan timing per node / tool.
+RAG_PROFILE=0 (default): profile_request tidak melakukan apa-apa.
+
+Contoh: RAG_PROFILE=1 RAG_PROFILE_THRESHOLD_MS=8000 uvicorn serve:app
+        flamegraph.pl profiles/20260101-120000-q1.collapsed > q1.svg
+"""
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+import tracing
+
+
+RAG_PROFILE = os.getenv("RAG_PROFILE", "0") == "1"
+RAG_PROFILE_THRESHOLD_MS = float(os.getenv("RAG_PROFILE_THRESHOLD_MS", "10000"))
+RAG_PROFILE_SAMPLE_RATE = float(os.getenv("RAG_PROFILE_SAMPLE_RATE", "0"))
+RAG_PROFILE_INTERVAL_MS = float(os.getenv("RAG_PROFILE_INTERVAL_MS", "10"))
+RAG_PROFILE_DIR = os.getenv("RAG_PROFILE_DIR", "profiles")
+_MAX_DEPTH = 128
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.-]+")
+_POOL_WORKER = os.path.join("concurrent", "futures", "thread.py")
+_TASK_CONTEXT = hasattr(asyncio.Task, "get_context")  # Python 3.12+
+
+_active: contextvars.ContextVar["_Request | None"] = contextvars.ContextVar("rag_profile", default=None)
+_lock = threading.Lock()
+_requests: List["_Request"] = []
+_by_trace: Dict[str, "_Request"] = {}
+_loop_threads: Dict[int, List[Any]] = {}  # ident thread event loop -> [loop, jumlah request aktif]
+_sync_threads: Dict[int, "_Request"] = {}
+_shared: List[Tuple[Any, ...]] = []  # Sampel yang tidak bisa dipetakan, urut waktu; dibagi saat request selesai
+_shared_base = 0  # Index global elemen pertama _shared
+_sampler: threading.Thread | None = None
+_names: Dict[Any, str] = {}  # code object -> nama frame (cache)
+
+
+class _Request:
+    __slots__ = ("qid", "question", "thread", "loop", "trace_id", "start", "samples", "shared_from", "nodes", "active")
+
+    def __init__(self, qid: str, question: str | None) -> None:
+        self.qid = qid
+        self.question = question
+        self.thread = threading.get_ident()
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None  # Request sync (graph.invoke)
+        sp = tracing.current_span()
+        self.trace_id = sp.trace_id if sp is not None else None
+        self.start = time.perf_counter()
+        self.samples: Counter = Counter()
+        self.shared_from = 0
+        self.active = True
+        self.nodes: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])  # span -> [jumlah, total detik]
+
+
+def _stack(frame: Any) -> Tuple[Any, ...]:
+    codes = []
+    while frame is not None and len(codes) < _MAX_DEPTH:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return tuple(reversed(codes))
+
+
+def _busy_worker(stack: Tuple[Any, ...]) -> bool:
+    """Thread ThreadPoolExecutor yang sedang menjalankan work item (bukan menunggu queue)."""
+    for i, code in enumerate(stack):
+        if code.co_name == "_worker" and code.co_filename.endswith(_POOL_WORKER):
+            return i + 1 < len(stack) and stack[i + 1].co_name == "run"
+    return False
+
+
+def _task_owner(loop: Any) -> Tuple[bool, "_Request | None", str | None]:
+    """(loop sedang menjalankan task, request pemilik task, nama span aktif task)."""
+    task = getattr(asyncio.tasks, "_current_tasks", {}).get(loop)
+    if task is None:
+        return False, None, None  # Loop idle: menunggu I/O async
+    if not _TASK_CONTEXT:
+        return True, None, None
+    ctx = task.get_context()
+    sp = ctx.get(tracing._current, None)
+    return True, ctx.get(_active, None), sp.name if sp is not None else None
+
+
+def _sample_once(me: int) -> None:
+    """Satu putaran sampling; dipanggil dengan _lock dipegang. Biaya sebanding jumlah thread, bukan jumlah request."""
+    names: Dict[int, str] | None = None
+    for ident, frame in sys._current_frames().items():
+        if ident == me:
+            continue
+        if ident in _loop_threads:
+            busy, owner, span_name = _task_owner(_loop_threads[ident][0])
+            if owner is not None and owner.active:
+                owner.samples[(f"[span:{span_name or '-'}]",) + _stack(frame)] += 1
+            elif busy and not _TASK_CONTEXT:
+                _shared.append(("[loop]",) + _stack(frame))
+            continue
+        if ident in _sync_threads:
+            _sync_threads[ident].samples[_stack(frame)] += 1
+            continue
+        stack = _stack(frame)
+        if _busy_worker(stack):
+            if names is None:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            _shared.append((f"[thread:{names.get(ident, ident)}]",) + stack)
+
+
+def _sample_loop() -> None:
+    global _sampler
+    me = threading.get_ident()
+    interval = RAG_PROFILE_INTERVAL_MS / 1000
+    while True:
+        with _lock:
+            if not _requests:
+                _sampler = None
+                return
+            _sample_once(me)
+        time.sleep(interval)
+
+
+def _on_span(sp: tracing.Span) -> None:
+    r = _by_trace.get(sp.trace_id)
+    if r is not None and (sp.name.startswith("node.") or sp.name.startswith("tool.")):
+        stat = r.nodes[sp.name]
+        stat[0] += 1
+        stat[1] += sp.duration
+
+
+def _frame_name(code: Any) -> str:
+    if isinstance(code, str):
+        return code
+    name = _names.get(code)
+    if name is None:
+        name = _names[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name
+
+
+def _write(r: _Request, shared: List[Tuple[Any, ...]], elapsed: float, reason: str) -> str:
+    os.makedirs(RAG_PROFILE_DIR, exist_ok=True)
+    base = os.path.join(RAG_PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{_SAFE_ID.sub('_', r.qid)[:64]}")
+    with open(base + ".collapsed", "w", encoding="utf-8") as f:
+        for stack, count in (r.samples + Counter(shared)).most_common():
+            f.write(";".join(_frame_name(c).replace(";", ",") for c in stack) + f" {count}\n")
+    meta = {
+        "question_id": r.qid,
+        "question": r.question,
+        "reason": reason,
+        "duration_ms": round(elapsed * 1000, 1),
+        "threshold_ms": RAG_PROFILE_THRESHOLD_MS,
+        "interval_ms": RAG_PROFILE_INTERVAL_MS,
+        "samples": sum(r.samples.values()) + len(shared),
+        "shared_samples": len(shared),
+        "trace_id": r.trace_id,
+        "nodes": {
+            name: {"count": count, "total_ms": round(total * 1000, 1)}
+            for name, (count, total) in sorted(r.nodes.items(), key=lambda kv: -kv[1][1])
+        },
+    }
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    return base + ".collapsed"
+
+
+def _finish(r: _Request, keep: bool) -> List[Tuple[Any, ...]]:
+    """Lepas request dari sampler (dengan _lock). Return sampel bersama selama request berjalan kalau `keep`."""
+    global _shared_base
+    r.active = False
+    _requests.remove(r)
+    _by_trace.pop(r.trace_id, None)
+    if r.loop is not None:
+        ref = _loop_threads[r.thread]
+        ref[1] -= 1
+        if not ref[1]:
+            del _loop_threads[r.thread]
+    elif _sync_threads.get(r.thread) is r:
+        del _sync_threads[r.thread]
+    shared = _shared[r.shared_from - _shared_base:] if keep else []
+    # Buang sampel bersama yang sudah tidak dibutuhkan request aktif mana pun
+    oldest = min((x.shared_from for x in _requests), default=_shared_base + len(_shared))
+    del _shared[:oldest - _shared_base]
+    _shared_base = oldest
+    return shared
+
+
+@contextmanager
+def profile_request(question_id: str | None = None, question: str | None = None) -> Iterator[None]:
+    """Profil satu eksekusi graph (sync maupun async). Panggil di dalam span "graph" supaya timing node ikut."""
+    global _sampler
+    if not RAG_PROFILE:
+        yield
+        return
+    r = _Request(question_id or uuid.uuid4().hex[:12], question)
+    sampled = random.random() < RAG_PROFILE_SAMPLE_RATE
+    token = _active.set(r)
+    with _lock:
+        _requests.append(r)
+        r.shared_from = _shared_base + len(_shared)
+        if r.trace_id:
+            _by_trace[r.trace_id] = r
+        if r.loop is not None:
+            _loop_threads.setdefault(r.thread, [r.loop, 0])[1] += 1
+        else:
+            _sync_threads[r.thread] = r
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="rag-profiler", daemon=True)
+            _sampler.start()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - r.start
+        _active.reset(token)
+        reason = "slow" if elapsed * 1000 >= RAG_PROFILE_THRESHOLD_MS else "sampled" if sampled else None
+        with _lock:
+            shared = _finish(r, keep=reason is not None)
+        if reason and (r.samples or shared):
+            path = _write(r, shared, elapsed, reason)
+            tracing.inc("rag_profiles_total", reason=reason)
+            tracing.log("profile", f"{r.qid} {elapsed * 1000:.0f} ms ({reason}) -> {path}")
+
+
+if RAG_PROFILE:
+    tracing.add_listener(_on_span)
@@ -2,65 +2,51 @@ import json  # Untuk serialisasi/deserialisasi data
 import os  # Untuk akses environment variable
 from typing import Iterable, Mapping, Any, List  # Tipe data untuk type hinting
 
-import ollama as lama  # Library untuk koneksi ke OLLAMA (embeddings)
-import typesense  # Library untuk koneksi ke Typesense (vector DB)
+import embedding  # Provider embedding (OLLAMA / ONNX lokal / hash) dengan failover
+from chunk_store import ChunkStore, embed_store  # Artifact kolumnar chunk + vektor (tanpa re-embed)
+from typesense_cluster import get_client  # Client Typesense bersama (multi-node)
 
 
 
-# Inisialisasi client Typesense, ambil konfigurasi dari environment variable
-TYPESENSE_CLIENT = typesense.Client(
-    {
-        "nodes": [
-            {
-                "host": os.getenv("TYPESENSE_HOST", "localhost"),  # Default ke localhost
-                "port": os.getenv("TYPESENSE_PORT", "8108"),  # Port default Typesense
-                "protocol": os.getenv("TYPESENSE_PROTOCOL", "http"),
-            }
-        ],
-        "api_key": os.getenv("TYPESENSE_API_KEY"),  # Wajib diisi
-        "connection_timeout_seconds": 10,  # Timeout koneksi
-    }
-)
+# Client Typesense bersama (node dari env TYPESENSE_NODES / TYPESENSE_HOST, lihat typesense_cluster.py)
+TYPESENSE_CLIENT = get_client()
 
 
 
-# Inisialisasi client OLLAMA, default ke endpoint cloudflare jika tidak ada env
-OLLAMA_CLIENT = lama.Client(
-    host=os.getenv(
-        "OLLAMA_HOST",
-        "https://boats-billing-kinds-detected.trycloudflare.com",
-    )
-)
+# Nama model embedding (env EMBEDDING_MODEL) dan key ruang vektor untuk cache di chunk_store
+EMBEDDING_MODEL = embedding.EMBEDDING_MODEL
+EMBEDDING_KEY = embedding.model_key()
 
 
 
-# Nama model embedding, bisa diatur via env
-EMBEDDING_MODEL = os.getenv(
-    "EMBEDDING_MODEL",
-    "hf.co/rizkysulaeman/Embedding-Gemma-300m-Healthcare:F16",
-)
+# Fungsi untuk generate embedding dari text lewat provider embedding.py (env EMBEDDING_PROVIDERS)
+def _embed(text: str, dim: int | None = None) -> List[float]:
+    return embedding.embed(text, dim)
 
 
 
-# Fungsi untuk generate embedding dari text pakai OLLAMA
-def _embed(text: str) -> List[float]:
-    rspn = OLLAMA_CLIENT.embeddings(
-        model=EMBEDDING_MODEL,
-        prompt=text,
-    )
-    return rspn["embedding"]  # Ambil vektor embedding saja
+def _collection_dim(name: str) -> int | None:
+    schema = TYPESENSE_CLIENT.collections[name].retrieve()
+    for field in schema.get("fields", []):
+        if field.get("name") == "vector":
+            return field.get("num_dim")
+    return None
 
 
 
 # Pastikan collection Typesense sudah ada, kalau belum buat baru
-def ensure_chunks_collection(name: str = "chunks") -> str:
+def ensure_chunks_collection(name: str = "chunks", num_dim: int | None = None) -> str:
     collections = [c["name"] for c in TYPESENSE_CLIENT.collections.retrieve()]
     if name in collections:
-        return name  # Sudah ada, langsung pakai
+        # Sudah ada, langsung pakai; tapi vektor baru harus sama dimensinya dengan schema lama
+        if num_dim:
+            embedding.check_dim(range(num_dim), _collection_dim(name), source=f"store ({num_dim} dim)")
+        return name
 
-    # Cari dimensi embedding secara dinamis dari sample
-    sample_vec = _embed("sample")
-    num_dim = len(sample_vec)
+    # Cari dimensi embedding secara dinamis dari sample (kalau belum diketahui dari store)
+    if not num_dim:
+        sample_vec = _embed("sample")
+        num_dim = len(sample_vec)
 
     # Definisi schema collection Typesense
     schema = {
@@ -111,11 +97,12 @@ def index_chunks(
     batch_size: int = 128,
 ) -> None:
     col = ensure_chunks_collection(collection_name)  # Pastikan collection siap
+    dim = _collection_dim(col)  # Guard dimensi: vektor harus sesuai num_dim collection
 
     docs: List[Mapping[str, Any]] = []
     for i, raw in enumerate(chunks, start=1):
         norm = _normalize_chunk(raw, id_fallback=i)  # Normalisasi data
-        vec = _embed(norm["content"])  # Generate embedding
+        vec = _embed(norm["content"], dim)  # Generate embedding
         norm["vector"] = vec  # Tambahkan vektor ke dokumen
         docs.append(norm)
 
@@ -156,11 +143,46 @@ def index_chunks_from_jsonl(
 
 
 
+# Index dari store kolumnar (chunk_store.py): embedding hanya dihitung untuk chunk yang belum punya vektor
+# model yang sama (EMBEDDING_KEY), yaitu chunk baru / berubah sejak build sebelumnya, lalu disimpan ke vectors.npy
+def index_chunks_from_store(
+    path: str = "chunks.store",
+    collection_name: str = "chunks",
+    batch_size: int = 128,
+) -> None:
+    if embed_store(path, _embed, EMBEDDING_KEY):
+        print(f"Embedding disimpan ke {path}/vectors.npy")
+    else:
+        print(f"Pakai embedding tersimpan di {path}/vectors.npy (model {EMBEDDING_KEY})")
+
+    with ChunkStore(path) as store:
+        col = ensure_chunks_collection(collection_name, num_dim=store.dim)
+        try:
+            TYPESENSE_CLIENT.collections[col].documents.delete({"filter_by": "id:!=null"})
+            print(f"Nama Cchunk di document sebelumnya '{col}' dihapus.")
+        except Exception as e:
+            print(f"Error ketika menghapus dokumen lama: {e}")
+
+        for start in range(0, len(store), batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, len(store))):
+                doc = store.document(i)
+                doc["vector"] = store.vector(i).tolist()  # Vektor dari mmap, bukan embed ulang
+                batch.append(doc)
+            TYPESENSE_CLIENT.collections[col].documents.import_(batch, {"action": "upsert"})
+
+
+
 # Entry point: jalankan indexing dari file jika script dieksekusi langsung
 if __name__ == "__main__":
-    src = os.getenv("CHUNKS_JSONL", "chunks.jsonl")  # Path file sumber
+    store_path = os.getenv("CHUNKS_STORE", "chunks.store")  # Store kolumnar hasil build_chunks.py
+    src = os.getenv("CHUNKS_JSONL", "chunks.jsonl")  # Path file sumber (fallback)
     col = "chunks"  # Nama collection
-    print(f"Indexing chunks from {src} into Typesense collection {col}...")
-    index_chunks_from_jsonl(src, collection_name=col)
+    if os.path.exists(os.path.join(store_path, "manifest.json")):
+        print(f"Indexing chunks from {store_path} into Typesense collection {col}...")
+        index_chunks_from_store(store_path, collection_name=col)
+    else:
+        print(f"Indexing chunks from {src} into Typesense collection {col}...")
+        index_chunks_from_jsonl(src, collection_name=col)
     print("Done.")
 
@@ -1,56 +1,52 @@
 
+import asyncio  # Untuk versi async retriever
 import json  # Untuk parsing dan serialisasi data dokumen
 import os  # Untuk akses environment variable
 from typing import List, Dict, Any, Literal 
-import ollama as lama  # Client untuk model embedding
-import typesense  # Client untuk Typesense search engine
+
+from embedding import EMBEDDING_MODEL, OLLAMA_HOST  # Di-export ulang untuk modul lama
+from embedding import aembed as _failover_aembed, embed as _failover_embed  # Provider embedding dengan failover
+from embedding import embed_batch as _failover_embed_batch
+from tracing import span  # Span latency untuk embedding dan request Typesense
+from typesense_cluster import get_cluster  # Client Typesense bersama
 
 
 
 # Mode pencarian retriever
 SearchMode = Literal["text", "vector", "hybrid"]
 
-# Inisialisasi client Typesense, konfigurasi dari environment variable
-TYPESENSE_CLIENT = typesense.Client(
-    {
-        "nodes": [
-            {
-                "host": os.getenv("TYPESENSE_HOST", "localhost"),  # Default ke localhost
-                "port": os.getenv("TYPESENSE_PORT", "8108"),  # Port default Typesense
-                "protocol": os.getenv("TYPESENSE_PROTOCOL", "http"),
-            }
-        ],
-        "api_key": os.getenv("TYPESENSE_API_KEY"),  # Wajib di-set agar bisa akses
-        "connection_timeout_seconds": 10,  # Timeout koneksi
-    }
-)
+# Client Typesense bersama (multi-node, env TYPESENSE_NODES / TYPESENSE_NEAREST_NODE, lihat typesense_cluster.py).
+# Read (search / multi_search) lewat TYPESENSE_CLUSTER supaya dapat routing health-aware + hedged read.
+TYPESENSE_CLUSTER = get_cluster()
+TYPESENSE_CLIENT = TYPESENSE_CLUSTER.client
 
 
-# Client untuk OLLAMA, default host bisa diganti via env
-OLLAMA_CLIENT = lama.Client(
-    host=os.getenv(
-        "OLLAMA_HOST",
-        "https://boats-billing-kinds-detected.trycloudflare.com", # Endpoint OLLAMA default, bisa diganti dengan env
-    )
-)
+# Fungsi untuk generate embedding dari teks lewat embedding.py (provider OLLAMA / ONNX lokal / hash
+# dengan timeout, circuit breaker, dan failover; env EMBEDDING_PROVIDERS).
+# `dim` = num_dim collection untuk guard dimensi
+def _embed(text: str, dim: int | None = None) -> List[float]:
+    return _failover_embed(text, dim)
 
 
+# Versi async dari _embed
+async def _aembed(text: str, dim: int | None = None) -> List[float]:
+    return await _failover_aembed(text, dim)
 
-# Nama model embedding yang dipakai
-EMBEDDING_MODEL = os.getenv(
-    "EMBEDDING_MODEL",
-    "hf.co/rizkysulaeman/Embedding-Gemma-300m-Healthcare:F16",
-)
 
+def collection_num_dim(collection_name: str) -> int | None:
+    """num_dim field `vector` di schema collection (None kalau tidak ada)."""
+    schema = TYPESENSE_CLIENT.collections[collection_name].retrieve()
+    for field in schema.get("fields", []):
+        if field.get("name") == "vector":
+            return field.get("num_dim")
+    return None
 
 
-# Fungsi untuk generate embedding dari teks pakai OLLAMA
-def _embed(text: str) -> List[float]:
-    rspn = OLLAMA_CLIENT.embeddings(
-        model=EMBEDDING_MODEL,
-        prompt=text,
-    )
-    return rspn["embedding"]  # Ambil vektor embedding saja
+# Request multi_search ke Typesense (dengan span)
+def _multi_search(body: Dict[str, Any]) -> Dict[str, Any]:
+    multi = TYPESENSE_CLUSTER.multi_search(body)
+    # multi_search returns {"results": [ ... ]}; ambil hasil pertama.
+    return multi["results"][0]
 
 
 # Retriever utama, bisa text, vector, atau hybrid search
@@ -70,21 +66,30 @@ class TypesenseRetriever:
     ) -> None:
         self.collection_name = collection_name  # Nama koleksi Typesense
         self.k = k  # Default jumlah hasil yang diambil
+        self._num_dim: int | None = None  # num_dim collection, diambil sekali saat vector search pertama
     # "k" adalah parameter yang menentukan berapa banyak hasil yang ingin diambil dari pencarian. Misalnya,
     # jika k=5, maka retriever akan mengembalikan 5 hasil teratas yang paling relevan dengan query yang diberikan. Parameter ini bisa diatur saat 
     # inisialisasi retriever atau saat memanggil fungsi search() untuk fleksibilitas.
+    def num_dim(self) -> int | None:
+        """Dimensi vektor collection (di-cache) untuk guard dimensi embedding query."""
+        if self._num_dim is None:
+            with span("typesense", endpoint="collections.retrieve"):
+                self._num_dim = collection_num_dim(self.collection_name) or 0
+        return self._num_dim or None
+
     def _search_text(self, query: str, k: int | None = None) -> Dict[str, Any]:
         """
         Search text adalah pencarian keyword di field 'content'.
         Biasanya lebih cepat, cocok untuk query yang sangat spesifik.
         """
         # Pencarian keyword biasa di field 'content'
-        return TYPESENSE_CLIENT.collections[self.collection_name].documents.search(
+        return TYPESENSE_CLUSTER.search(
+            self.collection_name,
             {
                 "q": query,  # Query string dari user
                 "query_by": "content",  # Field yang dicari
                 "per_page": k or self.k,  # Jumlah hasil
-            }
+            },
         )
 
     def _search_vector(self, query: str, k: int | None = None) -> Dict[str, Any]:
@@ -93,28 +98,10 @@ class TypesenseRetriever:
         Cocok untuk query yang maknanya luas atau tidak harus exact match.
         """
         # Generate embedding dari query
-        embedding = _embed(query)
-        k = k or self.k
-        # Format vector_query sesuai format Typesense
-        vector_query = "vector:([{}], k:{})".format(
-            ",".join(str(x) for x in embedding),
-            k,
-        )
+        embedding = _embed(query, self.num_dim())
         # multi_search untuk vector search
-        body = {
-            "searches": [
-                {
-                    "collection": self.collection_name,
-                    "q": "*",  # Query wildcard, semua dokumen
-                    "query_by": "content",
-                    "vector_query": vector_query,
-                    "per_page": k,
-                }
-            ]
-        }
-        multi = TYPESENSE_CLIENT.multi_search.perform(body)
-        # multi_search returns {"results": [ ... ]}; ambil hasil pertama.
-        return multi["results"][0]
+        body = {"searches": [self._vector_params("*", embedding, k)]}  # Query wildcard, semua dokumen
+        return _multi_search(body)
 
     def _search_hybrid(
         self,
@@ -129,28 +116,47 @@ class TypesenseRetriever:
         pencarian berbasis embedding untuk menangkap makna yang lebih luas dari query.
         """
         # Hybrid: generate embedding + tetap pakai query keyword
-        embedding = _embed(query)
+        embedding = _embed(query, self.num_dim())
+        body = {"searches": [self._vector_params(query, embedding, k)]}  # Query keyword tetap dipakai
+        return _multi_search(body)
+
+    def _vector_params(
+        self,
+        q: str,
+        embedding: List[float],
+        k: int | None = None,
+    ) -> Dict[str, Any]:
+        """Susun parameter multi_search untuk vector ("*") atau hybrid (q = query keyword)."""
         k = k or self.k
+        # Format vector_query sesuai format Typesense
         vector_query = "vector:([{}], k:{})".format(
             ",".join(str(x) for x in embedding),
             k,
         )
-        params: Dict[str, Any] = {
+        return {
             "collection": self.collection_name,
-            "q": query,  # Query keyword tetap dipakai
+            "q": q,
             "query_by": "content",
             "per_page": k,
-            "vector_query": vector_query,  # Ditambah vector query
+            "vector_query": vector_query,
         }
-        body = {"searches": [params]}
-        multi = TYPESENSE_CLIENT.multi_search.perform(body)
-        return multi["results"][0]
 
     def search(
         self,
         query: str,
         mode: SearchMode = "hybrid",
         k: int | None = None,
+    ) -> Dict[str, Any]:
+        with span("retrieve", mode=mode, k=k or self.k) as sp:
+            result = self._search(query, mode=mode, k=k)
+            sp.set(hits=len(result.get("hits", [])))
+        return result
+
+    def _search(
+        self,
+        query: str,
+        mode: SearchMode = "hybrid",
+        k: int | None = None,
     ) -> Dict[str, Any]:
         # Pilih mode pencarian sesuai permintaan
         if mode == "text":
@@ -161,6 +167,67 @@ class TypesenseRetriever:
             return self._search_hybrid(query, k=k)
         raise ValueError(f"Mode tidak dikenal: {mode}")  # Mode tidak dikenal
 
+    def search_batch(
+        self,
+        queries: List[str],
+        mode: SearchMode = "hybrid",
+        k: int | None = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Banyak query sekaligus (mis. batch_qa.py): satu batch embedding untuk semua query lalu satu
+        multi_search berisi satu search per query. Hasil berurutan sesuai `queries`, format sama dengan search().
+        Jumlah query per panggilan sebaiknya di bawah limit multi_search Typesense (default 50).
+        """
+        if not queries:
+            return []
+        with span("retrieve", mode=mode, k=k or self.k, batch=len(queries)):
+            if mode == "text":
+                searches = [
+                    {"collection": self.collection_name, "q": q, "query_by": "content", "per_page": k or self.k}
+                    for q in queries
+                ]
+            elif mode in ("vector", "hybrid"):
+                embeddings = _failover_embed_batch(queries, self.num_dim())
+                searches = [
+                    self._vector_params("*" if mode == "vector" else q, emb, k)
+                    for q, emb in zip(queries, embeddings)
+                ]
+            else:
+                raise ValueError(f"Mode tidak dikenal: {mode}")
+            return TYPESENSE_CLUSTER.multi_search({"searches": searches})["results"]
+
+    async def asearch(
+        self,
+        query: str,
+        mode: SearchMode = "hybrid",
+        k: int | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Versi async dari search(). Embedding memakai provider async (OLLAMA AsyncClient), sedangkan request Typesense
+        (client-nya sync) dijalankan di thread supaya event loop tidak ter-block.
+        """
+        with span("retrieve", mode=mode, k=k or self.k) as sp:
+            result = await self._asearch(query, mode=mode, k=k)
+            sp.set(hits=len(result.get("hits", [])))
+        return result
+
+    async def _asearch(
+        self,
+        query: str,
+        mode: SearchMode = "hybrid",
+        k: int | None = None,
+    ) -> Dict[str, Any]:
+        if mode == "text":
+            return await asyncio.to_thread(self._search_text, query, k)
+        if mode not in ("vector", "hybrid"):
+            raise ValueError(f"Mode tidak dikenal: {mode}")
+        if self._num_dim is None:
+            await asyncio.to_thread(self.num_dim)
+        embedding = await _aembed(query, self.num_dim())
+        q = "*" if mode == "vector" else query
+        body = {"searches": [self._vector_params(q, embedding, k)]}
+        return await asyncio.to_thread(_multi_search, body)
+
 
 def simplify_hits(result: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -189,3 +256,19 @@ def simplify_hits(result: Dict[str, Any]) -> List[Dict[str, Any]]:
     return out
 
 
+def collapse_siblings(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Gabungkan hit yang berasal dari induk yang sama (sub-chunk hasil chunk_splitter, metadata `parent_id`).
+    Hanya hit dengan peringkat tertinggi per induk yang dipertahankan, urutan hasil tidak berubah.
+    """
+    out: List[Dict[str, Any]] = []
+    seen = set()
+    for h in hits:
+        meta = h.get("metadata")
+        parent = meta.get("parent_id") if isinstance(meta, dict) else None
+        if parent is not None:
+            if parent in seen:
+                continue  # Sibling dengan peringkat lebih rendah
+            seen.add(parent)
+        out.append(h)
+    return out
@@ -0,0 +1,363 @@
+"""
+HTTP server (ASGI) di atas graph Agent + RAG dari custom_rag.py.
+
+Endpoint:
+- POST /ask          body {"question": "..."} -> {"answer": "...", "coalesced": bool}
+- POST /ask/stream   body sama, response Server-Sent Events:
+                     event `update` (output per node), `token` (token jawaban final), `done`, `error`
+- GET  /healthz      status, readiness warm-up, dan jumlah eksekusi yang sedang jalan / antri
+- GET  /readyz       200 kalau model / koneksi sudah warm (warmup.py), 503 selama warm-up
+- GET  /metrics      metrik latency per node / embedding / Typesense (format Prometheus)
+
+Kontrol beban:
+- Global: maksimal SERVE_MAX_CONCURRENCY eksekusi graph sekaligus, sisanya antri sampai
+  SERVE_MAX_QUEUE. Kalau antrian penuh, request ditolak 503 (load shedding).
+- Per client (header X-Client-Id, fallback ke IP): maksimal SERVE_MAX_PER_CLIENT request aktif, lebihnya 429.
+- Coalescing: pertanyaan identik (setelah normalisasi) yang masih in-flight berbagi satu eksekusi graph.
+
+Warm-up (warmup.py, env RAG_WARMUP): saat startup model OLLAMA di-load dengan keep_alive, embedding dummy dan
+search Typesense dijalankan, lalu heartbeat menjaga semuanya tetap warm. Request tetap dilayani selama warm-up,
+tapi latency-nya dicatat terpisah: histogram `rag_request_seconds{phase="cold"|"warm"}`.
+
+Jalankan: uvicorn serve:app --port 8000
+Untuk tes tanpa OLLAMA / Typesense: create_app(graph=stubs.install_stubs()).
+"""
+import asyncio  # Event loop, semaphore, dan condition untuk fan-out event
+import json  # Serialisasi request / response
+import os  # Konfigurasi dari environment variable
+import time  # Latency request cold / warm
+import uuid  # Id pertanyaan untuk file profil
+from collections import Counter  # Hitung request aktif per client
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import profiling  # Profil stack untuk request lambat (opt-in, RAG_PROFILE=1)
+import tracing  # Span graph + endpoint /metrics
+from warmup import RAG_WARMUP, RAG_WARMUP_RETRY  # Warm-up model + heartbeat keep-alive
+
+
+SERVE_MAX_CONCURRENCY = int(os.getenv("SERVE_MAX_CONCURRENCY", "8"))
+SERVE_MAX_PER_CLIENT = int(os.getenv("SERVE_MAX_PER_CLIENT", "4"))
+SERVE_MAX_QUEUE = int(os.getenv("SERVE_MAX_QUEUE", "32"))
+_MAX_BODY_BYTES = 64 * 1024  # Batas ukuran body request
+
+# Node yang output-nya adalah jawaban final ke user
+_ANSWER_NODE = "generate_answer"
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def _normalize_question(text: str) -> str:
+    return " ".join(text.casefold().split())  # Kunci coalescing
+
+
+def _jsonable(content: Any) -> Any:
+    # Content pesan bisa string atau list block; pastikan bisa di-serialize
+    return json.loads(json.dumps(content, ensure_ascii=False, default=str))
+
+
+class _SharedRun:
+    """
+    Satu eksekusi graph yang event-nya bisa diikuti banyak request (coalescing).
+    Event disimpan berurutan, subscriber yang datang belakangan tetap menerima semua event dari awal.
+    """
+
+    def __init__(self) -> None:
+        self.events: List[Tuple[str, Dict[str, Any]]] = []
+        self.done = False
+        self._cond = asyncio.Condition()
+
+    async def publish(self, event: str, data: Dict[str, Any]) -> None:
+        async with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    async def finish(self) -> None:
+        async with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        i = 0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: len(self.events) > i or self.done)
+                batch = self.events[i:]
+                done = self.done
+            i += len(batch)
+            for item in batch:
+                yield item
+            if done and i >= len(self.events):
+                return
+
+
+class RAGServer:
+    """ASGI app di atas compiled graph (default: `custom_rag.async_graph`)."""
+
+    def __init__(
+        self,
+        graph: Any = None,
+        max_concurrency: int = SERVE_MAX_CONCURRENCY,
+        max_per_client: int = SERVE_MAX_PER_CLIENT,
+        max_queue: int = SERVE_MAX_QUEUE,
+        warmup: Any = None,
+    ) -> None:
+        self._graph = graph
+        # Warm-up default hanya untuk graph custom_rag (graph stub tidak butuh warm-up)
+        self._warmup = warmup
+        self._warmup_pending = warmup is not None or (graph is None and RAG_WARMUP)
+        self._warmup_task: asyncio.Task | None = None
+        self.max_concurrency = max_concurrency
+        self.max_per_client = max_per_client
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrency)  # Slot eksekusi graph global
+        self._pending = 0  # Eksekusi yang sedang jalan + antri
+        self._active = 0  # Eksekusi yang sedang jalan
+        self._per_client: Counter = Counter()
+        self._inflight: Dict[str, _SharedRun] = {}
+        self._tasks: set = set()
+
+    @property
+    def graph(self) -> Any:
+        if self._graph is None:
+            from custom_rag import async_graph  # Import saat dibutuhkan (inisialisasi model cukup berat)
+            self._graph = async_graph
+        return self._graph
+
+    # ASGI entry point
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"]
+        try:
+            if path == "/healthz" and method == "GET":
+                await _send_json(send, 200, self.health())
+            elif path == "/readyz" and method == "GET":
+                await _send_json(send, 200 if self.ready else 503, {"ready": self.ready})
+            elif path == "/metrics" and method == "GET":
+                await _send_text(send, 200, tracing.render_prometheus(), b"text/plain; version=0.0.4")
+            elif path in ("/ask", "/ask/stream") and method == "POST":
+                await self._ask(scope, receive, send, stream=path == "/ask/stream")
+            else:
+                raise _HTTPError(404, "Not found")
+        except _HTTPError as e:
+            headers = [(b"retry-after", b"1")] if e.status in (429, 503) else []
+            await _send_json(send, e.status, {"detail": e.detail}, headers)
+
+    async def _lifespan(self, receive: Any, send: Any) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self._warmup_pending:
+                    self._warmup_task = asyncio.ensure_future(self._warm())  # Tidak memblokir startup, lihat /readyz
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._warmup_task is not None:
+                    self._warmup_task.cancel()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _warm(self) -> None:
+        while self._warmup is None:
+            try:
+                from warmup import default_warmup  # Import custom_rag (berat), jadi di thread
+                self._warmup = await asyncio.to_thread(default_warmup)
+            except Exception as e:
+                tracing.log("warmup", f"inisialisasi gagal: {type(e).__name__}: {e}", "error")
+                await asyncio.sleep(RAG_WARMUP_RETRY)
+        await self._warmup.run_forever()
+
+    @property
+    def ready(self) -> bool:
+        if self._warmup is not None:
+            return self._warmup.ready
+        return not self._warmup_pending
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "ready": self.ready,
+            "warmup": self._warmup.status()["targets"] if self._warmup is not None else None,
+            "active": self._active,
+            "queued": self._pending - self._active,
+            "in_flight_questions": len(self._inflight),
+        }
+
+    async def _ask(self, scope: Dict[str, Any], receive: Any, send: Any, stream: bool) -> None:
+        body = await _read_body(receive)
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise _HTTPError(400, "Body harus JSON")
+        question = payload.get("question") if isinstance(payload, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise _HTTPError(400, "Field 'question' wajib diisi")
+
+        client_id = _client_id(scope)
+        if self._per_client[client_id] >= self.max_per_client:
+            raise _HTTPError(429, "Terlalu banyak request aktif untuk client ini")
+        self._per_client[client_id] += 1
+        try:
+            run, coalesced = self._join_or_start(question)
+            if stream:
+                await self._respond_stream(send, run)
+            else:
+                await self._respond_json(send, run, coalesced)
+        finally:
+            self._per_client[client_id] -= 1
+            if not self._per_client[client_id]:
+                del self._per_client[client_id]
+
+    def _join_or_start(self, question: str) -> Tuple[_SharedRun, bool]:
+        key = _normalize_question(question)
+        run = self._inflight.get(key)
+        if run is not None:
+            return run, True  # Ikut eksekusi yang sudah ada
+        if self._pending >= self.max_concurrency + self.max_queue:
+            raise _HTTPError(503, "Server sedang penuh, coba lagi nanti")
+
+        run = _SharedRun()
+        self._inflight[key] = run
+        self._pending += 1
+        task = asyncio.ensure_future(self._execute(key, question, run))
+        self._tasks.add(task)  # Simpan referensi supaya task tidak di-GC
+        task.add_done_callback(self._tasks.discard)
+        return run, False
+
+    async def _execute(self, key: str, question: str, run: _SharedRun) -> None:
+        try:
+            async with self._slots:
+                self._active += 1
+                try:
+                    await self._run_graph(question, run)
+                finally:
+                    self._active -= 1
+        except Exception as e:
+            await run.publish("error", {"detail": f"{type(e).__name__}: {e}"})
+        finally:
+            self._pending -= 1
+            self._inflight.pop(key, None)
+            await run.finish()
+
+    async def _run_graph(self, question: str, run: _SharedRun) -> None:
+        from langchain_core.messages import HumanMessage
+
+        state = {"messages": [HumanMessage(content=question)]}
+        phase = "warm" if self.ready else "cold"
+        start = time.perf_counter()
+        qid = uuid.uuid4().hex[:12]
+        with tracing.span("graph", phase=phase, qid=qid), profiling.profile_request(qid, question):
+            await self._stream_graph(state, run)
+        tracing.observe("rag_request_seconds", time.perf_counter() - start, phase=phase)
+
+    async def _stream_graph(self, state: Dict[str, Any], run: _SharedRun) -> None:
+        answer: Any = ""
+        async for mode, payload in self.graph.astream(state, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                token, meta = payload
+                if meta.get("langgraph_node") == _ANSWER_NODE and isinstance(token.content, str) and token.content:
+                    await run.publish("token", {"content": token.content})
+                continue
+            for node, update in payload.items():
+                messages = (update or {}).get("messages") or []
+                if not messages:
+                    continue
+                msg = messages[-1]
+                content = getattr(msg, "content", msg)
+                if getattr(msg, "type", None) == "ai" and not getattr(msg, "tool_calls", None):
+                    answer = content  # Pesan AI tanpa tool_call = jawaban (sementara) terakhir
+                await run.publish("update", {
+                    "node": node,
+                    "type": getattr(msg, "type", None),
+                    "content": _jsonable(content),
+                })
+        await run.publish("done", {"answer": _jsonable(answer)})
+
+    async def _respond_json(self, send: Any, run: _SharedRun, coalesced: bool) -> None:
+        async for event, data in run.subscribe():
+            if event == "done":
+                await _send_json(send, 200, {"answer": data["answer"], "coalesced": coalesced})
+                return
+            if event == "error":
+                await _send_json(send, 500, data)
+                return
+        await _send_json(send, 500, {"detail": "Eksekusi berakhir tanpa jawaban"})
+
+    async def _respond_stream(self, send: Any, run: _SharedRun) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+            ],
+        })
+        async for event, data in run.subscribe():
+            chunk = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _client_id(scope: Dict[str, Any]) -> str:
+    for name, value in scope.get("headers") or []:
+        if name == b"x-client-id" and value:
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "anonymous"
+
+
+async def _read_body(receive: Any) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > _MAX_BODY_BYTES:
+            raise _HTTPError(413, "Body terlalu besar")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send: Any, status: int, payload: Dict[str, Any], headers: List[Tuple[bytes, bytes]] | None = None) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")] + list(headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_text(send: Any, status: int, text: str, content_type: bytes) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type)],
+    })
+    await send({"type": "http.response.body", "body": text.encode("utf-8")})
+
+
+def create_app(graph: Any = None, **limits: Any) -> RAGServer:
+    """Buat ASGI app; `graph` bisa diganti graph hasil stubs.install_stubs() untuk tes."""
+    return RAGServer(graph=graph, **limits)
+
+
+# App default untuk `uvicorn serve:app`
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        app,
+        host=os.getenv("SERVE_HOST", "0.0.0.0"),
+        port=int(os.getenv("SERVE_PORT", "8000")),
+    )
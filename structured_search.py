@@ -0,0 +1,193 @@
+"""
+Pencarian terstruktur ke collection `doctors` / `hospitals` (collection.py) tanpa embedding.
+
+Argumen bertipe (spesialisasi, kota, RS, gender, emergency) diterjemahkan langsung ke query Typesense:
+- specialization -> q atas specialization_name / sub_specialization_name (toleran typo & prefix,
+  mis. "psikolog" -> "Psikologi"),
+- city           -> filter `cities` (dokter) / `city` (RS),
+- hospital       -> nama RS di-resolve dulu ke Id lewat search teks di collection `hospitals`,
+                    lalu jadi filter exact `hospital_ids:=[...]` (field join dari hospital_join.py),
+- gender         -> filter `gender_name` (pria/wanita/male/female dinormalisasi),
+- emergency      -> filter `is_emergency_enable:=true/false`.
+gender / emergency adalah atribut dokter. Untuk target "hospitals" keduanya diterapkan lewat dokter: search
+`doctors` dengan filter yang sama (plus spesialisasi, kota, RS) dan facet `hospital_ids`, lalu RS dibatasi ke
+Id hasil facet (RS yang punya dokter sesuai filter). build_params sendiri menolak gender / emergency untuk
+hospitals supaya filter tidak hilang diam-diam.
+Semua request hanya ke Typesense (tanpa LLM / embedding), jadi selesai dalam hitungan milidetik.
+"""
+import asyncio
+import os
+from typing import Any, Dict, List, Literal
+
+from retriever import TYPESENSE_CLUSTER
+from tracing import span
+
+
+DOCTORS_COLLECTION = os.getenv("DOCTORS_COLLECTION", "doctors")
+HOSPITALS_COLLECTION = os.getenv("HOSPITALS_COLLECTION", "hospitals")
+STRUCTURED_TOP_K = int(os.getenv("STRUCTURED_TOP_K", "10"))
+_HOSPITAL_MATCHES = 5  # Maksimal RS hasil resolve nama yang dipakai sebagai filter
+_DOCTOR_HOSPITALS = 100  # Maksimal Id RS dari facet dokter (filter gender / emergency untuk target hospitals)
+
+_GENDERS = {
+    "laki-laki": "Laki-laki", "laki": "Laki-laki", "pria": "Laki-laki", "male": "Laki-laki", "l": "Laki-laki",
+    "perempuan": "Perempuan", "wanita": "Perempuan", "female": "Perempuan", "p": "Perempuan",
+}
+
+Target = Literal["doctors", "hospitals"]
+
+
+def _quote(value: str) -> str:
+    # Nilai filter di-backtick supaya koma / spasi / kurung di nama aman
+    return "`" + str(value).replace("`", "") + "`"
+
+
+def _normalize_gender(gender: str | None) -> str | None:
+    if not gender:
+        return None
+    return _GENDERS.get(gender.strip().casefold(), gender.strip())
+
+
+def resolve_hospital_ids(name: str, k: int = _HOSPITAL_MATCHES) -> List[str]:
+    """Id RS yang namanya / alias-nya cocok dengan `name` (search teks, toleran typo)."""
+    res = TYPESENSE_CLUSTER.search(HOSPITALS_COLLECTION, {
+        "q": name,
+        "query_by": "hospital,alias,hospital_2",
+        "per_page": k,
+        "include_fields": "hospital_id",
+    })
+    return [h["document"]["hospital_id"] for h in res.get("hits", []) if h["document"].get("hospital_id")]
+
+
+def doctor_hospital_ids(
+    specialization: str | None = None,
+    city: str | None = None,
+    hospital_ids: List[str] | None = None,
+    gender: str | None = None,
+    emergency: bool | None = None,
+    k: int = _DOCTOR_HOSPITALS,
+) -> List[str]:
+    """Id RS tempat praktek dokter yang lolos filter (facet `hospital_ids`, urut jumlah dokter)."""
+    params = build_params("doctors", specialization, city, hospital_ids, gender, emergency, k=0)
+    params.update(facet_by="hospital_ids", max_facet_values=k)
+    res = TYPESENSE_CLUSTER.search(DOCTORS_COLLECTION, params)
+    for facet in res.get("facet_counts", []):
+        if facet.get("field_name") == "hospital_ids":
+            return [c["value"] for c in facet.get("counts", [])]
+    return []
+
+
+def build_params(
+    target: Target = "doctors",
+    specialization: str | None = None,
+    city: str | None = None,
+    hospital_ids: List[str] | None = None,
+    gender: str | None = None,
+    emergency: bool | None = None,
+    k: int = STRUCTURED_TOP_K,
+) -> Dict[str, Any]:
+    """Susun parameter search Typesense (q + filter_by) dari argumen terstruktur."""
+    filters: List[str] = []
+    if target == "doctors":
+        if city:
+            filters.append(f"cities:{_quote(city)}")
+        if hospital_ids:
+            filters.append("hospital_ids:=[" + ",".join(_quote(h) for h in hospital_ids) + "]")
+        gender = _normalize_gender(gender)
+        if gender:
+            filters.append(f"gender_name:={_quote(gender)}")
+        if emergency is not None:
+            filters.append(f"is_emergency_enable:={'true' if emergency else 'false'}")
+        params = {
+            "q": specialization or "*",
+            "query_by": "specialization_name,sub_specialization_name,specialization_name_en",
+        }
+    else:
+        if gender or emergency is not None:
+            raise ValueError("Filter gender / emergency hanya untuk dokter; untuk RS pakai doctor_hospital_ids()")
+        if city:
+            filters.append(f"city:{_quote(city)}")
+        if hospital_ids:
+            filters.append("hospital_id:=[" + ",".join(_quote(h) for h in hospital_ids) + "]")
+        params = {
+            "q": specialization or "*",
+            "query_by": "specializations",
+            "sort_by": "_text_match:desc,doctor_count:desc",
+        }
+    params["per_page"] = k
+    if filters:
+        params["filter_by"] = " && ".join(filters)
+    return params
+
+
+def _format_doctor(doc: Dict[str, Any]) -> str:
+    spec = doc.get("specialization_name") or "-"
+    if doc.get("sub_specialization_name"):
+        spec += f" ({doc['sub_specialization_name']})"
+    line = f"[doctor_id={doc.get('doctor_id')}] {doc.get('name')} - Spesialisasi: {spec}"
+    if doc.get("gender_name"):
+        line += f" - {doc['gender_name']}"
+    if doc.get("hospital_names"):
+        line += f" - Praktek di: {', '.join(doc['hospital_names'])}"
+    if doc.get("cities"):
+        line += f" ({', '.join(doc['cities'])})"
+    if doc.get("is_emergency_enable"):
+        line += " - Layanan emergency"
+    if doc.get("next_avail"):
+        line += f" - Jadwal terdekat: {doc['next_avail']}"
+    return line
+
+
+def _format_hospital(doc: Dict[str, Any]) -> str:
+    line = f"[hospital_id={doc.get('hospital_id')}] {doc.get('hospital')} - {doc.get('address', '')}, {doc.get('city', '')}, {doc.get('province', '')}"
+    if doc.get("doctor_count"):
+        line += f" - {doc['doctor_count']} dokter"
+    if doc.get("specializations"):
+        line += f" - Spesialisasi: {', '.join(doc['specializations'][:15])}"
+    return line
+
+
+def format_results(target: Target, result: Dict[str, Any]) -> str:
+    """Hasil search jadi context string untuk LLM ("" kalau kosong, sama seperti retrieve_chunks)."""
+    docs = [h.get("document", {}) for h in result.get("hits", [])]
+    if not docs:
+        return ""
+    fmt = _format_doctor if target == "doctors" else _format_hospital
+    header = f"Ditemukan {result.get('found', len(docs))} {'dokter' if target == 'doctors' else 'rumah sakit'}"
+    return header + ":\n" + "\n".join(fmt(d) for d in docs)
+
+
+def search(
+    target: Target = "doctors",
+    specialization: str | None = None,
+    city: str | None = None,
+    hospital: str | None = None,
+    gender: str | None = None,
+    emergency: bool | None = None,
+    k: int = STRUCTURED_TOP_K,
+) -> Dict[str, Any]:
+    """Jalankan pencarian terstruktur; return respons Typesense."""
+    with span("structured_search", target=target) as sp:
+        hospital_ids = None
+        if hospital:
+            hospital_ids = resolve_hospital_ids(hospital)
+            if not hospital_ids:
+                sp.set(hits=0)
+                return {"found": 0, "hits": []}  # RS tidak dikenal: jangan lepas filter diam-diam
+        if target == "hospitals" and (gender or emergency is not None):
+            hospital_ids = doctor_hospital_ids(specialization, city, hospital_ids, gender, emergency)
+            sp.set(via_doctors=len(hospital_ids))
+            if not hospital_ids:
+                sp.set(hits=0)
+                return {"found": 0, "hits": []}  # Tidak ada RS dengan dokter yang sesuai filter
+            gender, emergency = None, None
+        collection = DOCTORS_COLLECTION if target == "doctors" else HOSPITALS_COLLECTION
+        params = build_params(target, specialization, city, hospital_ids, gender, emergency, k)
+        result = TYPESENSE_CLUSTER.search(collection, params)
+        sp.set(hits=len(result.get("hits", [])))
+    return result
+
+
+async def asearch(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+    """Versi async: client Typesense sync dijalankan di thread."""
+    return await asyncio.to_thread(search, *args, **kwargs)
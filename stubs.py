@@ -0,0 +1,262 @@
+"""
+Stub model dan retriever untuk menjalankan graph tanpa OLLAMA / Typesense (tes, demo server, load test).
+- StubChatModel: chat model deterministik. Setelah `bind_tools` ia mengeluarkan tool_call
+  `retrieve_chunks` untuk pertanyaan terakhir (atau tool_call dari `tool_script`, bergiliran),
+  `with_structured_output` mengembalikan grade yes/no (`grade`, atau "no" dengan peluang
+  `grade_no_rate` dari RNG ber-seed), dan `invoke` / `astream` mengembalikan jawaban tetap
+  (di-stream per kata). Latency per call = `latency` + jitter acak sampai `latency_jitter`.
+- StubRetriever: retriever in-memory dengan interface yang sama dengan TypesenseRetriever
+  (`search` / `asearch`) dan format hasil mirip Typesense, jadi tetap bisa dipakai `simplify_hits`.
+- StubStructuredSearch: pengganti modul structured_search untuk tool `search_doctors_hospitals`.
+- install_stubs: ganti model dan retriever di modul `custom_rag` lalu bangun graph baru. Model, router, dan
+  retriever asli custom_rag dibuat lazy (init_backends), jadi graph stub tidak membuat client OLLAMA / Typesense
+  maupun file cache LLM.
+Latency buatan dicatat sebagai span `stub.wait`, supaya load test (loadtest.py) bisa memisahkan
+waktu tunggu model / retriever dari overhead graph.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, Iterator, AsyncIterator, List, Mapping, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+from model_router import ModelRouter
+from tracing import span
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model palsu yang deterministik, dengan latency opsional (detik) per call."""
+
+    answer: str = "Jawaban stub berdasarkan context yang ditemukan."
+    grade: str = "yes"  # Jawaban grading relevansi ("yes" / "no")
+    call_tool: bool = True  # Kalau True, model yang di-bind_tools selalu memanggil retrieve_chunks
+    tool_name: str = "retrieve_chunks"
+    # Tool call bergiliran per call agent, mis. [{"name": "search_doctors_hospitals", "args": {"city": "Yogyakarta"}}].
+    # String di args boleh berisi "{question}". Kosong = selalu `tool_name` dengan {"query": pertanyaan}.
+    tool_script: List[Dict[str, Any]] = []
+    grade_no_rate: float = 0.0  # Peluang grade "no" (memicu rewrite / retrieval alternatif)
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    seed: int = 0
+    tools_bound: bool = False
+
+    _rng: random.Random = PrivateAttr(default=None)
+    _script_pos: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)  # Dibagi antar copy hasil bind_tools
+        self._script_pos = itertools.count()
+
+    def _delay(self) -> float:
+        if not self.latency_jitter:
+            return self.latency
+        return self.latency + self._rng.uniform(0, self.latency_jitter)
+
+    def _wait(self) -> None:
+        delay = self._delay()
+        if delay:
+            with span("stub.wait", kind="llm"):  # Latency buatan, dipisah dari overhead graph
+                time.sleep(delay)
+
+    async def _await(self) -> None:
+        delay = self._delay()
+        if delay:
+            with span("stub.wait", kind="llm"):
+                await asyncio.sleep(delay)
+
+    def _grade_value(self) -> str:
+        if self.grade_no_rate and self._rng.random() < self.grade_no_rate:
+            return "no"
+        return self.grade
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.model_copy(update={"tools_bound": True})
+
+    def with_structured_output(self, schema: Any, **kwargs: Any):
+        # Hanya untuk schema grading seperti GradeDocuments (field `jawaban`)
+        def _grade(_input: Any):
+            self._wait()
+            return schema(jawaban=self._grade_value())
+
+        async def _agrade(_input: Any):
+            await self._await()
+            return schema(jawaban=self._grade_value())
+
+        return RunnableLambda(_grade, afunc=_agrade)
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1] if messages else None
+        if self.tools_bound and self.call_tool and getattr(last, "type", None) == "human":
+            name, args = self.tool_name, {"query": last.content}
+            if self.tool_script:
+                step = self.tool_script[next(self._script_pos) % len(self.tool_script)]
+                name = step.get("name", self.tool_name)
+                args = {
+                    k: v.format(question=last.content) if isinstance(v, str) else v
+                    for k, v in (step.get("args") or {"query": "{question}"}).items()
+                }
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex}"}],
+            )
+        return AIMessage(content=self.answer)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self._wait()
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await self._await()
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _chunks(self, reply: AIMessage) -> Iterator[ChatGenerationChunk]:
+        if reply.tool_calls:
+            call = reply.tool_calls[0]
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{
+                    "name": call["name"],
+                    "args": json.dumps(call["args"]),
+                    "id": call["id"],
+                    "index": 0,
+                }],
+            ))
+            return
+        words = reply.content.split(" ")
+        for i, word in enumerate(words):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self._wait()
+        for chunk in self._chunks(self._reply(messages)):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await self._await()
+        for chunk in self._chunks(self._reply(messages)):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class StubRetriever:
+    """Retriever in-memory: skor = jumlah kata query yang muncul di content."""
+
+    def __init__(
+        self,
+        docs: Sequence[Mapping[str, Any]] | None = None,
+        k: int = 5,
+        latency: float = 0.0,
+    ) -> None:
+        self.docs = list(docs or [
+            {"id": "faqs:1", "content": "Pertanyaan: Di mana lokasi Siloam Hospitals?\nJawaban: Siloam Hospitals tersebar di berbagai kota di Indonesia."},
+            {"id": "doctors:1", "content": "Dokter: dr. Contoh. Spesialisasi: Psikologi. Praktek di: Siloam Hospitals Yogyakarta"},
+        ])
+        self.k = k
+        self.latency = latency
+
+    def _result(self, query: str, k: int | None) -> Dict[str, Any]:
+        terms = set(query.casefold().split())
+        scored = []
+        for doc in self.docs:
+            content = str(doc.get("content", ""))
+            score = sum(1 for t in terms if t in content.casefold())
+            if score:
+                scored.append((score, doc))
+        scored.sort(key=lambda x: -x[0])
+        hits = []
+        for score, doc in scored[: k or self.k]:
+            meta = {key: v for key, v in doc.items() if key not in {"id", "content"}}
+            hits.append({
+                "document": {
+                    "id": doc.get("id"),
+                    "content": doc.get("content"),
+                    "metadata": json.dumps(meta, ensure_ascii=False),
+                },
+                "text_match": score,
+            })
+        return {"found": len(hits), "hits": hits}
+
+    def search(self, query: str, mode: str = "hybrid", k: int | None = None) -> Dict[str, Any]:
+        if self.latency:
+            with span("stub.wait", kind="retriever"):
+                time.sleep(self.latency)
+        return self._result(query, k)
+
+    async def asearch(self, query: str, mode: str = "hybrid", k: int | None = None) -> Dict[str, Any]:
+        if self.latency:
+            with span("stub.wait", kind="retriever"):
+                await asyncio.sleep(self.latency)
+        return self._result(query, k)
+
+    def search_batch(self, queries: Sequence[str], mode: str = "hybrid", k: int | None = None) -> List[Dict[str, Any]]:
+        if self.latency:
+            with span("stub.wait", kind="retriever"):
+                time.sleep(self.latency)  # Satu round-trip untuk seluruh batch
+        return [self._result(q, k) for q in queries]
+
+
+class StubStructuredSearch:
+    """Pengganti modul structured_search: selalu mengembalikan `hits` yang sama (default satu dokter)."""
+
+    def __init__(self, hits: Sequence[Mapping[str, Any]] | None = None, latency: float = 0.0) -> None:
+        self.hits = list(hits if hits is not None else [
+            {"document": {"doctor_id": "1", "name": "dr. Contoh", "specialization_name": "Psikologi",
+                          "hospital_names": ["Siloam Hospitals Yogyakarta"], "cities": ["Yogyakarta"]}},
+        ])
+        self.latency = latency
+
+    def search(self, target: str = "doctors", *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        if self.latency:
+            with span("stub.wait", kind="retriever"):
+                time.sleep(self.latency)
+        return {"found": len(self.hits), "hits": list(self.hits)}
+
+    async def asearch(self, target: str = "doctors", *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        if self.latency:
+            with span("stub.wait", kind="retriever"):
+                await asyncio.sleep(self.latency)
+        return {"found": len(self.hits), "hits": list(self.hits)}
+
+    def format_results(self, target: str, result: Dict[str, Any]) -> str:
+        docs = [h.get("document", {}) for h in result.get("hits", [])]
+        return "\n".join(json.dumps(d, ensure_ascii=False) for d in docs)
+
+
+def install_stubs(
+    module: Any = None,
+    model: BaseChatModel | None = None,
+    grader: BaseChatModel | None = None,
+    retriever: Any = None,
+    use_async: bool = True,
+    structured: Any = None,
+    routes: Mapping[str, BaseChatModel] | None = None,
+    **graph_kwargs: Any,
+):
+    """
+    Pasang stub ke modul `custom_rag` (model agent, model penilai, retriever, pencarian terstruktur)
+    lalu kembalikan graph baru hasil `build_graph`. Node membaca variabel modul saat dipanggil, jadi
+    stub langsung dipakai; karena semuanya sudah di-set, build_graph tidak membuat backend asli. `routes` = override model per node (lihat model_router.py); default tanpa override.
+    """
+    if module is None:
+        import custom_rag as module
+    module.response_model = model or StubChatModel()
+    module.model_penilai = grader or StubChatModel()
+    module._ts_retriever = retriever or StubRetriever()
+    module.structured_search = structured or StubStructuredSearch()
+    module.MODEL_ROUTER = ModelRouter(routes or {})
+    return module.build_graph(use_async=use_async, **graph_kwargs)
@@ -0,0 +1,72 @@
+"""Regresi build_chunks: record sumber yang tercantum dua kali tidak boleh membuat build gagal."""
+import json
+
+import pytest
+
+import build_chunks
+
+
+def _write_sources(tmp_path, monkeypatch, faqs, hospitals, doctors):
+    paths = {name: tmp_path / f"{name}.json" for name in ("faqs", "hospitals", "doctors")}
+    paths["faqs"].write_text("".join(json.dumps(r) + "\n" for r in faqs), encoding="utf-8")
+    paths["hospitals"].write_text(json.dumps(hospitals), encoding="utf-8")
+    paths["doctors"].write_text(json.dumps({"data": doctors}), encoding="utf-8")
+    monkeypatch.setattr(build_chunks, "FAqs_FILE", str(paths["faqs"]))
+    monkeypatch.setattr(build_chunks, "HOSPITALS_FILE", str(paths["hospitals"]))
+    monkeypatch.setattr(build_chunks, "DOCTOR_FILE", str(paths["doctors"]))
+
+
+def _build(tmp_path):
+    out = tmp_path / "chunks.jsonl"
+    stats = build_chunks.write_chunks_jsonl(str(out), limits={}, workers=1)
+    chunks = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    return {st["source"]: st for st in stats}, chunks
+
+
+def _doctor(hospitals):
+    return {
+        "doctor_id": "d1",
+        "name": "dr. Contoh",
+        "specialization_name": "Psikologi",
+        "hospital_ids": [{"hospital_name": h} for h in hospitals],
+    }
+
+
+def test_duplicate_source_rows_are_dropped(tmp_path, monkeypatch):
+    long_answer = " ".join(f"kata{i}" for i in range(600))  # Dipecah jadi beberapa sub-chunk
+    faqs = [
+        {"prompt": "Jam besuk?", "completion": "Jam 10-12."},
+        {"prompt": "Parkir?", "completion": "Tersedia."},
+        {"prompt": "Jam besuk?", "completion": "Jam 10-12."},  # Duplikat, faq_index beda
+        {"prompt": "Panjang?", "completion": long_answer},
+        {"prompt": "Panjang?", "completion": long_answer},
+    ]
+    hospitals = [
+        {"Id": "h1", "No": 1, "Hospital": "Siloam A", "City": "Jakarta"},
+        {"Id": "h1", "No": 2, "Hospital": "Siloam A", "City": "Jakarta"},  # Duplikat, No beda
+    ]
+    many = [f"Siloam Hospitals Cabang Nomor {i}" for i in range(80)]
+    doctors = [_doctor(many), _doctor(many[:3])]  # doctor_id sama, daftar RS beda
+    _write_sources(tmp_path, monkeypatch, faqs, hospitals, doctors)
+
+    stats, chunks = _build(tmp_path)
+
+    ids = [c["id"] for c in chunks]
+    assert len(ids) == len(set(ids))
+    assert stats["faqs"]["duplicates"] == 2
+    assert stats["hospitals"]["duplicates"] == 1
+    assert stats["doctors"]["conflicts"] == 1
+    doctor_parts = [c for c in chunks if c["source"] == "doctors"]
+    assert len(doctor_parts) > 1
+    assert all(c["parts"] == len(doctor_parts) for c in doctor_parts)  # Versi pertama utuh
+
+
+def test_content_hash_collision_still_raises(tmp_path, monkeypatch):
+    hospitals = [
+        {"No": 7, "Hospital": "Siloam A"},
+        {"No": 7, "Hospital": "Siloam B"},  # Tanpa Id: fallback "no-7" bentrok dengan isi beda
+    ]
+    _write_sources(tmp_path, monkeypatch, [], hospitals, [])
+
+    with pytest.raises(build_chunks.ChunkIdCollisionError):
+        _build(tmp_path)
@@ -0,0 +1,61 @@
+"""chunk_store: build ulang corpus tidak boleh meng-embed ulang chunk yang tidak berubah."""
+import chunk_store
+
+
+def _chunks(**changed):
+    base = {"faq:a": "Jam besuk 10-12.", "faq:b": "Parkir tersedia.", "hospital:h1": "Siloam A, Jakarta."}
+    base.update(changed)
+    return [{"id": cid, "content": content, "source": cid.split(":")[0]} for cid, content in base.items()]
+
+
+def _embedder(calls):
+    def embed(text):
+        calls.append(text)
+        return [float(len(text)), 1.0, 0.5]
+    return embed
+
+
+def _build(path, chunks, calls):
+    chunk_store.write_store(chunks, path)
+    return chunk_store.embed_store(path, _embedder(calls), "m1", progress_every=0)
+
+
+def test_rebuilding_unchanged_corpus_does_not_embed(tmp_path):
+    path = str(tmp_path / "store")
+    calls = []
+    assert _build(path, _chunks(), calls)
+    assert len(calls) == 3
+
+    calls.clear()
+    assert not _build(path, _chunks(), calls)
+    assert calls == []
+    with chunk_store.ChunkStore(path) as store:
+        assert store.has_vectors("m1")
+        assert list(store.vector(store.index_of("faq:b"))) == [16.0, 1.0, 0.5]
+
+
+def test_rebuild_embeds_only_new_or_changed_rows(tmp_path):
+    path = str(tmp_path / "store")
+    _build(path, _chunks(), [])
+
+    calls = []
+    chunks = [{"id": "faq:new", "content": "Baru.", "source": "faqs"}] + _chunks(**{"faq:a": "Jam besuk 09-11 ya."})
+    assert _build(path, chunks, calls)
+
+    assert sorted(calls) == ["Baru.", "Jam besuk 09-11 ya."]
+    with chunk_store.ChunkStore(path) as store:
+        assert "stale" not in store.manifest
+        vectors = {store.id(i): list(store.vector(i)) for i in range(len(store))}
+    assert vectors["faq:new"] == [5.0, 1.0, 0.5]
+    assert vectors["faq:a"] == [19.0, 1.0, 0.5]
+    assert vectors["hospital:h1"] == [18.0, 1.0, 0.5]
+
+
+def test_other_model_re_embeds_everything(tmp_path):
+    path = str(tmp_path / "store")
+    _build(path, _chunks(), [])
+    chunk_store.write_store(_chunks(), path)
+
+    calls = []
+    assert chunk_store.embed_store(path, _embedder(calls), "m2", progress_every=0)
+    assert len(calls) == 3
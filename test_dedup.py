@@ -0,0 +1,44 @@
+"""Dedup per record: sub-chunk dibuang bersama induknya, dokter tidak ikut dedup konten."""
+import json
+
+import dedup
+
+
+def _chunk(cid, source, content, **extra):
+    return {"id": cid, "source": source, "content": content, **extra}
+
+
+def _sub_chunks(parent, contents):
+    return [
+        _chunk(f"{parent}#{n}", "faqs", c, parent_id=parent, part=n, parts=len(contents))
+        for n, c in enumerate(contents, start=1)
+    ]
+
+
+def _run(tmp_path, chunks):
+    src = tmp_path / "chunks.jsonl"
+    src.write_text("".join(json.dumps(c) + "\n" for c in chunks), encoding="utf-8")
+    stats = dedup.dedup_chunks(str(src), report_path=str(tmp_path / "report.jsonl"))
+    return stats, [json.loads(line) for line in src.read_text(encoding="utf-8").splitlines()]
+
+
+def test_sub_chunks_are_deduplicated_with_their_parent(tmp_path):
+    body = [f"Pertanyaan: Jam besuk? Jawaban: bagian {n} " + " ".join(f"kata{n}{i}" for i in range(40)) for n in range(3)]
+    changed = body[:2] + [body[2] + " tambahan"]  # Hanya bagian terakhir yang sedikit berbeda
+    chunks = _sub_chunks("faq:a", body) + _sub_chunks("faq:b", changed) + [_chunk("faq:c", "faqs", "Parkir tersedia.")]
+
+    stats, kept = _run(tmp_path, chunks)
+
+    assert [c["id"] for c in kept] == ["faq:a#1", "faq:a#2", "faq:a#3", "faq:c"]
+    assert stats["records"] == 3
+    assert all(c["parts"] == 3 for c in kept if c.get("parent_id") == "faq:a")
+
+
+def test_doctors_are_not_clustered_by_content(tmp_path):
+    same = "Dokter: dr. Budi. Spesialisasi: Anak. Praktek di: Siloam Hospitals Kebon Jeruk"
+    chunks = [_chunk("doctor:1", "doctors", same, doctor_id="1"), _chunk("doctor:2", "doctors", same, doctor_id="2")]
+
+    stats, kept = _run(tmp_path, chunks)
+
+    assert [c["id"] for c in kept] == ["doctor:1", "doctor:2"]
+    assert stats["clusters"] == 0
@@ -0,0 +1,82 @@
+"""FailoverEmbedder: circuit breaker, provider lambat dipindah ke belakang lalu di-probe lagi, guard dimensi."""
+import time
+
+import pytest
+
+import embedding
+
+
+class FakeProvider(embedding.EmbeddingProvider):
+    def __init__(self, name, dim=3, delay=0.0, fail=False):
+        self.name = name
+        super().__init__(timeout=1.0)
+        self.dim = dim
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def embed(self, text):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("down")
+        time.sleep(self.delay)
+        return [1.0] * self.dim
+
+
+def _embedder(*providers, slow_ms=20, probe=0.05):
+    emb = embedding.FailoverEmbedder(providers, slow_probe=probe)
+    for slot in emb._slots:
+        slot.slow_ms = slow_ms
+    return emb
+
+
+def test_failover_and_breaker_skip_broken_provider():
+    broken, backup = FakeProvider("ollama", fail=True), FakeProvider("onnx")
+    emb = _embedder(broken, backup)
+
+    for _ in range(embedding.EMBEDDING_BREAKER_FAILURES + 2):
+        assert emb.embed("halo") == [1.0, 1.0, 1.0]
+
+    assert broken.calls == embedding.EMBEDDING_BREAKER_FAILURES  # Setelah itu circuit terbuka, provider dilewati
+    assert emb.status()[0]["state"] == "open"
+
+
+def test_slow_provider_is_demoted_then_readmitted_by_probe():
+    primary, backup = FakeProvider("ollama", delay=0.05), FakeProvider("onnx")
+    emb = _embedder(primary, backup)
+
+    emb.embed("x")  # Lambat: EWMA primary di atas slow_ms
+    primary.delay = 0.0  # Pulih, tapi belum terukur
+    emb.embed("x")
+    emb.embed("x")
+    assert (primary.calls, backup.calls) == (1, 2)
+
+    time.sleep(0.06)  # Jeda probe lewat
+    emb.embed("x")
+    assert primary.calls == 2
+    assert not emb.status()[0]["slow"]
+    emb.embed("x")
+    assert (primary.calls, backup.calls) == (3, 2)
+
+
+def test_slow_provider_stays_demoted_when_probe_is_still_slow():
+    primary, backup = FakeProvider("ollama", delay=0.05), FakeProvider("onnx")
+    emb = _embedder(primary, backup)
+
+    emb.embed("x")
+    time.sleep(0.06)
+    emb.embed("x")  # Probe, masih lambat
+    emb.embed("x")
+    assert (primary.calls, backup.calls) == (2, 1)
+
+
+def test_dimension_mismatch_fails_over_then_raises():
+    wrong, right = FakeProvider("ollama", dim=4), FakeProvider("onnx", dim=3)
+    assert len(_embedder(wrong, right).embed("x", dim=3)) == 3
+    with pytest.raises(embedding.EmbeddingDimError):
+        _embedder(FakeProvider("ollama", dim=4)).embed("x", dim=3)
+
+
+def test_providers_from_different_vector_spaces_are_rejected():
+    with pytest.raises(ValueError):
+        embedding.FailoverEmbedder([FakeProvider("ollama"), embedding.HashProvider(dim=3)])
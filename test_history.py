@@ -0,0 +1,80 @@
+"""history.trim_messages / bounded_messages: history dipangkas tanpa memisah tool_call dari ToolMessage-nya."""
+import pytest
+
+pytest.importorskip("langgraph")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage  # noqa: E402
+
+import history  # noqa: E402
+
+
+def _retrieval(n, content):
+    call = AIMessage(content="", tool_calls=[{"id": f"call-{n}", "name": "retrieve_chunks", "args": {"query": f"q{n}"}}])
+    return [call, ToolMessage(content=content, tool_call_id=f"call-{n}", name="retrieve_chunks")]
+
+
+def _conversation(rounds, size=200):
+    messages = [HumanMessage(content="Jam besuk Siloam?", id="first")]
+    for n in range(rounds):
+        messages += _retrieval(n, f"[chunk_id=faq:{n}] " + "isi " * size)
+        messages.append(HumanMessage(content=f"Pertanyaan rewrite {n}"))
+    return messages
+
+
+def _assert_pairs_intact(messages):
+    calls = {c["id"] for m in messages if isinstance(m, AIMessage) for c in m.tool_calls}
+    answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+    assert calls == answered
+
+
+def test_first_message_is_always_kept():
+    messages = _conversation(6)
+    for budget in (0, 50, 400):
+        assert history.trim_messages(messages, max_tokens=budget)[0] is messages[0]
+
+
+def test_latest_retrieval_pair_is_left_intact():
+    messages = _conversation(3)
+    trimmed = history.trim_messages(messages, max_tokens=0)
+
+    call, result = trimmed[-3], trimmed[-2]
+    assert call.tool_calls[0]["id"] == "call-2"
+    assert result.content == messages[-2].content
+
+
+def test_older_tool_messages_become_references():
+    trimmed = history.trim_messages(_conversation(3), max_tokens=0)
+
+    older = [m for m in trimmed if isinstance(m, ToolMessage)][:-1]
+    assert [m.content for m in older] == [
+        "[hasil tool sebelumnya diringkas] retrieve_chunks(query='q0') -> faq:0",
+        "[hasil tool sebelumnya diringkas] retrieve_chunks(query='q1') -> faq:1",
+    ]
+
+
+def test_budget_drops_whole_pairs_and_keeps_window_contiguous():
+    messages = _conversation(8, size=400)
+    trimmed = history.trim_messages(messages, max_tokens=480)
+
+    assert len(trimmed) < len(messages)
+    _assert_pairs_intact(trimmed)
+    tail = [m.content for m in trimmed[1:]]
+    expected = [m.content for m in history.trim_messages(messages, max_tokens=0)]
+    assert tail == expected[len(expected) - len(tail):]  # Akhir history, tanpa lubang di tengah
+
+
+def test_zero_budget_means_no_window_limit():
+    messages = _conversation(20, size=2000)
+    trimmed = history.trim_messages(messages, max_tokens=0)
+
+    assert len(trimmed) == len(messages)
+    _assert_pairs_intact(trimmed)
+
+
+def test_reducer_appends_then_trims():
+    left = _conversation(2)
+    merged = history.bounded_messages(left, [HumanMessage(content="lagi")])
+
+    assert merged[0] is left[0]
+    assert merged[-1].content == "lagi"
+    assert str(merged[2].content).startswith("[hasil tool sebelumnya diringkas]")
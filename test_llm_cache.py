@@ -0,0 +1,74 @@
+"""SQLiteLLMCache: akuntansi ukuran dan eviction LRU sampai ~90% dari max_bytes."""
+import itertools
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration  # noqa: E402
+
+import llm_cache  # noqa: E402
+
+
+def _value(text):
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = itertools.count(1)
+
+    class _Clock:
+        @staticmethod
+        def time():
+            return float(next(ticks))  # last_used selalu naik, urutan LRU tidak bergantung resolusi jam
+
+    monkeypatch.setattr(llm_cache, "time", _Clock)
+
+
+def _entry_size(tmp_path):
+    probe = llm_cache.SQLiteLLMCache(str(tmp_path / "probe.sqlite"))
+    probe.update("p", "m", _value("x" * 100))
+    return probe.stats()["bytes"]
+
+
+def _sizes(cache):
+    with cache._lock:
+        return cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+
+def test_evicts_least_recently_used_down_to_ninety_percent(tmp_path, clock):
+    size = _entry_size(tmp_path)
+    cache = llm_cache.SQLiteLLMCache(str(tmp_path / "cache.sqlite"), max_bytes=5 * size)
+    for name in "abcde":
+        cache.update(name, "m", _value("x" * 100))
+    assert cache.lookup("a", "m") is not None  # "a" jadi yang paling baru dipakai
+
+    cache.update("f", "m", _value("x" * 100))
+
+    kept = [name for name in "abcdef" if cache.lookup(name, "m") is not None]
+    assert kept == ["a", "d", "e", "f"]
+    assert cache.stats()["bytes"] == _sizes(cache) == 4 * size
+    assert cache.stats()["bytes"] <= cache.max_bytes * llm_cache._EVICT_TO
+
+
+def test_replacing_an_entry_keeps_size_in_sync(tmp_path, clock):
+    cache = llm_cache.SQLiteLLMCache(str(tmp_path / "cache.sqlite"), max_bytes=1 << 20)
+    cache.update("a", "m", _value("x" * 100))
+    cache.update("a", "m", _value("y" * 10))
+
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == _sizes(cache)
+
+
+def test_oversize_value_is_not_stored(tmp_path, clock):
+    size = _entry_size(tmp_path)
+    cache = llm_cache.SQLiteLLMCache(str(tmp_path / "cache.sqlite"), max_bytes=2 * size)
+    cache.update("a", "m", _value("x" * 100))
+
+    cache.update("big", "m", _value("x" * (4 * size)))
+
+    assert cache.lookup("big", "m") is None
+    assert cache.lookup("a", "m") is not None
+    assert cache.stats()["bytes"] == _sizes(cache) == size
@@ -0,0 +1,94 @@
+"""serve.RAGServer dengan graph stub (tanpa OLLAMA / Typesense): limiter 503 / 429 dan coalescing."""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("typesense")
+
+import serve  # noqa: E402
+from stubs import StubChatModel, install_stubs  # noqa: E402
+
+
+def _app(**limits):
+    graph = install_stubs(model=StubChatModel(latency=0.05), use_async=True)
+    return serve.create_app(graph=graph, **limits)
+
+
+async def _post(app, question, client="c1"):
+    body = json.dumps({"question": question}).encode("utf-8")
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/ask",
+        "headers": [(b"x-client-id", client.encode("utf-8"))],
+        "client": ("127.0.0.1", 50000),
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    payload = json.loads(b"".join(m.get("body", b"") for m in sent[1:]))
+    return sent[0]["status"], payload
+
+
+def _gather(*coros):
+    async def _run():
+        return await asyncio.gather(*coros)
+    return asyncio.run(_run())
+
+
+def test_queue_full_is_rejected_with_503():
+    app = _app(max_concurrency=1, max_queue=0, max_per_client=4)
+    first, second = _gather(_post(app, "jam besuk?", "a"), _post(app, "lokasi siloam?", "b"))
+    assert first[0] == 200
+    assert second[0] == 503
+
+
+def test_per_client_limit_is_rejected_with_429():
+    app = _app(max_concurrency=4, max_queue=4, max_per_client=1)
+    first, second = _gather(_post(app, "jam besuk?", "a"), _post(app, "lokasi siloam?", "a"))
+    assert first[0] == 200
+    assert second[0] == 429
+
+
+def test_identical_questions_share_one_run():
+    app = _app(max_concurrency=1, max_queue=0, max_per_client=4)
+    first, second = _gather(_post(app, "Jam besuk?", "a"), _post(app, "  jam   BESUK? ", "b"))
+    assert first[0] == second[0] == 200  # Tidak kena 503 walau antrian 0: ikut eksekusi yang sudah ada
+    assert first[1]["answer"] == second[1]["answer"]
+    assert (first[1]["coalesced"], second[1]["coalesced"]) == (False, True)
+    assert not app._inflight
+
+
+def test_stub_graph_does_not_create_real_backends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import custom_rag
+
+    status, _ = _gather(_post(_app(), "jam besuk?"))[0]
+    assert status == 200
+    assert isinstance(custom_rag.response_model, StubChatModel)
+    assert not (tmp_path / ".llm_cache.sqlite").exists()
+
+
+def test_tools_and_nodes_build_missing_backends_lazily(monkeypatch):
+    import custom_rag
+    from langchain_core.messages import HumanMessage
+    from stubs import StubRetriever
+
+    install_stubs()
+    for name, factory in (("_ts_retriever", StubRetriever), ("response_model", StubChatModel)):
+        monkeypatch.delattr(custom_rag, name)  # Seperti sebelum build_graph() / init_backends()
+        monkeypatch.setitem(custom_rag._BACKENDS, name, factory)
+
+    call = {"name": "retrieve_chunks", "args": {"query": "jam besuk"}, "id": "call-1", "type": "tool_call"}
+    assert custom_rag.retrieve_chunks.invoke(call).tool_call_id == "call-1"
+    assert isinstance(custom_rag.__dict__["_ts_retriever"], StubRetriever)
+    custom_rag.rewrite_question({"messages": [HumanMessage(content="jam besuk?")], "retry_count": 0})
+    assert isinstance(custom_rag.__dict__["response_model"], StubChatModel)
@@ -0,0 +1,33 @@
+"""structured_search: filter dokter (gender / emergency) untuk target hospitals tidak boleh hilang diam-diam."""
+import pytest
+
+pytest.importorskip("typesense")
+
+import structured_search  # noqa: E402
+
+
+def test_build_params_rejects_doctor_filters_for_hospitals():
+    with pytest.raises(ValueError):
+        structured_search.build_params("hospitals", gender="Perempuan")
+    with pytest.raises(ValueError):
+        structured_search.build_params("hospitals", emergency=False)
+
+
+def test_hospital_search_applies_doctor_filters_via_doctor_hospitals(monkeypatch):
+    calls = []
+
+    def fake_search(collection, params):
+        calls.append((collection, params))
+        if collection == structured_search.DOCTORS_COLLECTION:
+            return {"facet_counts": [{"field_name": "hospital_ids", "counts": [{"value": "h1", "count": 3}]}]}
+        return {"found": 1, "hits": [{"document": {"hospital_id": "h1"}}]}
+
+    monkeypatch.setattr(structured_search.TYPESENSE_CLUSTER, "search", fake_search)
+    structured_search.search("hospitals", "Anak", "Surabaya", gender="wanita", emergency=True)
+
+    (doctors, doctor_params), (hospitals, hospital_params) = calls
+    assert doctors == structured_search.DOCTORS_COLLECTION
+    assert "gender_name:=`Perempuan`" in doctor_params["filter_by"]
+    assert "is_emergency_enable:=true" in doctor_params["filter_by"]
+    assert hospitals == structured_search.HOSPITALS_COLLECTION
+    assert "hospital_id:=[`h1`]" in hospital_params["filter_by"]
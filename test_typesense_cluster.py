@@ -0,0 +1,55 @@
+"""TypesenseCluster.read: jeda hedge dihitung sejak request mulai jalan, dan jumlah hedge dibatasi budget."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("typesense")
+
+import typesense_cluster  # noqa: E402
+
+_NODES = [{"host": f"ts{i}", "port": "8108", "protocol": "http"} for i in range(2)]
+
+
+def _cluster(**kwargs):
+    cluster = typesense_cluster.TypesenseCluster(_NODES, api_key="x", **kwargs)
+    for node in cluster._nodes:
+        node.latencies.extend([5.0] * typesense_cluster._MIN_SAMPLES)  # Jeda hedge = HEDGE_MIN_MS
+    return cluster
+
+
+def _op(sleep_s, calls):
+    def op(client):
+        calls.append(client)
+        time.sleep(sleep_s)
+        return {"found": 0}
+    return op
+
+
+def test_queue_wait_does_not_trigger_hedge():
+    cluster = _cluster()
+    cluster._pool = ThreadPoolExecutor(max_workers=1)
+    cluster._pool.submit(time.sleep, 0.2)  # Pool penuh: request pertama antri lebih lama dari jeda hedge
+    calls = []
+
+    assert cluster.read(_op(0.001, calls)) == {"found": 0}
+    assert len(calls) == 1
+
+
+def test_hedges_stop_when_budget_is_spent():
+    cluster = _cluster(hedge_budget=0.0)
+    cluster._budget.tokens = 1
+    calls = []
+    lock = threading.Lock()
+
+    def op(client):
+        with lock:
+            calls.append(client)
+        time.sleep(0.05)  # Selalu lebih lambat dari jeda hedge
+        return {"found": 0}
+
+    for _ in range(3):
+        cluster.read(op)
+
+    assert len(calls) == 4  # Tiga read + satu hedge dari satu-satunya token
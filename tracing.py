@@ -0,0 +1,311 @@
+"""
+Instrumentasi ringan untuk pipeline RAG: span latency + metrik bergaya Prometheus + trace JSONL.
+
+- span(name, **attrs): context manager (sync maupun async) yang mengukur durasi satu langkah
+  (node graph, embedding, request Typesense). Atribut bisa ditambah di tengah jalan lewat `sp.set(...)`
+  atau `annotate(...)` untuk span yang sedang aktif. Span bersarang otomatis berbagi trace_id.
+- Durasi masuk ke histogram `rag_span_duration_seconds{span=...}` (plus label `mode` kalau ada),
+  token LLM ke counter `rag_llm_tokens_total`, error ke `rag_span_errors_total`.
+- render_prometheus() menghasilkan teks format Prometheus (dipakai endpoint /metrics di serve.py
+  atau start_metrics_server() untuk CLI).
+- Kalau env RAG_TRACE_FILE di-set, setiap span juga ditulis sebagai satu baris JSON ke file tersebut
+  (buffered, di-flush tiap RAG_TRACE_FLUSH_EVERY span dan saat proses keluar).
+- log(component, message, level): pesan operasional (warm-up, provider dilewati, profil ditulis) ke logger
+  `rag.<component>` (stderr / handler aplikasi, bukan stdout); warning dan error juga dihitung di
+  `rag_log_messages_total{component, level}`.
+- RAG_TRACING=0 mematikan semua instrumentasi.
+
+Overhead per span: dua perf_counter, satu dict, dan satu lock; aman untuk dinyalakan di production.
+"""
+import atexit  # Flush trace JSONL saat proses selesai
+import contextvars  # Span aktif per thread / task asyncio
+import functools  # Wrapper node graph
+import inspect  # Deteksi node async
+import json  # Serialisasi trace JSONL
+import logging  # Pesan operasional (bukan stdout)
+import os  # Konfigurasi dari environment variable
+import threading  # Lock untuk registry metrik dan writer
+import time  # perf_counter untuk durasi, time() untuk timestamp
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+
+TRACING_ENABLED = os.getenv("RAG_TRACING", "1") != "0"
+TRACE_FILE = os.getenv("RAG_TRACE_FILE")  # Kosong = trace JSONL tidak ditulis
+TRACE_FLUSH_EVERY = int(os.getenv("RAG_TRACE_FLUSH_EVERY", "64"))
+
+# Bucket histogram durasi (detik): dari embedding lokal sampai LLM call yang lambat
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_LABEL_ATTRS = ("mode",)  # Atribut span yang ikut jadi label metrik (kardinalitas kecil)
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("rag_span", default=None)
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, _Labels], List[float]] = {}  # [count per bucket..., +Inf, sum]
+_counters: Dict[Tuple[str, _Labels], float] = {}
+_listeners: List[Callable[["Span"], None]] = []  # Dipanggil untuk setiap span selesai (mis. loadtest.py)
+
+
+class Span:
+    """Satu langkah yang diukur. Dibuat lewat `span()`, jangan langsung."""
+
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "duration", "error")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], parent: "Span | None") -> None:
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start = 0.0
+        self.duration = 0.0
+        self.error: str | None = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class _NoopSpan:
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """Ukur durasi blok kode sebagai span bernama `name`."""
+    if not TRACING_ENABLED:
+        yield _NOOP
+        return
+    sp = Span(name, attrs, _current.get())
+    token = _current.set(sp)
+    wall = time.time()
+    sp.start = time.perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = type(e).__name__
+        raise
+    finally:
+        sp.duration = time.perf_counter() - sp.start
+        _current.reset(token)
+        _finish(sp, wall)
+
+
+def current_span() -> "Span | None":
+    return _current.get()
+
+
+def annotate(**attrs: Any) -> None:
+    """Tambahkan atribut ke span yang sedang aktif (kalau ada)."""
+    sp = _current.get()
+    if sp is not None:
+        sp.set(**attrs)
+
+
+def record_usage(response: Any) -> None:
+    """Catat jumlah token prompt / response dari `usage_metadata` pesan LLM ke span aktif."""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+    prompt_tokens = usage.get("input_tokens", 0)
+    response_tokens = usage.get("output_tokens", 0)
+    annotate(prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+    sp = _current.get()
+    name = sp.name if sp else "unknown"
+    inc("rag_llm_tokens_total", prompt_tokens, span=name, kind="prompt")
+    inc("rag_llm_tokens_total", response_tokens, span=name, kind="response")
+
+
+def traced_node(name: str, fn: Callable) -> Callable:
+    """Bungkus node / routing function LangGraph (sync atau async) dengan span `node.<name>`."""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def _async_node(state):
+            with span(f"node.{name}", retry=state.get("retry_count", 0)):
+                return await fn(state)
+        return _async_node
+
+    @functools.wraps(fn)
+    def _node(state):
+        with span(f"node.{name}", retry=state.get("retry_count", 0)):
+            return fn(state)
+    return _node
+
+
+def inc(metric: str, value: float = 1.0, **labels: Any) -> None:
+    """Tambah nilai counter Prometheus `metric` dengan label tertentu."""
+    if not TRACING_ENABLED:
+        return
+    key = (metric, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def log(component: str, message: str, level: str = "info") -> None:
+    """Tulis pesan ke logger `rag.<component>`; level warning / error juga masuk counter."""
+    logging.getLogger(f"rag.{component}").log(getattr(logging, level.upper()), message)
+    if level in ("warning", "error"):
+        inc("rag_log_messages_total", component=component, level=level)
+
+
+def observe(metric: str, value: float, **labels: Any) -> None:
+    """Masukkan satu observasi (detik) ke histogram `metric`."""
+    if not TRACING_ENABLED:
+        return
+    key = (metric, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0.0] * (len(_BUCKETS) + 2)
+        for i, bound in enumerate(_BUCKETS):
+            if value <= bound:
+                h[i] += 1
+                break
+        else:
+            h[len(_BUCKETS)] += 1  # +Inf
+        h[-1] += value
+
+
+def _finish(sp: Span, wall: float) -> None:
+    labels = {"span": sp.name}
+    for attr in _LABEL_ATTRS:
+        if attr in sp.attrs:
+            labels[attr] = sp.attrs[attr]
+    observe("rag_span_duration_seconds", sp.duration, **labels)
+    if sp.error:
+        inc("rag_span_errors_total", span=sp.name, error=sp.error)
+    for fn in _listeners:
+        fn(sp)
+    if _writer is not None:
+        record = {
+            "trace_id": sp.trace_id,
+            "span_id": sp.span_id,
+            "parent_id": sp.parent_id,
+            "name": sp.name,
+            "start": wall,
+            "duration_ms": round(sp.duration * 1000, 3),
+            "attrs": sp.attrs,
+        }
+        if sp.error:
+            record["error"] = sp.error
+        _writer.write(record)
+
+
+def add_listener(fn: Callable[[Span], None]) -> None:
+    """Daftarkan callback yang menerima setiap Span yang selesai (harus cepat dan thread-safe)."""
+    _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[Span], None]) -> None:
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def _fmt_labels(labels: _Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+def render_prometheus() -> str:
+    """Semua metrik dalam format teks Prometheus (text/plain; version=0.0.4)."""
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines: List[str] = []
+    seen = set()
+    for (metric, labels), h in sorted(histograms.items()):
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} histogram")
+            seen.add(metric)
+        cumulative = 0.0
+        for bound, n in zip(_BUCKETS, h):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_fmt_labels(labels, (('le', str(bound)),))} {cumulative:g}")
+        cumulative += h[len(_BUCKETS)]
+        lines.append(f"{metric}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {cumulative:g}")
+        lines.append(f"{metric}_sum{_fmt_labels(labels)} {h[-1]:.6f}")
+        lines.append(f"{metric}_count{_fmt_labels(labels)} {cumulative:g}")
+    for (metric, labels), value in sorted(counters.items()):
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} counter")
+            seen.add(metric)
+        lines.append(f"{metric}{_fmt_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+class _TraceWriter:
+    """Writer JSONL dengan buffer; satu baris per span."""
+
+    def __init__(self, path: str, flush_every: int = TRACE_FLUSH_EVERY) -> None:
+        self.path = path
+        self.flush_every = flush_every
+        self._buf: List[str] = []
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._buf.append(line)
+            if len(self._buf) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._buf:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(self._buf) + "\n")
+        self._buf.clear()
+
+
+_writer = _TraceWriter(TRACE_FILE) if (TRACING_ENABLED and TRACE_FILE) else None
+if _writer is not None:
+    atexit.register(_writer.flush)
+
+
+def flush() -> None:
+    """Paksa tulis buffer trace JSONL ke file."""
+    if _writer is not None:
+        _writer.flush()
+
+
+def start_metrics_server(port: int | None = None, host: str = "0.0.0.0"):
+    """Jalankan endpoint /metrics (http.server di thread daemon) untuk proses tanpa serve.py, mis. CLI."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass  # Jangan spam stdout tiap scrape
+
+    port = port if port is not None else int(os.getenv("RAG_METRICS_PORT", "9108"))
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="rag-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,340 @@
+"""
+Satu factory client Typesense untuk semua modul, multi-node, dengan routing sadar-health dan hedged read.
+
+Konfigurasi node (env):
+- TYPESENSE_NODES         daftar node dipisah koma, mis. "http://ts1:8108,http://ts2:8108,ts3:8108"
+                          (tanpa skema = TYPESENSE_PROTOCOL). Kosong = satu node TYPESENSE_HOST:TYPESENSE_PORT.
+- TYPESENSE_NEAREST_NODE  node terdekat (mis. replika di zona yang sama), dicoba paling dulu selama sehat.
+- TYPESENSE_CONNECTION_TIMEOUT, TYPESENSE_HEALTHCHECK_INTERVAL, TYPESENSE_NUM_RETRIES.
+
+`get_client()` mengembalikan typesense.Client bersama (semua node + nearest_node) untuk tulis / admin / import;
+failover-nya memakai mekanisme bawaan client. Untuk read (`search`, `multi_search`) dipakai `TypesenseCluster`:
+- setiap node punya client sendiri, latency EWMA + jendela latency terakhir, dan status health
+  (node yang error dilewati selama TYPESENSE_HEALTHCHECK_INTERVAL detik, lalu dicoba lagi),
+- urutan node: nearest (kalau sehat), lalu node sehat dengan latency EWMA terkecil,
+- hedged read: kalau node pertama belum menjawab setelah persentil ke-TYPESENSE_HEDGE_PERCENTILE latency
+  node itu (minimal TYPESENSE_HEDGE_MIN_MS), request duplikat dikirim ke replika kedua dan jawaban yang
+  lebih dulu datang dipakai. Jeda hedge dihitung sejak request node pertama benar-benar mulai jalan (bukan
+  sejak masuk antrian pool), jadi pool yang penuh tidak membuat semua read di-hedge. Jumlah hedge dibatasi
+  budget: setiap read menambah TYPESENSE_HEDGE_BUDGET token (default 0.1 = maks. ~10% read), hedge memakai
+  satu token, maksimal TYPESENSE_HEDGE_BURST token tersimpan. Error server / koneksi langsung failover ke node
+  berikutnya; error 4xx (collection tidak ada, query salah) tidak di-retry.
+Hedging otomatis mati kalau hanya ada satu node (atau TYPESENSE_HEDGE=0).
+Lihat bench_hedging.py untuk tes dengan beberapa server pengganti lokal.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List
+from urllib.parse import urlsplit
+
+import typesense
+
+from tracing import inc, span
+
+
+TYPESENSE_NODES = os.getenv("TYPESENSE_NODES", "")
+TYPESENSE_NEAREST_NODE = os.getenv("TYPESENSE_NEAREST_NODE", "")
+TYPESENSE_CONNECTION_TIMEOUT = float(os.getenv("TYPESENSE_CONNECTION_TIMEOUT", "10"))
+TYPESENSE_HEALTHCHECK_INTERVAL = float(os.getenv("TYPESENSE_HEALTHCHECK_INTERVAL", "15"))
+TYPESENSE_NUM_RETRIES = int(os.getenv("TYPESENSE_NUM_RETRIES", "3"))
+TYPESENSE_HEDGE = os.getenv("TYPESENSE_HEDGE", "1") != "0"
+TYPESENSE_HEDGE_PERCENTILE = float(os.getenv("TYPESENSE_HEDGE_PERCENTILE", "95"))
+TYPESENSE_HEDGE_MIN_MS = float(os.getenv("TYPESENSE_HEDGE_MIN_MS", "10"))
+TYPESENSE_HEDGE_DEFAULT_MS = float(os.getenv("TYPESENSE_HEDGE_DEFAULT_MS", "100"))  # Sebelum sampel cukup
+TYPESENSE_HEDGE_WORKERS = int(os.getenv("TYPESENSE_HEDGE_WORKERS", "32"))
+TYPESENSE_HEDGE_BUDGET = float(os.getenv("TYPESENSE_HEDGE_BUDGET", "0.1"))  # Token hedge per read
+TYPESENSE_HEDGE_BURST = float(os.getenv("TYPESENSE_HEDGE_BURST", "10"))
+
+_WINDOW = 256  # Jumlah latency terakhir per node untuk persentil
+_MIN_SAMPLES = 20
+_EWMA_ALPHA = 0.2
+
+# Error 4xx: sama di semua replika, jadi tidak di-failover / di-hedge
+_CLIENT_ERRORS = tuple(
+    getattr(typesense.exceptions, name)
+    for name in ("ObjectNotFound", "ObjectAlreadyExists", "ObjectUnprocessable", "RequestMalformed",
+                 "RequestUnauthorized", "RequestForbidden")
+    if hasattr(typesense.exceptions, name)
+)
+
+
+def parse_node(spec: str, protocol: str | None = None) -> Dict[str, str]:
+    """"http://host:8108" / "host:8108" / "host" -> dict node untuk typesense.Client."""
+    spec = spec.strip()
+    if "://" not in spec:
+        spec = f"{protocol or os.getenv('TYPESENSE_PROTOCOL', 'http')}://{spec}"
+    url = urlsplit(spec)
+    return {
+        "host": url.hostname or "localhost",
+        "port": str(url.port or os.getenv("TYPESENSE_PORT", "8108")),
+        "protocol": url.scheme,
+    }
+
+
+def nodes_from_env() -> List[Dict[str, str]]:
+    if TYPESENSE_NODES.strip():
+        return [parse_node(s) for s in TYPESENSE_NODES.split(",") if s.strip()]
+    return [{
+        "host": os.getenv("TYPESENSE_HOST", "localhost"),  # Default ke localhost
+        "port": os.getenv("TYPESENSE_PORT", "8108"),  # Port default Typesense
+        "protocol": os.getenv("TYPESENSE_PROTOCOL", "http"),
+    }]
+
+
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class _Node:
+    """Client satu node + statistik latency / health."""
+
+    def __init__(self, node: Dict[str, str], api_key: str | None, timeout: float, nearest: bool = False) -> None:
+        self.node = node
+        self.label = f"{node['host']}:{node['port']}"
+        self.nearest = nearest
+        self.client = typesense.Client({
+            "nodes": [node],
+            "api_key": api_key,
+            "connection_timeout_seconds": timeout,
+            "num_retries": 0,  # Retry / failover diatur TypesenseCluster
+        })
+        self.latencies: deque = deque(maxlen=_WINDOW)
+        self.ewma_ms: float | None = None
+        self.failures = 0
+        self.last_failure = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0  # Menang sebagai hedge (jawaban duplikat lebih cepat dari node pertama)
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return self.failures == 0 or time.monotonic() - self.last_failure >= TYPESENSE_HEALTHCHECK_INTERVAL
+
+    def ok(self, ms: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.failures = 0
+            self.latencies.append(ms)
+            self.ewma_ms = ms if self.ewma_ms is None else (1 - _EWMA_ALPHA) * self.ewma_ms + _EWMA_ALPHA * ms
+
+    def fail(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += 1
+            self.failures += 1
+            self.last_failure = time.monotonic()
+
+    def hedge_delay(self) -> float:
+        """Detik sebelum request duplikat dikirim ke replika berikutnya."""
+        with self._lock:
+            samples = list(self.latencies)
+        if len(samples) < _MIN_SAMPLES:
+            return TYPESENSE_HEDGE_DEFAULT_MS / 1000
+        return max(TYPESENSE_HEDGE_MIN_MS, _percentile(samples, TYPESENSE_HEDGE_PERCENTILE)) / 1000
+
+
+class _HedgeBudget:
+    """Token bucket hedge: setiap read menambah `ratio` token (maks. `burst`), setiap hedge memakai satu."""
+
+    def __init__(self, ratio: float, burst: float) -> None:
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class TypesenseCluster:
+    def __init__(
+        self,
+        nodes: List[Dict[str, str]] | None = None,
+        nearest_node: Dict[str, str] | None = None,
+        api_key: str | None = None,
+        timeout: float = TYPESENSE_CONNECTION_TIMEOUT,
+        hedge: bool = TYPESENSE_HEDGE,
+        hedge_budget: float = TYPESENSE_HEDGE_BUDGET,
+    ) -> None:
+        nodes = nodes or nodes_from_env()
+        if nearest_node is None and TYPESENSE_NEAREST_NODE.strip():
+            nearest_node = parse_node(TYPESENSE_NEAREST_NODE)
+        api_key = api_key if api_key is not None else os.getenv("TYPESENSE_API_KEY")
+        config: Dict[str, Any] = {
+            "nodes": nodes,
+            "api_key": api_key,  # Wajib di-set agar bisa akses
+            "connection_timeout_seconds": timeout,
+            "healthcheck_interval_seconds": TYPESENSE_HEALTHCHECK_INTERVAL,
+            "num_retries": TYPESENSE_NUM_RETRIES,
+        }
+        if nearest_node:
+            config["nearest_node"] = nearest_node
+        self.client = typesense.Client(config)  # Tulis / admin / import
+
+        self._nodes = [_Node(n, api_key, timeout) for n in nodes]
+        if nearest_node:
+            known = {n.label: n for n in self._nodes}
+            label = f"{nearest_node['host']}:{nearest_node['port']}"
+            if label in known:
+                known[label].nearest = True
+            else:
+                self._nodes.insert(0, _Node(nearest_node, api_key, timeout, nearest=True))
+        self.hedge = hedge and len(self._nodes) > 1
+        self._budget = _HedgeBudget(hedge_budget, TYPESENSE_HEDGE_BURST)
+        self._pool = ThreadPoolExecutor(max_workers=TYPESENSE_HEDGE_WORKERS, thread_name_prefix="typesense")
+
+    def _order(self) -> List[_Node]:
+        healthy = [n for n in self._nodes if n.healthy]
+        if not healthy:
+            healthy = sorted(self._nodes, key=lambda n: n.last_failure)  # Semua error: coba yang paling lama pulih
+        return sorted(healthy, key=lambda n: (not n.nearest, n.ewma_ms or 0.0))
+
+    @staticmethod
+    def _timed(node: _Node, op: Callable[[typesense.Client], Any], started: threading.Event | None = None) -> Any:
+        if started is not None:
+            started.set()  # Keluar dari antrian pool: mulai dari sini jeda hedge dihitung
+        start = time.perf_counter()
+        try:
+            result = op(node.client)
+        except _CLIENT_ERRORS:
+            node.ok((time.perf_counter() - start) * 1000)  # Node sehat, request-nya yang salah
+            raise
+        except Exception:
+            node.fail()
+            raise
+        node.ok((time.perf_counter() - start) * 1000)
+        return result
+
+    def read(self, op: Callable[[typesense.Client], Any], endpoint: str = "read", **attrs: Any) -> Any:
+        """Jalankan operasi baca `op(client)` dengan failover dan (opsional) satu hedge ke replika kedua."""
+        order = self._order()
+        with span("typesense", endpoint=endpoint, **attrs) as sp:
+            pending: Dict[Any, _Node] = {}
+            nxt = 0
+            hedged = False
+            can_hedge = self.hedge
+            primary = order[0]
+            hedge_at: float | None = None
+            started = threading.Event()
+            last_error: BaseException | None = None
+
+            def launch(started: threading.Event | None = None) -> None:
+                nonlocal nxt
+                node = order[nxt]
+                nxt += 1
+                pending[self._pool.submit(self._timed, node, op, started)] = node
+
+            if can_hedge:
+                self._budget.deposit()
+            launch(started)
+            while pending:
+                timeout = None
+                if can_hedge and not hedged and nxt < len(order):
+                    if hedge_at is None:
+                        started.wait()  # Selama node pertama masih antri di pool, hedge juga hanya akan antri
+                        hedge_at = time.perf_counter() + primary.hedge_delay()
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    if not self._budget.take():
+                        can_hedge = False  # Budget habis: tunggu node pertama saja
+                        inc("rag_typesense_hedges_skipped_total", endpoint=endpoint)
+                        continue
+                    hedged = True
+                    launch()
+                    inc("rag_typesense_hedges_total", endpoint=endpoint)
+                    continue
+                for fut in done:
+                    node = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except _CLIENT_ERRORS:
+                        raise
+                    except Exception as e:
+                        last_error = e
+                        inc("rag_typesense_node_errors_total", node=node.label, error=type(e).__name__)
+                        continue
+                    if hedged and node is not primary:
+                        node.wins += 1
+                    sp.set(node=node.label, hedged=hedged)
+                    return result  # Request lain yang masih jalan dibiarkan selesai, hasilnya dibuang
+                if not pending and nxt < len(order):
+                    primary, hedge_at, started = order[nxt], None, threading.Event()
+                    launch(started)  # Failover ke node berikutnya; jeda hedge dihitung ulang untuk node ini
+            raise last_error
+
+    def search(self, collection: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.read(lambda c: c.collections[collection].documents.search(params), "documents.search",
+                         collection=collection)
+
+    def multi_search(self, body: Dict[str, Any], common_params: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        return self.read(lambda c: c.multi_search.perform(body, common_params or {}), "multi_search")
+
+    def warm(self, collection: str, params: Dict[str, Any]) -> Dict[str, float]:
+        """Satu search ke setiap node (paralel) untuk membuka koneksi dan mengisi statistik latency.
+        Return ms per node yang berhasil; raise error terakhir kalau tidak ada node yang menjawab."""
+        def one(node: _Node) -> float:
+            start = time.perf_counter()
+            self._timed(node, lambda c: c.collections[collection].documents.search(params))
+            return (time.perf_counter() - start) * 1000
+
+        futures = {self._pool.submit(one, n): n for n in self._nodes}
+        out: Dict[str, float] = {}
+        last_error: BaseException | None = None
+        for future, n in futures.items():
+            try:
+                out[n.label] = round(future.result(), 2)
+            except Exception as e:
+                last_error = e
+        if not out and last_error is not None:
+            raise last_error
+        return out
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Ringkasan per node: health, latency EWMA / p95, jumlah call, error, dan hedge yang menang."""
+        out = []
+        for n in self._nodes:
+            samples = list(n.latencies)
+            out.append({
+                "node": n.label,
+                "nearest": n.nearest,
+                "healthy": n.healthy,
+                "ewma_ms": round(n.ewma_ms, 2) if n.ewma_ms is not None else None,
+                "p95_ms": round(_percentile(samples, 95), 2) if samples else None,
+                "calls": n.calls,
+                "errors": n.errors,
+                "hedge_wins": n.wins,
+            })
+        return out
+
+
+_cluster: TypesenseCluster | None = None
+_cluster_lock = threading.Lock()
+
+
+def get_cluster() -> TypesenseCluster:
+    """Cluster bersama dari env, dibuat saat pertama dipakai."""
+    global _cluster
+    if _cluster is None:
+        with _cluster_lock:
+            if _cluster is None:
+                _cluster = TypesenseCluster()
+    return _cluster
+
+
+def get_client() -> typesense.Client:
+    """typesense.Client bersama (semua node dari env) untuk operasi tulis / admin."""
+    return get_cluster().client
@@ -0,0 +1,147 @@
+"""
+Warm-up model dan koneksi saat service start, plus heartbeat supaya model tetap ter-load.
+
+Request pertama setelah deploy / idle lama menanggung cold load model OLLAMA (chat model custom_rag dan model
+embedding retriever), bisa puluhan detik. `Warmup` menjalankan target berikut secara paralel:
+- chat:<model>  setiap chat model ollama yang dikonfigurasi (response_model, model_penilai, override MODEL_ROUTER),
+                di-load dengan generate prompt kosong + keep_alive=RAG_KEEP_ALIVE (OLLAMA hanya me-load model),
+- embedding     satu embedding dummy lewat embedding.default_embedder() (provider + breaker yang sama dengan query),
+- typesense     schema collection (num_dim) + satu search ke setiap node Typesense untuk membuka koneksi.
+Setelah semua target berhasil, `ready` = True. Heartbeat mengulang semua target setiap RAG_HEARTBEAT_INTERVAL
+detik (harus lebih kecil dari RAG_KEEP_ALIVE) supaya model tidak di-unload saat idle; selama belum ready,
+percobaan diulang setiap RAG_WARMUP_RETRY detik. Target yang gagal membuat ready = False sampai berhasil lagi.
+
+Latency dicatat terpisah: run yang berhasil setelah target belum / tidak lagi warm = cold, sisanya = warm
+(logger `rag.warmup` + histogram `rag_warmup_seconds{target, phase}` di /metrics).
+
+Env: RAG_WARMUP (default 1; 0 = serve.py langsung ready tanpa warm-up), RAG_HEARTBEAT_INTERVAL (default 240),
+RAG_WARMUP_RETRY (default 5), RAG_KEEP_ALIVE (embedding.py, default 30m).
+Contoh: python warmup.py   (warm-up sekali, cetak status JSON)
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+import tracing
+from embedding import RAG_KEEP_ALIVE
+
+
+RAG_WARMUP = os.getenv("RAG_WARMUP", "1") != "0"
+RAG_HEARTBEAT_INTERVAL = float(os.getenv("RAG_HEARTBEAT_INTERVAL", "240"))
+RAG_WARMUP_RETRY = float(os.getenv("RAG_WARMUP_RETRY", "5"))
+_DUMMY_TEXT = "warmup"
+
+
+class Warmup:
+    """Jalankan target warm-up (nama -> callable tanpa argumen) dan simpan status cold / warm per target."""
+
+    def __init__(
+        self,
+        targets: Dict[str, Callable[[], Any]],
+        interval: float = RAG_HEARTBEAT_INTERVAL,
+        retry: float = RAG_WARMUP_RETRY,
+    ) -> None:
+        self.targets = dict(targets)
+        self.interval = interval
+        self.retry = retry
+        self._state: Dict[str, Dict[str, Any]] = {
+            name: {"warm": False, "cold_ms": None, "warm_ms": None, "runs": 0, "errors": 0, "error": None}
+            for name in self.targets
+        }
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.targets)), thread_name_prefix="warmup")
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(s["warm"] for s in self._state.values())
+
+    def _run_target(self, name: str) -> None:
+        with self._lock:
+            phase = "warm" if self._state[name]["warm"] else "cold"
+        start = time.perf_counter()
+        try:
+            self.targets[name]()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:200]
+            with self._lock:
+                st = self._state[name]
+                st.update(warm=False, error=error, runs=st["runs"] + 1, errors=st["errors"] + 1)
+            tracing.inc("rag_warmup_errors_total", target=name)
+            tracing.log("warmup", f"{name} gagal: {error}", "warning")
+            return
+        elapsed = time.perf_counter() - start
+        tracing.observe("rag_warmup_seconds", elapsed, target=name, phase=phase)
+        with self._lock:
+            st = self._state[name]
+            st.update({"warm": True, "error": None, "runs": st["runs"] + 1, f"{phase}_ms": round(elapsed * 1000, 1)})
+        tracing.log("warmup", f"{name} {phase} {elapsed * 1000:.0f} ms")
+
+    def run_once(self) -> bool:
+        """Jalankan semua target sekali (paralel). Return status ready setelahnya."""
+        list(self._pool.map(self._run_target, self.targets))
+        return self.ready
+
+    async def run_forever(self) -> None:
+        """Loop warm-up + heartbeat (dijalankan sebagai task di lifespan serve.py)."""
+        while True:
+            ready = await asyncio.to_thread(self.run_once)
+            await asyncio.sleep(self.interval if ready else self.retry)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            targets = {name: dict(st) for name, st in self._state.items()}
+        return {"ready": all(t["warm"] for t in targets.values()), "targets": targets}
+
+
+def _is_ollama(model: Any) -> bool:
+    return getattr(model, "_llm_type", "") == "chat-ollama"
+
+
+def _load_chat(model: Any) -> Callable[[], Any]:
+    import ollama
+
+    client = ollama.Client(host=getattr(model, "base_url", None))  # None = OLLAMA_HOST / default client
+    name = model.model
+    return lambda: client.generate(model=name, prompt="", keep_alive=RAG_KEEP_ALIVE)
+
+
+def default_targets() -> Dict[str, Callable[[], Any]]:
+    """Target warm-up dari konfigurasi custom_rag (model, embedder, retriever)."""
+    import custom_rag
+    from embedding import default_embedder
+    from retriever import TYPESENSE_CLUSTER
+
+    targets: Dict[str, Callable[[], Any]] = {}
+    models = [custom_rag.response_model, custom_rag.model_penilai, *custom_rag.MODEL_ROUTER.models.values()]
+    for model in models:
+        if _is_ollama(model) and f"chat:{model.model}" not in targets:
+            targets[f"chat:{model.model}"] = _load_chat(model)
+
+    retriever = custom_rag._ts_retriever
+    targets["embedding"] = lambda: default_embedder().embed(_DUMMY_TEXT)
+
+    def _typesense() -> Any:
+        retriever.num_dim()  # Schema di-cache retriever, jadi vector search pertama tidak perlu retrieve lagi
+        return TYPESENSE_CLUSTER.warm(
+            retriever.collection_name, {"q": _DUMMY_TEXT, "query_by": "content", "per_page": 1},
+        )
+
+    targets["typesense"] = _typesense
+    return targets
+
+
+def default_warmup() -> Warmup:
+    return Warmup(default_targets())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] %(message)s")
+    w = default_warmup()
+    w.run_once()
+    print(json.dumps(w.status(), indent=2, ensure_ascii=False))